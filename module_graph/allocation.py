@@ -0,0 +1,130 @@
+import sys
+
+TRACE_FRAMES = 8
+# module level code of a module is called by the import system
+IMPORT_FILENAMES = frozenset([
+    '<frozen importlib._bootstrap>',
+    '<frozen importlib._bootstrap_external>',
+])
+
+
+def module_files(modules=None):
+    """Source filename to module name of imported modules"""
+    files = {}
+    for name, module in list(sys.modules.items()):
+        if modules is not None and name not in modules:
+            continue
+        filename = getattr(module, '__file__', None)
+        if filename and filename.endswith('.py'):
+            files[filename] = name
+    return files
+
+
+def get_raw_traces(tracemalloc):
+    """
+    Traces as (domain, size, frames, ...), frames are (filename, lineno),
+    most recent first. The private _get_traces() is much faster than the
+    Snapshot objects, but not public API, use the snapshot if it's gone.
+    """
+    get_traces = getattr(tracemalloc, '_get_traces', None)
+    if get_traces is not None:
+        return get_traces()
+    # traceback of snapshot is oldest frame first
+    return [
+        (trace.domain, trace.size, tuple(
+            (frame.filename, frame.lineno)
+            for frame in reversed(trace.traceback)))
+        for trace in tracemalloc.take_snapshot().traces
+    ]
+
+
+class AllocationTracer:
+    """
+    Attribute Python memory blocks traced by tracemalloc to modules.
+
+    A block belongs to the module whose module level code allocated it,
+    directly or by the functions it called, eg: a table literal or
+    re.compile() at import time. That is the innermost frame of the
+    traceback which is a module file called by the import system.
+    Blocks allocated later by functions of the module are not counted,
+    blocks which traceback deeper than frames are not attributed.
+    """
+
+    def __init__(self, top=10, frames=TRACE_FRAMES):
+        import tracemalloc
+        self._tracemalloc = tracemalloc
+        self.top = top
+        self.frames = frames
+
+    def start(self):
+        if not self._tracemalloc.is_tracing():
+            self._tracemalloc.start(self.frames)
+        return self
+
+    def attribute(self, modules=None):
+        """
+        Blocks still alive now, return (allocations, stats), allocations
+        is module to dict(traced_usage, traced_blocks, allocation_sites),
+        sites are top lines of the module file by size.
+        """
+        tracemalloc = self._tracemalloc
+        files = module_files(modules)
+        traces = get_raw_traces(tracemalloc)
+        lines = {}
+        traced = 0
+        attributed = 0
+        for trace in traces:
+            size = trace[1]
+            traced += size
+            frames = trace[2]
+            for i in range(1, len(frames)):
+                if frames[i][0] not in IMPORT_FILENAMES:
+                    continue
+                # the innermost import, blocks of the import system itself,
+                # eg: code objects of the module being loaded, are skipped
+                key = frames[i - 1]
+                if key[0] in files:
+                    item = lines.get(key)
+                    if item is None:
+                        lines[key] = [size, 1]
+                    else:
+                        item[0] += size
+                        item[1] += 1
+                    attributed += size
+                break
+        allocations = {}
+        for (filename, lineno), (size, count) in lines.items():
+            module = files[filename]
+            item = allocations.get(module)
+            if item is None:
+                item = allocations[module] = dict(
+                    traced_usage=0, traced_blocks=0, allocation_sites=[])
+            item['traced_usage'] += size
+            item['traced_blocks'] += count
+            item['allocation_sites'].append(
+                dict(lineno=lineno, size=size, count=count))
+        for item in allocations.values():
+            sites = item['allocation_sites']
+            sites.sort(key=lambda x: x['size'], reverse=True)
+            del sites[self.top:]
+        stats = dict(
+            frames=tracemalloc.get_traceback_limit(),
+            top=self.top,
+            traced=traced,
+            attributed=attributed,
+            tracemalloc_memory=tracemalloc.get_tracemalloc_memory(),
+        )
+        return allocations, stats
+
+
+def apply_module_fields(records, fields):
+    """
+    Set fields of modules known at save, eg: allocations, to the first
+    record of each module.
+    """
+    fields = dict(fields)
+    for r in records:
+        item = fields.pop(r['module'], None)
+        if item is not None:
+            r.update(item)
+    return records
@@ -0,0 +1,457 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+DEFAULT_MODULES = """
+json
+email.mime.multipart
+http.client
+logging.handlers
+xml.etree.ElementTree
+asyncio
+decimal
+argparse
+""".strip().split()
+
+LOOKUP_NUMBER = 100000
+
+SETUP_CODE = """
+import sys
+import time
+import module_graph
+hooker = None
+if {hooked!r}:
+    hooker = module_graph.setup_hooker(sampler={sampler!r})
+"""
+
+COLD_IMPORT_CODE = SETUP_CODE + """
+begin = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+value = time.perf_counter() - begin
+import json
+print(json.dumps(dict(value=value)))
+"""
+
+LOOKUP_CODE = SETUP_CODE + """
+for name in {modules!r}:
+    __import__(name)
+import json
+import timeit
+stmt = {stmt!r}
+number = {number!r}
+env = dict(sys=sys, name={modules!r}[0])
+if hooker and {importing!r}:
+    # lookups by module level code of a module being imported
+    hooker._begin_module('module_graph_benchmark')
+value = min(timeit.repeat(stmt, globals=env, number=number, repeat=3))
+if hooker and {importing!r}:
+    hooker._end_module('module_graph_benchmark')
+print(json.dumps(dict(value=value / number)))
+"""
+
+MEMORY_CODE = """
+import tracemalloc
+tracemalloc.start()
+""" + SETUP_CODE + """
+for name in {modules!r}:
+    __import__(name)
+value = tracemalloc.get_traced_memory()[0]
+num_records = len(hooker.handler.records) if hooker else 0
+import json
+print(json.dumps(dict(value=value, num_records=num_records)))
+"""
+
+THREADS_MODULES = """
+asyncio
+email.mime.multipart
+http.client
+http.server
+xml.dom.minidom
+xml.etree.ElementTree
+logging.handlers
+decimal
+fractions
+statistics
+csv
+unittest
+urllib.request
+smtplib
+tarfile
+zipfile
+shutil
+tempfile
+uuid
+pickle
+pprint
+difflib
+calendar
+configparser
+concurrent.futures
+inspect
+dataclasses
+ipaddress
+secrets
+hmac
+queue
+socketserver
+wsgiref.simple_server
+xmlrpc.client
+html.parser
+mailbox
+mimetypes
+plistlib
+shlex
+""".strip().split()
+
+THREADS_CODE = SETUP_CODE + """
+import random
+import threading
+modules = {modules!r}
+num_threads = {num_threads!r}
+rss_begin = hooker.sampler.sample() if hooker else 0
+barrier = threading.Barrier(num_threads)
+errors = []
+
+def worker(seed):
+    names = list(modules)
+    random.Random(seed).shuffle(names)
+    barrier.wait()
+    for name in names:
+        try:
+            __import__(name)
+        except Exception as ex:
+            errors.append(f'{{name}}: {{type(ex).__name__}}: {{ex}}')
+
+threads = [threading.Thread(target=worker, args=(i,))
+           for i in range(num_threads)]
+begin = time.perf_counter()
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+value = time.perf_counter() - begin
+result = dict(value=value, errors=errors)
+if hooker:
+    records = list(hooker.handler.records)
+    rss_delta = hooker.sampler.sample() - rss_begin
+    by_module = {{}}
+    for r in records:
+        by_module.setdefault(r.module, []).append(r)
+    # a parent must be importing in the same thread
+    wrong_parents = [
+        r.module for r in records if r.parent and not any(
+            x.thread == r.thread for x in by_module.get(r.parent, []))
+    ]
+    usage = sum(r.usage for r in records if not r.parent)
+    result.update(
+        num_records=len(records),
+        num_threads_used=len(set(r.thread for r in records)),
+        duplicated=sorted(k for k, v in by_module.items() if len(v) > 1),
+        wrong_parents=wrong_parents,
+        usage_ratio=usage / rss_delta if rss_delta > 0 else None,
+    )
+import json
+print(json.dumps(result))
+"""
+
+ALLOCATIONS_CODE = """
+import sys
+import time
+import module_graph
+hooker = module_graph.setup_hooker(
+    sampler={sampler!r}, allocation_sites={allocation_sites!r})
+begin = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+value = time.perf_counter() - begin
+result = dict(value=value)
+if hooker.handler.allocation_tracer:
+    begin = time.perf_counter()
+    hooker.handler._module_fields()
+    result.update(hooker.handler.meta['tracemalloc'])
+    result['attribute'] = time.perf_counter() - begin
+import json
+print(json.dumps(result))
+"""
+
+LOOKUP_STMTS = {
+    'lookup_getitem': 'sys.modules[name]',
+    'lookup_get': 'sys.modules.get(name)',
+    'lookup_contains': 'name in sys.modules',
+    'lookup_len': 'len(sys.modules)',
+    'lookup_keys': 'sys.modules.keys()',
+}
+# lookups which record an edge while a module is importing
+IMPORTING_LOOKUP_STMTS = {
+    'lookup_importing_getitem': 'sys.modules[name]',
+    'lookup_importing_get': 'sys.modules.get(name)',
+}
+
+
+def get_env():
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pythonpath = env.get('PYTHONPATH')
+    if pythonpath:
+        env['PYTHONPATH'] = package_root + os.pathsep + pythonpath
+    else:
+        env['PYTHONPATH'] = package_root
+    return env
+
+
+def run_child(code, **kwargs):
+    """Run code in a fresh python process, return the json it printed"""
+    code = code.format(**kwargs)
+    output = subprocess.check_output(
+        [sys.executable, '-c', code], env=get_env(), stdin=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def get_stats(values):
+    return dict(
+        median=statistics.median(values),
+        mean=statistics.mean(values),
+        stdev=statistics.stdev(values) if len(values) > 1 else 0,
+        min=min(values),
+        max=max(values),
+        values=values,
+    )
+
+
+def run_trials(code, trials, **kwargs):
+    """Run trials with and without hooker, interleaved to reduce drift"""
+    base = []
+    hooked = []
+    extra = {}
+    for __ in range(trials):
+        for is_hooked, values in [(False, base), (True, hooked)]:
+            result = run_child(code, hooked=is_hooked, **kwargs)
+            values.append(result.pop('value'))
+            if is_hooked:
+                extra.update(result)
+    ret = dict(base=get_stats(base), hooked=get_stats(hooked))
+    ret['overhead'] = ret['hooked']['median'] - ret['base']['median']
+    if ret['base']['median'] > 0:
+        ret['ratio'] = ret['hooked']['median'] / ret['base']['median']
+    ret.update(extra)
+    return ret
+
+
+def bench_cold_import(trials, modules, sampler):
+    """Seconds to import modules in a fresh process"""
+    result = run_trials(
+        COLD_IMPORT_CODE, trials, modules=modules, sampler=sampler)
+    return dict(cold_import=result)
+
+
+def bench_lookup(trials, modules, sampler):
+    """
+    Seconds per sys.modules lookup of an already imported module, outside
+    of imports and while a module is importing.
+    """
+    results = {}
+    for stmts, importing in [
+            (LOOKUP_STMTS, False), (IMPORTING_LOOKUP_STMTS, True)]:
+        for key, stmt in stmts.items():
+            results[key] = run_trials(
+                LOOKUP_CODE, trials, modules=modules, sampler=sampler,
+                stmt=stmt, number=LOOKUP_NUMBER, importing=importing)
+    return results
+
+
+def bench_memory(trials, modules, sampler):
+    """Python memory (bytes) retained by hooker, per recorded module"""
+    result = run_trials(MEMORY_CODE, trials, modules=modules, sampler=sampler)
+    num_records = result.get('num_records')
+    if num_records:
+        result['per_module'] = result['overhead'] / num_records
+    return dict(memory=result)
+
+
+def bench_threads(trials, modules, sampler, num_threads=8):
+    """
+    Seconds to import modules from a thread pool concurrently, each thread
+    import all modules in random order. The hooked run also checks records:
+    no error, no duplicated record, parent is importing in the same thread,
+    and usage_ratio, sum of top level usage / RSS growth, should close to 1.
+    """
+    result = run_trials(
+        THREADS_CODE, trials, modules=THREADS_MODULES, sampler=sampler,
+        num_threads=num_threads)
+    return dict(threads=result)
+
+
+def bench_allocations(trials, modules, sampler, allocation_sites=10):
+    """
+    Seconds to import modules with the hooker in RSS mode (base) and with
+    tracemalloc allocation attribution (hooked), plus seconds to attribute
+    traced blocks to modules at save.
+    """
+    base = []
+    hooked = []
+    attribute = []
+    extra = {}
+    for __ in range(trials):
+        result = run_child(
+            ALLOCATIONS_CODE, modules=modules, sampler=sampler,
+            allocation_sites=None)
+        base.append(result['value'])
+        result = run_child(
+            ALLOCATIONS_CODE, modules=modules, sampler=sampler,
+            allocation_sites=allocation_sites)
+        hooked.append(result.pop('value'))
+        attribute.append(result.pop('attribute'))
+        extra.update(result)
+    ret = dict(base=get_stats(base), hooked=get_stats(hooked))
+    ret['overhead'] = ret['hooked']['median'] - ret['base']['median']
+    ret['ratio'] = ret['hooked']['median'] / ret['base']['median']
+    ret['attribute'] = get_stats(attribute)
+    ret.update(extra)
+    return dict(allocations=ret)
+
+
+PROCESSOR_EDGES = (10 ** 4, 10 ** 5, 10 ** 6)
+
+
+def make_records(num_edges, num_children=10, num_duplicates=10, seed=0):
+    """
+    Synthetic records like merged snapshots of many processes, a few hub
+    modules import most of the others, and children of a module include
+    the modules it imported, like records of real hooker.
+    """
+    import random
+    rand = random.Random(seed)
+    num_modules = max(1, num_edges // (num_children * num_duplicates))
+    num_hubs = max(1, num_modules // 1000)
+    names = [f'pkg{i % 97}.mod{i}' for i in range(num_modules)]
+    parents = [None] + [
+        names[rand.randrange(min(i, num_hubs))] for i in range(1, num_modules)]
+    imported = {}
+    for name, parent in zip(names, parents):
+        if parent:
+            imported.setdefault(parent, []).append(name)
+    records = []
+    for __ in range(num_duplicates):
+        for name, parent in zip(names, parents):
+            children = rand.sample(names, min(num_children, num_modules))
+            records.append(dict(
+                module=name,
+                parent=parent,
+                children=children + imported.get(name, []),
+                usage=rand.randrange(10 * 1024 * 1024),
+                real_usage=rand.randrange(1024 * 1024),
+                time=rand.random() / 100,
+                real_time=rand.random() / 1000,
+            ))
+    return records
+
+
+def bench_processor(trials, modules, sampler):
+    """Seconds of RecordsProcessor on synthetic graphs of N edges"""
+    import time
+    from .render import RecordsProcessor
+    results = {}
+    for num_edges in PROCESSOR_EDGES:
+        records = make_records(num_edges)
+        values = []
+        for __ in range(trials):
+            begin = time.perf_counter()
+            RecordsProcessor.process(records, threshold=1)
+            values.append(time.perf_counter() - begin)
+        result = dict(
+            stats=get_stats(values),
+            num_edges=num_edges,
+            num_records=len(records),
+        )
+        result['per_edge'] = result['stats']['median'] / num_edges
+        results[f'processor_{num_edges}'] = result
+    return results
+
+
+SCENARIOS = {
+    'cold_import': bench_cold_import,
+    'lookup': bench_lookup,
+    'memory': bench_memory,
+    'threads': bench_threads,
+    'allocations': bench_allocations,
+    'processor': bench_processor,
+}
+
+
+def run_benchmark(scenarios=None, trials=5, modules=None, sampler=None):
+    """
+    Run scenarios, each scenario returns dict of result name to stats of
+    base and hooked process, plus the overhead and ratio of medians,
+    or stats of a single measurement.
+    """
+    modules = list(modules or DEFAULT_MODULES)
+    results = {}
+    for name in scenarios or SCENARIOS:
+        print(f'* benchmark {name}', file=sys.stderr)
+        results.update(SCENARIOS[name](trials, modules, sampler))
+    return dict(
+        python=sys.version,
+        platform=sys.platform,
+        trials=trials,
+        modules=modules,
+        sampler=sampler,
+        results=results,
+    )
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Benchmark')
+    parser.add_argument(
+        '--scenarios', dest='scenarios', type=str,
+        help=f'scenarios to run, default all: {",".join(SCENARIOS)}')
+    parser.add_argument(
+        '--trials', dest='trials', type=int, default=5,
+        help='number of fresh processes of each scenario')
+    parser.add_argument(
+        '--modules', dest='modules', type=str,
+        help='modules to import, default some stdlib packages')
+    parser.add_argument(
+        '--sampler', dest='sampler', type=str, default=None,
+        help='memory sampler of the hooker')
+    parser.add_argument(
+        '--output', dest='output', type=str, default='-',
+        help='save result json to this filepath, default stdout')
+    args = parser.parse_args()
+    scenarios = None
+    if args.scenarios:
+        scenarios = args.scenarios.replace(',', ' ').split()
+        for name in scenarios:
+            if name not in SCENARIOS:
+                parser.error(f'unknown scenario {name!r}')
+    modules = None
+    if args.modules:
+        modules = args.modules.replace(',', ' ').split()
+    result = run_benchmark(
+        scenarios=scenarios, trials=args.trials,
+        modules=modules, sampler=args.sampler)
+    content = json.dumps(result, indent=4)
+    if args.output == '-':
+        print(content)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)),
+                    exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(content)
+        for name, item in result['results'].items():
+            if 'stats' in item:
+                median = item['stats']['median']
+                print(f'* {name:<24s} median={median:.6g}')
+                continue
+            median = item['hooked']['median']
+            base = item['base']['median']
+            print(f'* {name:<24s} base={base:.6g} hooked={median:.6g}'
+                  f' ratio={item.get("ratio", 0):.2f}')
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import importlib.util
+
+
+LOG = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or '~/.cache'
+    return os.path.join(os.path.expanduser(cache_home), 'module_graph')
+
+
+def iter_package_files(module):
+    """Find all files of top level module without import it"""
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return
+    if spec is None:
+        return
+    if spec.submodule_search_locations:
+        for root_path in sorted(set(spec.submodule_search_locations)):
+            for root, dirs, files in os.walk(root_path):
+                dirs[:] = sorted(x for x in dirs if x != '__pycache__')
+                for filename in sorted(files):
+                    if not filename.endswith(('.pyc', '.pyo')):
+                        yield os.path.join(root, filename)
+    elif spec.origin and os.path.isfile(spec.origin):
+        yield spec.origin
+
+
+def get_distribution_versions():
+    """Map top level module to 'name==version' of it's distributions"""
+    try:
+        from importlib import metadata
+        packages_distributions = metadata.packages_distributions
+    except (ImportError, AttributeError):
+        return {}
+    versions = {}
+    for module, dists in packages_distributions().items():
+        items = set()
+        for dist in dists:
+            try:
+                items.add(f'{dist}=={metadata.version(dist)}')
+            except metadata.PackageNotFoundError:
+                pass
+        versions[module] = list(sorted(items))
+    return versions
+
+
+class TravelerCache:
+    """
+    On-disk cache of traveler results of top level modules.
+
+    An entry is valid while python version, the owning distribution version
+    and path, mtime and size (or content hash) of all module files unchanged,
+    and so are those of it's dependencies, eg: modules imported by it which
+    have records in the entry. The salt is for other options affect
+    results, eg: ignore patterns.
+    Least recently used entries are removed when exceed max_size bytes.
+    """
+
+    def __init__(self, cache_dir=None, mode='import', check='mtime',
+                 max_size=256 * 1024 * 1024, salt=''):
+        if check not in ('mtime', 'hash'):
+            raise ValueError(f'unknown cache check {check!r}')
+        self.cache_dir = os.path.abspath(cache_dir or default_cache_dir())
+        self.mode = mode
+        self.check = check
+        self.max_size = max_size
+        self.salt = salt
+        self._versions = None
+        self._fingerprints = {}
+
+    def _get_versions(self):
+        if self._versions is None:
+            self._versions = get_distribution_versions()
+        return self._versions
+
+    def _entry_path(self, module):
+        return os.path.join(self.cache_dir, f'{self.mode}-{module}.json')
+
+    def fingerprint(self, module):
+        fingerprint = self._fingerprints.get(module)
+        if fingerprint is None:
+            fingerprint = self._fingerprints[module] = self._fingerprint(
+                module)
+        return fingerprint
+
+    def _fingerprint(self, module):
+        h = hashlib.sha1()
+        h.update(f'{self.mode}\0{self.salt}\0{sys.version}\0'.encode())
+        h.update(f'{module}\0'.encode())
+        for dist in self._get_versions().get(module, []):
+            h.update(f'{dist}\0'.encode())
+        for filepath in iter_package_files(module):
+            try:
+                st = os.stat(filepath)
+            except OSError:
+                continue
+            h.update(f'{filepath}\0{st.st_size}\0'.encode())
+            if self.check == 'hash':
+                with open(filepath, 'rb') as f:
+                    h.update(hashlib.sha1(f.read()).digest())
+            else:
+                h.update(f'{st.st_mtime_ns}\0'.encode())
+        return h.hexdigest()
+
+    def get(self, module, fingerprint):
+        path = self._entry_path(module)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('fingerprint') != fingerprint:
+            return None
+        for depend, depend_fingerprint in entry.get('depends', {}).items():
+            if self.fingerprint(depend) != depend_fingerprint:
+                return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['data']
+
+    def put(self, module, fingerprint, data, depends=()):
+        """Save data of module, depends are top level modules it used"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(module)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        depends = {
+            x: self.fingerprint(x) for x in sorted(set(depends))
+            if x != module}
+        entry = dict(fingerprint=fingerprint, data=data, depends=depends)
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.shrink()
+
+    def _list_entries(self):
+        try:
+            filenames = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for filename in filenames:
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def shrink(self):
+        entries = sorted(self._list_entries())
+        total = sum(x[1] for x in entries)
+        for __, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            LOG.debug(f'cache evict {path}')
+
+    def clear(self, modules=None):
+        """Remove cache entries of all modes, default all modules"""
+        if modules is not None:
+            modules = set(modules)
+        count = 0
+        for __, __, path in self._list_entries():
+            filename = os.path.basename(path)
+            module = filename[:-len('.json')].partition('-')[2]
+            if modules is not None and module not in modules:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            count += 1
+        return count
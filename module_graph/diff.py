@@ -0,0 +1,302 @@
+import os.path
+import json
+import argparse
+
+from .hooker import mb, ms
+from .render import RecordsProcessor, label_of, normalize_filepath
+from .snapshot import load_records
+
+
+MB = 1024 * 1024
+DELTA_FIELDS = ('usage', 'real_usage', 'time', 'real_time')
+
+
+def _recorded_objects(records, all_objects=False):
+    """
+    Record objects which have record, by module name, all_objects includes
+    parents known only by name, eg: from truncated or windowed data.
+    """
+    processor = RecordsProcessor(records)
+    objects = processor.records_objects
+    if not all_objects:
+        objects = objects[:processor.graph.num_records]
+    return {x.module: x for x in objects}
+
+
+def _edges_of(objects):
+    edges = set()
+    for robj in objects.values():
+        if robj.parent is not None:
+            edges.add((robj.parent.module, robj.module))
+        for child in robj.children:
+            edges.add((robj.module, child.module))
+    return edges
+
+
+def _total(objects, field):
+    return sum(getattr(x, field) for x in objects.values() if x.parent is None)
+
+
+def _import_path(robj):
+    path = []
+    while robj is not None:
+        path.append(robj.module)
+        robj = robj.parent
+    return list(reversed(path))
+
+
+def diff_records(old_records, new_records, min_usage=1 * MB):
+    """
+    Compare two module graph data, records are aligned by module name.
+
+    Return dict of added and removed modules and edges, deltas of modules
+    in both data, and heavy paths: import path of each new module which
+    usage >= min_usage and imported by an existing module.
+    """
+    old = _recorded_objects(old_records)
+    new = _recorded_objects(new_records)
+    old_edges = _edges_of(old)
+    new_edges = _edges_of(new)
+    added = sorted(new.keys() - old.keys(),
+                   key=lambda x: new[x].usage, reverse=True)
+    removed = sorted(old.keys() - new.keys(),
+                     key=lambda x: old[x].usage, reverse=True)
+    changed = []
+    for module in new.keys() & old.keys():
+        item = dict(module=module)
+        for field in DELTA_FIELDS:
+            old_value = getattr(old[module], field)
+            new_value = getattr(new[module], field)
+            item['old_' + field] = old_value
+            item['new_' + field] = new_value
+            item[field] = new_value - old_value
+        if any(item[field] for field in DELTA_FIELDS):
+            changed.append(item)
+    changed.sort(key=lambda x: (x['real_usage'], x['usage']), reverse=True)
+    heavy_paths = []
+    for module in added:
+        robj = new[module]
+        if robj.usage < min_usage:
+            continue
+        if robj.parent is not None and robj.parent.module not in old:
+            continue  # not root of the new subtree
+        heavy_paths.append(dict(
+            module=module,
+            path=_import_path(robj),
+            usage=robj.usage,
+            time=robj.time,
+        ))
+    totals = {}
+    for field in ('usage', 'time'):
+        old_value = _total(old, field)
+        new_value = _total(new, field)
+        totals[field] = dict(
+            old=old_value, new=new_value, delta=new_value - old_value)
+    return dict(
+        totals=totals,
+        added_modules=[
+            dict(module=x, usage=new[x].usage, real_usage=new[x].real_usage,
+                 time=new[x].time)
+            for x in added
+        ],
+        removed_modules=[
+            dict(module=x, usage=old[x].usage, real_usage=old[x].real_usage,
+                 time=old[x].time)
+            for x in removed
+        ],
+        added_edges=sorted(new_edges - old_edges),
+        removed_edges=sorted(old_edges - new_edges),
+        changed_modules=changed,
+        heavy_paths=heavy_paths,
+    )
+
+
+def check_regressions(result, max_usage=None, max_module_usage=None,
+                      max_time=None):
+    """
+    Return messages of regressions exceed the limits: total usage increase
+    (bytes), self usage increase of any module or new module (bytes),
+    and total import time increase (seconds). None means no limit.
+    """
+    messages = []
+    totals = result['totals']
+    if max_usage is not None and totals['usage']['delta'] > max_usage:
+        messages.append(
+            f'total usage increased {mb(totals["usage"]["delta"])}M '
+            f'> {mb(max_usage)}M')
+    if max_time is not None and totals['time']['delta'] > max_time:
+        messages.append(
+            f'total time increased {ms(totals["time"]["delta"])}ms '
+            f'> {ms(max_time)}ms')
+    if max_module_usage is not None:
+        items = result['changed_modules'] + result['added_modules']
+        for item in items:
+            if item['real_usage'] > max_module_usage:
+                messages.append(
+                    f'{item["module"]} usage increased '
+                    f'{mb(item["real_usage"])}M > {mb(max_module_usage)}M')
+    return messages
+
+
+def print_result(result, limit=30):
+    totals = result['totals']
+    usage = totals['usage']
+    time = totals['time']
+    print(f'* total usage {mb(usage["old"])}M -> {mb(usage["new"])}M '
+          f'({mb(usage["delta"]):+}M)')
+    print(f'* total time {ms(time["old"])}ms -> {ms(time["new"])}ms '
+          f'({ms(time["delta"]):+}ms)')
+    print(f'* {len(result["added_modules"])} modules added, '
+          f'{len(result["removed_modules"])} modules removed, '
+          f'{len(result["added_edges"])} edges added, '
+          f'{len(result["removed_edges"])} edges removed')
+    for key, sign in [('added_modules', '+'), ('removed_modules', '-')]:
+        for item in result[key][:limit]:
+            module = f'{sign} {item["module"]} '
+            usage_mb = ' ' + str(mb(item['usage']))
+            print(f'* {module:-<60s}-{usage_mb:->5s}M '
+                  f'{ms(item["time"]):>6}ms')
+    print('* modules changed, self usage and time delta:')
+    for item in result['changed_modules'][:limit]:
+        module = item['module'] + ' '
+        usage_mb = f' {mb(item["real_usage"]):+}'
+        time_ms = f'{ms(item["real_time"]):+}'
+        print(f'* {module:-<60s}-{usage_mb:->6s}M {time_ms:>7s}ms')
+    for item in result['heavy_paths'][:limit]:
+        print(f'* new heavy path {mb(item["usage"])}M: '
+              + ' -> '.join(item['path']))
+
+
+def diff_subgraph(old_records, new_records, result, min_usage=1 * MB):
+    """
+    Changed subgraph of new data: nodes are (module, record object, color,
+    style), edges are (parent, module, color). Modules in the import path
+    which have no record in either data, eg: parents of a windowed
+    snapshot, have no record object.
+    """
+    old = _recorded_objects(old_records, all_objects=True)
+    new = _recorded_objects(new_records, all_objects=True)
+    recorded = _recorded_objects(new_records)
+    old_recorded = _recorded_objects(old_records)
+    colors = {}
+    for item in result['added_modules']:
+        colors[item['module']] = 'red'
+    for item in result['changed_modules']:
+        if item['real_usage'] >= min_usage:
+            colors[item['module']] = 'orange'
+        elif item['real_usage'] <= -min_usage:
+            colors[item['module']] = 'green'
+    for item in result['removed_modules']:
+        colors[item['module']] = 'grey'
+    nodes = set()
+    for module in colors:
+        robj = new.get(module) or old[module]
+        nodes.update(_import_path(robj))
+    node_items = []
+    for module in sorted(nodes):
+        robj = recorded.get(module) or old_recorded.get(module)
+        color = colors.get(module, 'black')
+        if robj is None:
+            style = 'dotted'
+        else:
+            style = 'dashed' if module not in recorded else 'solid'
+        node_items.append((module, robj, color, style))
+    edges = []
+    added_edges = set(map(tuple, result['added_edges']))
+    for objects in (new, old):
+        for module in nodes:
+            robj = objects.get(module)
+            if robj is None or robj.parent is None:
+                continue
+            if objects is old and module in recorded:
+                continue
+            edge = (robj.parent.module, module)
+            color = 'red' if edge in added_edges else 'black'
+            if objects is old:
+                color = 'grey'
+            edges.append((*edge, color))
+    return node_items, edges
+
+
+def render_diff(old_records, new_records, result, min_usage=1 * MB):
+    """
+    Render the changed subgraph of new data: added modules in red, modules
+    which self usage increased >= min_usage in orange, decreased in green,
+    removed modules dashed grey, plus the import path to them, parents
+    without record are bare dotted nodes.
+    """
+    from graphviz import Digraph
+    node_items, edges = diff_subgraph(
+        old_records, new_records, result, min_usage=min_usage)
+    dot = Digraph(comment='ModuleGraphDiff', graph_attr={'rankdir': 'LR'})
+    for module, robj, color, style in node_items:
+        label = module if robj is None else label_of(robj)
+        dot.node(module, label, color=color, fontcolor=color, style=style)
+    for parent, module, color in edges:
+        dot.edge(parent, module, color=color)
+    return dot
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='module-graph diff', description='Module Graph Diff')
+    parser.add_argument('old_filepath', help='module graph data of base run')
+    parser.add_argument('new_filepath', help='module graph data of new run')
+    parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        help='save full result as json to this filepath')
+    parser.add_argument(
+        '--render-filepath', dest='render_filepath', type=str,
+        help='render the changed subgraph to this PDF filepath')
+    parser.add_argument(
+        '--threshold', dest='threshold', type=float, default=1,
+        help='report new heavy paths and render changes >= threshold (MB)')
+    parser.add_argument(
+        '--max-usage', dest='max_usage', type=float,
+        help='exit 1 if total usage increased > max usage (MB)')
+    parser.add_argument(
+        '--max-module-usage', dest='max_module_usage', type=float,
+        help='exit 1 if self usage of any module increased > this (MB)')
+    parser.add_argument(
+        '--max-time', dest='max_time', type=float,
+        help='exit 1 if total import time increased > max time (ms)')
+    parser.add_argument(
+        '--limit', dest='limit', type=int, default=30,
+        help='number of modules to print of each section')
+    args = parser.parse_args(argv)
+    __, old_records = load_records(normalize_filepath(args.old_filepath))
+    __, new_records = load_records(normalize_filepath(args.new_filepath))
+    min_usage = args.threshold * MB
+    result = diff_records(old_records, new_records, min_usage=min_usage)
+    print_result(result, limit=args.limit)
+    if args.output_filepath:
+        output_filepath = normalize_filepath(args.output_filepath)
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        with open(output_filepath, 'w') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f'* save diff to {output_filepath}')
+    if args.render_filepath:
+        dot = render_diff(old_records, new_records, result,
+                          min_usage=min_usage)
+        render_filepath = normalize_filepath(args.render_filepath)
+        print(f'* render to {render_filepath}')
+        os.makedirs(os.path.dirname(render_filepath), exist_ok=True)
+        save_to, __ = os.path.splitext(render_filepath)
+        dot.render(filename=save_to, format='pdf')
+
+    def to_limit(value, unit):
+        return None if value is None else value * unit
+    messages = check_regressions(
+        result,
+        max_usage=to_limit(args.max_usage, MB),
+        max_module_usage=to_limit(args.max_module_usage, MB),
+        max_time=to_limit(args.max_time, 0.001),
+    )
+    for message in messages:
+        print(f'* regression: {message}')
+    if messages:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,281 @@
+import os.path
+import json
+import argparse
+
+from .hooker import mb, ms
+from .snapshot import load_records
+
+
+ROOT = '<process>'
+
+
+class ImportGraph:
+    """
+    Import graph of records, with a virtual root node imports all top level
+    modules. Edges are importer to module and module to it's children.
+    """
+
+    def __init__(self, records):
+        self.names = [ROOT]
+        self.ids = {ROOT: 0}
+        self.real_usage = [0]
+        self.real_time = [0]
+        self.real_gc_objects = [0]
+        self.succs = [[]]
+        self.preds = [[]]
+        self._edges = set()
+        seen = set()
+        for r in records:
+            node = self._add_node(r['module'])
+            if node in seen:
+                continue  # duplicated record, eg: reload
+            seen.add(node)
+            self.real_usage[node] = r['real_usage']
+            self.real_time[node] = r.get('real_time', 0)
+            self.real_gc_objects[node] = r.get('real_gc_objects', 0)
+        for r in records:
+            node = self.ids[r['module']]
+            parent = self._add_node(r['parent']) if r['parent'] else 0
+            self._add_edge(parent, node)
+            for child in r['children']:
+                self._add_edge(node, self._add_node(child))
+
+    def _add_node(self, name):
+        node = self.ids.get(name)
+        if node is None:
+            node = len(self.names)
+            self.ids[name] = node
+            self.names.append(name)
+            self.real_usage.append(0)
+            self.real_time.append(0)
+            self.real_gc_objects.append(0)
+            self.succs.append([])
+            self.preds.append([])
+        return node
+
+    def _add_edge(self, u, v):
+        if u != v and (u, v) not in self._edges:
+            self._edges.add((u, v))
+            self.succs[u].append(v)
+            self.preds[v].append(u)
+
+
+class DominatorTree:
+    """
+    Dominators of the import graph from the virtual root, by the iterative
+    algorithm of Cooper, Harvey and Kennedy. Module u dominates v if every
+    import path from the process root to v go through u, so removing u
+    also removes v.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        n = len(graph.names)
+        self.postorder = self._compute_postorder()
+        self.order = [-1] * n
+        for i, node in enumerate(self.postorder):
+            self.order[node] = i
+        self.idom = self._compute_idom()
+        self.tree = [[] for __ in range(n)]
+        for node, idom in enumerate(self.idom):
+            if idom >= 0 and node != 0:
+                self.tree[idom].append(node)
+        self._compute_subtrees()
+
+    def _compute_postorder(self):
+        succs = self.graph.succs
+        visited = [False] * len(succs)
+        postorder = []
+        visited[0] = True
+        stack = [(0, iter(succs[0]))]
+        while stack:
+            node, it = stack[-1]
+            for succ in it:
+                if not visited[succ]:
+                    visited[succ] = True
+                    stack.append((succ, iter(succs[succ])))
+                    break
+            else:
+                stack.pop()
+                postorder.append(node)
+        return postorder
+
+    def _compute_idom(self):
+        order = self.order
+        preds = self.graph.preds
+        idom = [-1] * len(order)
+        idom[0] = 0
+
+        def intersect(a, b):
+            while a != b:
+                while order[a] < order[b]:
+                    a = idom[a]
+                while order[b] < order[a]:
+                    b = idom[b]
+            return a
+
+        reverse_postorder = list(reversed(self.postorder))
+        changed = True
+        while changed:
+            changed = False
+            for node in reverse_postorder[1:]:
+                new_idom = -1
+                for pred in preds[node]:
+                    if idom[pred] < 0:
+                        continue
+                    if new_idom < 0:
+                        new_idom = pred
+                    else:
+                        new_idom = intersect(pred, new_idom)
+                if idom[node] != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+        return idom
+
+    def _compute_subtrees(self):
+        """
+        Retained usage, time and GC objects, and pre/post numbers of
+        dominator tree.
+        """
+        n = len(self.idom)
+        self.retained_usage = list(self.graph.real_usage)
+        self.retained_time = list(self.graph.real_time)
+        self.retained_gc_objects = list(self.graph.real_gc_objects)
+        self.num_dominated = [0] * n
+        self.enter = [-1] * n
+        self.leave = [-1] * n
+        counter = 0
+        stack = [(0, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                self.leave[node] = counter
+                counter += 1
+                parent = self.idom[node]
+                if node != 0:
+                    self.retained_usage[parent] += self.retained_usage[node]
+                    self.retained_time[parent] += self.retained_time[node]
+                    self.retained_gc_objects[parent] += \
+                        self.retained_gc_objects[node]
+                    self.num_dominated[parent] += self.num_dominated[node] + 1
+                continue
+            self.enter[node] = counter
+            counter += 1
+            stack.append((node, True))
+            for child in self.tree[node]:
+                stack.append((child, False))
+
+    def dominates(self, u, v):
+        return (self.enter[u] <= self.enter[v]
+                and self.leave[v] <= self.leave[u])
+
+    def edge_dominates(self, u, v):
+        """Every path to v use edge u -> v, so removing the edge removes v"""
+        if self.idom[v] != u:
+            return False
+        for pred in self.graph.preds[v]:
+            if pred != u and self.enter[pred] >= 0:
+                if not self.dominates(v, pred):
+                    return False
+        return True
+
+
+SORT_KEYS = ('usage', 'time', 'gc_objects')
+
+
+def analyze_dominators(records, sort='usage'):
+    """
+    Savings of removing each module or import edge: the self usage, time
+    and GC objects of all modules only reachable through it, shared
+    dependencies excluded. Sorted by sort key, one of SORT_KEYS.
+    """
+    graph = ImportGraph(records)
+    tree = DominatorTree(graph)
+    names = graph.names
+    modules = []
+    edges = []
+    for node in range(1, len(names)):
+        if tree.idom[node] < 0:
+            continue  # unreachable
+        idom = tree.idom[node]
+        modules.append(dict(
+            module=names[node],
+            idom=names[idom] if idom != 0 else None,
+            usage=tree.retained_usage[node],
+            time=tree.retained_time[node],
+            gc_objects=tree.retained_gc_objects[node],
+            num_modules=tree.num_dominated[node] + 1,
+        ))
+        for pred in graph.preds[node]:
+            if pred != 0 and tree.edge_dominates(pred, node):
+                edges.append(dict(
+                    parent=names[pred],
+                    child=names[node],
+                    usage=tree.retained_usage[node],
+                    time=tree.retained_time[node],
+                    gc_objects=tree.retained_gc_objects[node],
+                ))
+    others = [x for x in SORT_KEYS if x != sort]
+
+    def key_func(x):
+        return (x[sort], *(x[key] for key in others))
+    modules.sort(key=key_func, reverse=True)
+    edges.sort(key=key_func, reverse=True)
+    return dict(modules=modules, edges=edges)
+
+
+def _objects_text(value):
+    if not value:
+        return ''
+    return f' {round(value / 1000):>6d}K objs'
+
+
+def print_result(result, limit=30):
+    print('* modules, memory and time saved if the module removed:')
+    for item in result['modules'][:limit]:
+        module = item['module'] + ' '
+        usage_mb = ' ' + str(mb(item['usage']))
+        time_ms = str(ms(item['time']))
+        objects = _objects_text(item['gc_objects'])
+        print(f'* {module:-<60s}-{usage_mb:->5s}M {time_ms:>6s}ms '
+              f'{item["num_modules"]:>5d} modules{objects}')
+    print('* edges, memory and time saved if the import removed:')
+    for item in result['edges'][:limit]:
+        edge = f'{item["parent"]} --> {item["child"]} '
+        usage_mb = ' ' + str(mb(item['usage']))
+        time_ms = str(ms(item['time']))
+        objects = _objects_text(item['gc_objects'])
+        print(f'* {edge:-<60s}-{usage_mb:->5s}M {time_ms:>6s}ms{objects}')
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Dominators')
+    parser.add_argument(
+        '--input-filepath', dest='input_filepath', type=str,
+        default='data/module_graph.json',
+        help='the module graph data generated by hooker')
+    parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        help='save full result as json to this filepath')
+    parser.add_argument(
+        '--limit', dest='limit', type=int, default=30,
+        help='number of modules and edges to print')
+    parser.add_argument(
+        '--sort', dest='sort', choices=SORT_KEYS, default='usage',
+        help='rank by memory, time or objects added to the GC tracked '
+        'heap (recorded with track_gc)')
+    args = parser.parse_args()
+    __, records = load_records(args.input_filepath)
+    result = analyze_dominators(records, sort=args.sort)
+    print_result(result, limit=args.limit)
+    if args.output_filepath:
+        output_filepath = os.path.abspath(
+            os.path.expanduser(args.output_filepath))
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        with open(output_filepath, 'w') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f'* save dominators to {output_filepath}')
+
+
+if __name__ == "__main__":
+    cli()
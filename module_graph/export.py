@@ -0,0 +1,137 @@
+import json
+
+WEIGHTS = {
+    'usage': ('real_usage', 'bytes'),
+    'time': ('real_time', 'seconds'),
+    'cpu_time': ('real_cpu_time', 'seconds'),
+    'gc_objects': ('real_gc_objects', 'none'),
+    'gc_time': ('real_gc_time', 'seconds'),
+}
+
+
+class StackBuilder:
+    """
+    Import stack of records: top level module first, then each importer's
+    child, by parent of records. The first record of a module decides it's
+    parent, stacks are cached so each record costs O(1) on average.
+    """
+
+    def __init__(self, records):
+        self.parents = {}
+        for r in records:
+            self.parents.setdefault(r['module'], r['parent'])
+        self._stacks = {}
+
+    def stack_of(self, module):
+        stack = self._stacks.get(module)
+        if stack is not None:
+            return stack
+        chain = []
+        seen = set()
+        name = module
+        while name and name not in self._stacks and name not in seen:
+            seen.add(name)  # merged data may have cycles
+            chain.append(name)
+            name = self.parents.get(name)
+        stack = self._stacks.get(name, ())
+        for name in reversed(chain):
+            stack = stack + (name,)
+            self._stacks[name] = stack
+        return self._stacks[module]
+
+
+def _weight_of(record, weight):
+    field, unit = WEIGHTS[weight]
+    value = max(0, record.get(field, 0))
+    if unit == 'seconds':
+        return value
+    return int(value)
+
+
+def write_folded(records, f, weight='usage'):
+    """
+    Write folded stacks for flamegraph.pl, one line per record:
+    'top;child;module weight'. Weight is self value of the module,
+    bytes for usage, microseconds for time, cpu_time and gc_time, number
+    of objects for gc_objects.
+    """
+    builder = StackBuilder(records)
+    for r in records:
+        value = _weight_of(r, weight)
+        if WEIGHTS[weight][1] == 'seconds':
+            value = round(value * 1000000)
+        if value <= 0:
+            continue
+        stack = builder.stack_of(r['module'])
+        f.write(';'.join(stack) + f' {value}\n')
+
+
+def write_speedscope(records, f, weights=('usage', 'time'), name=None):
+    """
+    Write speedscope JSON, one sampled profile for each weight, each record
+    is a sample of it's import stack weighted by self value. Samples are
+    written as they are generated, frames are written at the end.
+    """
+    builder = StackBuilder(records)
+    frame_ids = {}
+    # frame ids of stack of a module, as json array content
+    id_stacks = {}
+
+    def ids_of(module):
+        ids = id_stacks.get(module)
+        if ids is not None:
+            return ids
+        stack = builder.stack_of(module)
+        i = len(stack) - 1
+        while i >= 0 and stack[i] not in id_stacks:
+            i -= 1
+        ids = id_stacks[stack[i]] if i >= 0 else ''
+        for frame in stack[i + 1:]:
+            frame_id = frame_ids.get(frame)
+            if frame_id is None:
+                frame_id = frame_ids[frame] = len(frame_ids)
+            ids = f'{ids},{frame_id}' if ids else str(frame_id)
+            id_stacks[frame] = ids
+        return ids
+
+    f.write('{"$schema": "https://www.speedscope.app/file-format-schema.json"')
+    f.write(', "exporter": "module-graph"')
+    f.write(', "name": ' + json.dumps(name or 'module graph'))
+    f.write(', "activeProfileIndex": 0, "profiles": [')
+    for i, weight in enumerate(weights):
+        field, unit = WEIGHTS[weight]
+        values = []
+        f.write(', ' if i else '')
+        f.write('{"type": "sampled", "name": ' + json.dumps(weight))
+        f.write(', "unit": ' + json.dumps(unit) + ', "samples": [')
+        first = True
+        for r in records:
+            value = _weight_of(r, weight)
+            if value <= 0:
+                continue
+            ids = ids_of(r['module'])
+            f.write(('[' if first else ',[') + ids + ']')
+            first = False
+            values.append(value)
+        f.write('], "weights": ' + json.dumps(values))
+        f.write(', "startValue": 0, "endValue": ' + json.dumps(sum(values)))
+        f.write('}')
+    f.write('], "shared": {"frames": [')
+    for i, frame in enumerate(frame_ids):
+        f.write((', ' if i else '') + json.dumps(dict(name=frame)))
+    f.write(']}}\n')
+
+
+def export_records(records, output_filepath, format='speedscope',
+                   weight='usage', name=None):
+    """Export records to folded stacks or speedscope JSON file"""
+    with open(output_filepath, 'w') as f:
+        if format == 'folded':
+            write_folded(records, f, weight=weight)
+        elif format == 'speedscope':
+            fields = records[0].keys() if records else ()
+            weights = [weight] + [
+                x for x in WEIGHTS if x != weight and WEIGHTS[x][0] in fields]
+            write_speedscope(records, f, weights=weights, name=name)
+        else:
+            raise ValueError(f'unknown export format {format!r}')
@@ -0,0 +1,307 @@
+import os
+import os.path
+import json
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .hooker import mb, ms
+from .graph import VALUE_FIELDS
+from .snapshot import load_records
+
+
+SNAPSHOT_SUFFIXES = ('.json', '.jsonl', '.mgb')
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch of log-spaced buckets, estimated quantiles are
+    within RELATIVE_ACCURACY of the true value. Size is bounded by the
+    range of values, not the number of values. Count, min and max are exact.
+    """
+
+    __slots__ = ('count', 'min', 'max', 'zero', 'positive', 'negative')
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.zero = 0
+        self.positive = {}
+        self.negative = {}
+
+    def add(self, value):
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value > 0:
+            key = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = math.ceil(math.log(-value) / _LOG_GAMMA)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero += 1
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        self.count += other.count
+        self.zero += other.zero
+        for store, other_store in [(self.positive, other.positive),
+                                   (self.negative, other.negative)]:
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+
+    def _buckets(self):
+        """(value, count) in ascending order"""
+        for key in sorted(self.negative, reverse=True):
+            yield -2 * _GAMMA ** key / (_GAMMA + 1), self.negative[key]
+        if self.zero:
+            yield 0, self.zero
+        for key in sorted(self.positive):
+            yield 2 * _GAMMA ** key / (_GAMMA + 1), self.positive[key]
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, count in self._buckets():
+            seen += count
+            if seen > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        median = self.quantile(0.5)
+        p95 = self.quantile(0.95)
+        if isinstance(self.min, int) and isinstance(self.max, int):
+            median = round(median)
+            p95 = round(p95)
+        return dict(
+            count=self.count,
+            min=self.min,
+            median=median,
+            p95=p95,
+            max=self.max,
+        )
+
+
+class FleetMerger:
+    """
+    Merge snapshots of many processes one by one. Keep a sketch of each value
+    field for each module, occurrences of parents and edges, so memory is
+    bounded by the size of the union graph, not the number of snapshots.
+    """
+
+    def __init__(self):
+        self.num_files = 0
+        self.samplers = set()
+        self.modules = {}
+        self.parents = {}
+        self.edges = {}
+
+    def add_records(self, records, meta=None):
+        self.num_files += 1
+        if meta and meta.get('sampler'):
+            self.samplers.add(meta['sampler'])
+        seen = set()
+        edges = set()
+        for r in records:
+            module = r['module']
+            if module in seen:
+                continue  # duplicated record of a process, eg: reload
+            seen.add(module)
+            sketches = self.modules.get(module)
+            if sketches is None:
+                sketches = self.modules[module] = {}
+            for field in VALUE_FIELDS:
+                value = r.get(field)
+                if value is None:
+                    continue
+                sketch = sketches.get(field)
+                if sketch is None:
+                    sketch = sketches[field] = QuantileSketch()
+                sketch.add(value)
+            parent = r['parent']
+            parents = self.parents.setdefault(module, {})
+            parents[parent] = parents.get(parent, 0) + 1
+            if parent:
+                edges.add((parent, module))
+            for child in r['children']:
+                edges.add((module, child))
+        for edge in edges:
+            self.edges[edge] = self.edges.get(edge, 0) + 1
+
+    def add_file(self, filepath):
+        meta, records = load_records(filepath)
+        self.add_records(records, meta)
+
+    def merge(self, other):
+        self.num_files += other.num_files
+        self.samplers.update(other.samplers)
+        for module, other_sketches in other.modules.items():
+            sketches = self.modules.setdefault(module, {})
+            for field, other_sketch in other_sketches.items():
+                sketch = sketches.get(field)
+                if sketch is None:
+                    sketches[field] = other_sketch
+                else:
+                    sketch.merge(other_sketch)
+        for module, other_parents in other.parents.items():
+            parents = self.parents.setdefault(module, {})
+            for parent, count in other_parents.items():
+                parents[parent] = parents.get(parent, 0) + count
+        for edge, count in other.edges.items():
+            self.edges[edge] = self.edges.get(edge, 0) + count
+
+    def result(self):
+        """
+        Return (meta, records), records can be rendered as module graph data:
+        values are medians, parent is the most common parent, children are
+        union of edges. Percentiles are in stats and edge counts in edges.
+        """
+        children = {}
+        for (parent, child), count in sorted(self.edges.items()):
+            children.setdefault(parent, {})[child] = count
+        records = []
+        for module, sketches in self.modules.items():
+            parents = self.parents[module]
+            # ties by name, independent of the order snapshots merged
+            parent = min(parents, key=lambda x: (
+                -parents[x], x is not None, x or ''))
+            stats = {f: x.to_dict() for f, x in sketches.items()}
+            record = dict(
+                module=module,
+                parent=parent,
+                children=sorted(children.get(module, ())),
+                count=max(x['count'] for x in stats.values()),
+            )
+            for field, item in stats.items():
+                record[field] = item['median']
+            record['stats'] = stats
+            record['edges'] = children.get(module, {})
+            records.append(record)
+
+        def key_func(x):
+            return -(x['stats'].get('usage', {}).get('p95') or 0), x['module']
+        records.sort(key=key_func)
+        meta = dict(
+            mode='fleet',
+            num_files=self.num_files,
+            samplers=sorted(self.samplers),
+            relative_accuracy=RELATIVE_ACCURACY,
+        )
+        return meta, records
+
+
+def find_snapshot_files(paths):
+    """Snapshot files of paths, directories are searched recursively"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.endswith(SNAPSHOT_SUFFIXES):
+                    yield os.path.join(root, filename)
+
+
+def _merge_files(filepaths):
+    merger = FleetMerger()
+    for filepath in filepaths:
+        merger.add_file(filepath)
+    return merger
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def merge_snapshots(paths, jobs=1, chunksize=16):
+    """
+    Stream snapshot files into a FleetMerger. With jobs > 1, chunks of files
+    are merged in worker processes, at most 2 * jobs chunks in flight.
+    """
+    merger = FleetMerger()
+    filepaths = find_snapshot_files(paths)
+    if jobs <= 1:
+        for filepath in filepaths:
+            merger.add_file(filepath)
+        return merger
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        for chunk in _chunks(filepaths, chunksize):
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merger.merge(future.result())
+            pending.add(executor.submit(_merge_files, chunk))
+        for future in pending:
+            merger.merge(future.result())
+    return merger
+
+
+def print_result(meta, records, limit=30):
+    print(f'* merged {meta["num_files"]} snapshots, {len(records)} modules')
+    if len(meta['samplers']) > 1:
+        print(f'* warning: mixed samplers {", ".join(meta["samplers"])}')
+    print('* modules, usage median/p95/max and time median/p95:')
+    for r in records[:limit]:
+        module = r['module'] + ' '
+        usage = r['stats'].get('usage', {})
+        time = r['stats'].get('time', {})
+        usage_mb = '/'.join(
+            str(mb(usage.get(x) or 0)) for x in ('median', 'p95', 'max'))
+        time_ms = '/'.join(
+            str(ms(time.get(x) or 0)) for x in ('median', 'p95'))
+        print(f'* {module:-<50s} {usage_mb:>12s}M {time_ms:>10s}ms '
+              f'{r["count"]:>6d} procs')
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Fleet Merge')
+    parser.add_argument(
+        'paths', nargs='+',
+        help='snapshot files, or directories of snapshot files')
+    parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        default='data/module_graph_fleet.json',
+        help='save merged module graph data to this filepath')
+    parser.add_argument(
+        '--jobs', dest='jobs', type=int, default=1,
+        help='merge files in N worker processes')
+    parser.add_argument(
+        '--limit', dest='limit', type=int, default=30,
+        help='number of modules to print')
+    args = parser.parse_args()
+    merger = merge_snapshots(args.paths, jobs=args.jobs)
+    meta, records = merger.result()
+    print_result(meta, records, limit=args.limit)
+    output_filepath = os.path.abspath(os.path.expanduser(args.output_filepath))
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    with open(output_filepath, 'w') as f:
+        json.dump(dict(meta, records=records), f, ensure_ascii=False)
+    print(f'* save fleet module graph to {output_filepath}')
+
+
+if __name__ == "__main__":
+    cli()
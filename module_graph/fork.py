@@ -0,0 +1,117 @@
+import os
+import os.path
+import gc
+import sys
+import json
+import types
+
+SMAPS_ROLLUP = '/proc/self/smaps_rollup'
+SHARING_FIELDS = {
+    b'Rss': 'rss',
+    b'Pss': 'pss',
+    b'Shared_Clean': 'shared',
+    b'Shared_Dirty': 'shared',
+    b'Private_Clean': 'private',
+    b'Private_Dirty': 'private',
+}
+
+
+def per_pid_filepath(filepath, pid):
+    """data/module_graph.json -> data/module_graph.<pid>.json"""
+    if not filepath or filepath == '-':
+        return filepath
+    root, ext = os.path.splitext(filepath)
+    return f'{root}.{pid}{ext}'
+
+
+def read_sharing():
+    """Shared and private memory of current process, bytes, {} if unknown"""
+    try:
+        with open(SMAPS_ROLLUP, 'rb') as f:
+            content = f.read()
+    except OSError:
+        return {}
+    ret = dict.fromkeys(['rss', 'pss', 'shared', 'private'], 0)
+    for line in content.splitlines():
+        key, __, value = line.partition(b':')
+        name = SHARING_FIELDS.get(key)
+        if name:
+            ret[name] += int(value.split()[0]) * 1024
+    return ret
+
+
+def touch_module(module, visited):
+    """
+    Reference all objects reachable from module, objects of other modules
+    and objects already visited are skipped. Return number of objects.
+    """
+    num_objects = 0
+    stack = [module]
+    while stack:
+        obj = stack.pop()
+        for ref in gc.get_referents(obj):
+            key = id(ref)
+            if key in visited or isinstance(ref, types.ModuleType):
+                continue
+            visited.add(key)
+            stack.append(ref)
+            num_objects += 1
+    return num_objects
+
+
+def _probe_copy_on_write(modules, write_fd):
+    import tracemalloc
+    from .sampler import USSSampler
+    sampler = USSSampler()
+    # bookkeeping memory of the probe is traced and excluded
+    tracemalloc.start()
+    visited = set()
+    result = []
+    for name in modules:
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        traced = tracemalloc.get_traced_memory()[0]
+        overhead = tracemalloc.get_tracemalloc_memory()
+        uss = sampler.sample()
+        num_objects = touch_module(module, visited)
+        private = sampler.sample() - uss
+        private -= tracemalloc.get_traced_memory()[0] - traced
+        private -= tracemalloc.get_tracemalloc_memory() - overhead
+        result.append(dict(
+            module=name, private=max(0, private), num_objects=num_objects))
+    with os.fdopen(write_fd, 'w') as f:
+        json.dump(result, f)
+
+
+def measure_copy_on_write(modules):
+    """
+    Measure memory of each module which becomes private after fork when
+    it's objects are used, in a forked probe process: reference all objects
+    reachable from the module, like refcount and GC do in a worker, and
+    measure USS growth by /proc/self/smaps_rollup. Modules are walked in
+    the order given, objects shared by modules count to the first one.
+
+    Return list of dict(module, private, num_objects), the probe process
+    is discarded, so sharing of current process is not affected.
+    """
+    if not os.path.exists(SMAPS_ROLLUP):
+        raise RuntimeError(f'{SMAPS_ROLLUP} not available')
+    modules = list(modules)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_fd)
+            _probe_copy_on_write(modules, write_fd)
+            code = 0
+        finally:
+            os._exit(code)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        content = f.read()
+    __, status = os.waitpid(pid, 0)
+    if status != 0 or not content:
+        raise RuntimeError(f'copy-on-write probe failed, status {status}')
+    return json.loads(content)
@@ -0,0 +1,64 @@
+import gc
+import sys
+import time
+
+# gc.get_objects(generation) is new in Python 3.8
+HAS_GENERATION_OBJECTS = sys.version_info >= (3, 8)
+
+
+class GCTracker:
+    """
+    Count objects tracked by the garbage collector, collections of each
+    generation and pause time of collections, by gc.callbacks.
+
+    Number of tracked objects is kept without walking the heap: the count
+    of generation 0 is allocations minus deallocations of tracked objects
+    since the last collection. When generation 0 is collected, the change
+    is counted by sizes of generation 0 and 1, which are small, so objects
+    untracked by the collector, eg: tuples of atomic values, are excluded.
+    For older generations, objects freed by the collection are subtracted,
+    so are they for generation 0 before Python 3.8, which overcounts.
+    """
+
+    def __init__(self):
+        self.objects = 0
+        self.pause = 0.0
+        self.collections = [0] * len(gc.get_count())
+        self._young = None
+        self._collect_begin = None
+
+    def start(self):
+        if self._callback not in gc.callbacks:
+            gc.callbacks.append(self._callback)
+        return self
+
+    def stop(self):
+        if self._callback in gc.callbacks:
+            gc.callbacks.remove(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self.objects += gc.get_count()[0]
+            self._young = None
+            if (info['generation'] == 0 and len(self.collections) == 3
+                    and HAS_GENERATION_OBJECTS):
+                self._young = (
+                    len(gc.get_objects(0)), len(gc.get_objects(1)))
+            self._collect_begin = time.perf_counter()
+        elif self._collect_begin is not None:
+            self.pause += time.perf_counter() - self._collect_begin
+            self._collect_begin = None
+            self.collections[info['generation']] += 1
+            if self._young is None:
+                self.objects -= info['collected']
+                return
+            # generation 0 is moved to generation 1, count0 was added
+            num_young, num_old = self._young
+            moved = len(gc.get_objects(1)) - num_old
+            self.objects += moved - gc.get_count()[0] - num_young
+            self._young = None
+
+    def sample(self):
+        """Tracked objects since start, pause seconds, collections"""
+        objects = self.objects + gc.get_count()[0]
+        return objects, self.pause, tuple(self.collections)
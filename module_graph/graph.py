@@ -0,0 +1,115 @@
+from array import array
+
+
+VALUE_FIELDS = (
+    'usage', 'real_usage', 'time', 'real_time', 'cpu_time', 'real_cpu_time',
+    'traced_usage', 'native_usage', 'native_private',
+    'gc_objects', 'real_gc_objects', 'gc_time', 'real_gc_time',
+)
+
+
+def is_related_module(a, b):
+    return a.startswith(b) or b.startswith(a)
+
+
+class ModuleGraph:
+    """
+    Indexed module graph, module names are interned to integer ids,
+    children are stored as CSR arrays: children of node i are
+    children[offsets[i]:offsets[i + 1]].
+
+    Nodes with record get ids first, in order of first appearance, then
+    parents and children without record, in order of first reference.
+    All passes are linear to number of records and edges.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.num_records = 0
+        self.parents = array('i')
+        self.values = {field: [] for field in VALUE_FIELDS}
+        self.offsets = array('Q', [0])
+        self.children = array('I')
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        node = self.ids.get(name)
+        if node is None:
+            node = len(self.names)
+            self.ids[name] = node
+            self.names.append(name)
+            self.parents.append(-1)
+            for values in self.values.values():
+                values.append(0)
+        return node
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build graph from records dicts. Duplicated records are merged:
+        first parent, union of children and sum of values. Then remove
+        edges duplicated with parent relation, and edges between package
+        and it's submodules.
+        """
+        graph = cls()
+        parent_names = []
+        child_names = []
+        merged = bytearray()
+        values = graph.values
+        for r in records:
+            node = graph.intern(r['module'])
+            if node == len(parent_names):
+                parent_names.append(r['parent'])
+                child_names.append(list(r['children']))
+                merged.append(0)
+            else:
+                child_names[node].extend(r['children'])
+                merged[node] = 1
+            for field, field_values in values.items():
+                field_values[node] += r.get(field, 0)
+        num_records = graph.num_records = len(parent_names)
+        names = graph.names
+        parents = graph.parents
+        offsets = graph.offsets
+        children = graph.children
+        for node in range(num_records):
+            module = names[node]
+            parent = parent_names[node]
+            if parent:
+                parents[node] = graph.intern(parent)
+            if merged[node]:
+                node_children = sorted(set(child_names[node]))
+            else:
+                node_children = child_names[node]
+            for child in node_children:
+                if is_related_module(child, module):
+                    continue
+                child_node = graph.ids.get(child)
+                if child_node is not None and child_node < num_records:
+                    if parent_names[child_node] == module:
+                        continue
+                children.append(graph.intern(child))
+            offsets.append(len(children))
+        return graph
+
+    def get_children(self, node):
+        if node >= self.num_records:
+            return self.children[0:0]
+        return self.children[self.offsets[node]:self.offsets[node + 1]]
+
+    def fix_real_values(self):
+        """Cumulative values should not less than self values"""
+        for field in ('usage', 'time', 'cpu_time', 'gc_objects', 'gc_time'):
+            values = self.values[field]
+            real_values = self.values['real_' + field]
+            for node, (value, real_value) in enumerate(
+                    zip(values, real_values)):
+                if value < real_value:
+                    values[node] = real_value
+
+    def select(self, min_usage):
+        """Keep mask of nodes which usage >= min_usage"""
+        return bytearray(x >= min_usage for x in self.values['usage'])
@@ -1,32 +1,35 @@
+import os
 import sys
-import resource
+import time
+import warnings
+import threading
+import contextvars
 
+from .sampler import MaxRSSSampler, get_sampler
+from .fork import per_pid_filepath, read_sharing, measure_copy_on_write
+from .allocation import AllocationTracer, apply_module_fields
+from .native import NativeTracker
+from .gcstats import GCTracker
+from .importio import IOProfiler
 
-def _get_memory_maxrss():
-    """Memory usage (kilobytes on Linux, bytes on OS X)"""
-    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+_maxrss_sampler = MaxRSSSampler()
 
 
-def _get_memory_unit():
-    # call this after process start
-    base = _get_memory_maxrss()
-    if base < 500 * 1024:
-        unit = 1024
-    else:
-        unit = 1
-    return unit
+def get_memory_maxrss() -> int:
+    """Peak memory usage, bytes"""
+    return _maxrss_sampler.sample()
 
 
-MEMORY_UNIT = _get_memory_unit()
+def mb(v):
+    return round(v / 1024 / 1024)
 
 
-def get_memory_maxrss() -> int:
-    """Memory usage, bytes"""
-    return _get_memory_maxrss() * MEMORY_UNIT
+def kb(v):
+    return round(v / 1024)
 
 
-def mb(v):
-    return round(v / 1024 / 1024)
+def ms(v):
+    return round(v * 1000)
 
 
 class ModuleMemoryRecord:
@@ -38,6 +41,18 @@ class ModuleMemoryRecord:
         memory_begin=0,
         memory_end=0,
         memory_inner=0,
+        memory_other=0,
+        time_begin=0,
+        time_end=0,
+        time_inner=0,
+        cpu_time_begin=0,
+        cpu_time_end=0,
+        cpu_time_inner=0,
+        gc_begin=None,
+        gc_end=None,
+        gc_objects_inner=0,
+        gc_time_inner=0,
+        thread=None,
     ):
         self.module = module
         self.parent = parent
@@ -45,6 +60,21 @@ class ModuleMemoryRecord:
         self.memory_begin = memory_begin
         self.memory_end = memory_end
         self.memory_inner = memory_inner
+        self.memory_other = memory_other
+        self.time_begin = time_begin
+        self.time_end = time_end
+        self.time_inner = time_inner
+        self.cpu_time_begin = cpu_time_begin
+        self.cpu_time_end = cpu_time_end
+        self.cpu_time_inner = cpu_time_inner
+        # samples of GCTracker: objects, pause seconds, collections
+        self.gc_begin = gc_begin
+        self.gc_end = gc_end
+        self.gc_objects_inner = gc_objects_inner
+        self.gc_time_inner = gc_time_inner
+        self.thread = thread
+        # unclamped sum of memory_delta of children, for memory_other
+        self.memory_inner_delta = 0
 
     def __repr__(self):
         type_name = type(self).__name__
@@ -53,62 +83,372 @@ class ModuleMemoryRecord:
         return (f'<{type_name} {self.module} {real_usage}M/{usage}M '
                 f'parent={self.parent} children={self.children}>')
 
+    @property
+    def memory_delta(self):
+        """Unclamped usage, negative if memory freed meanwhile"""
+        return self.memory_end - self.memory_begin - self.memory_other
+
     @property
     def usage(self):
-        return max(0, self.memory_end - self.memory_begin)
+        """
+        Memory usage including children, memory of modules imported by
+        other threads meanwhile (memory_other) is excluded.
+        """
+        return max(0, self.memory_delta)
 
     @property
     def real_usage(self):
         return max(0, self.usage - self.memory_inner)
 
+    @property
+    def time(self):
+        """Wall time, seconds, including children"""
+        return max(0, self.time_end - self.time_begin)
+
+    @property
+    def real_time(self):
+        return max(0, self.time - self.time_inner)
+
+    @property
+    def cpu_time(self):
+        """CPU time of the importing thread, seconds, including children"""
+        return max(0, self.cpu_time_end - self.cpu_time_begin)
+
+    @property
+    def real_cpu_time(self):
+        return max(0, self.cpu_time - self.cpu_time_inner)
+
+    @property
+    def gc_objects(self):
+        """Objects added to the GC tracked heap, including children"""
+        return max(0, self.gc_end[0] - self.gc_begin[0])
+
+    @property
+    def real_gc_objects(self):
+        return max(0, self.gc_objects - self.gc_objects_inner)
+
+    @property
+    def gc_time(self):
+        """Pause time of GC collections, seconds, including children"""
+        return max(0, self.gc_end[1] - self.gc_begin[1])
+
+    @property
+    def real_gc_time(self):
+        return max(0, self.gc_time - self.gc_time_inner)
+
+    @property
+    def gc_collections(self):
+        """Number of collections of each generation, including children"""
+        return [end - begin for begin, end in zip(
+            self.gc_begin[2], self.gc_end[2])]
+
     def to_dict(self):
-        return dict(
+        ret = dict(
             module=self.module,
             parent=self.parent,
             children=list(sorted(self.children)),
             usage=self.usage,
             real_usage=self.real_usage,
+            time=self.time,
+            real_time=self.real_time,
+            cpu_time=self.cpu_time,
+            real_cpu_time=self.real_cpu_time,
         )
+        if self.gc_begin is not None and self.gc_end is not None:
+            ret.update(
+                gc_objects=self.gc_objects,
+                real_gc_objects=self.real_gc_objects,
+                gc_time=self.gc_time,
+                real_gc_time=self.real_gc_time,
+                gc_collections=self.gc_collections,
+            )
+        return ret
 
 
 class MemoryHooker:
-    def __init__(self, handler=None):
-        self.records = []
+    """
+    Record module imports. Each thread (or context, eg: greenlet) has it's
+    own stack of modules being imported, all stacks are in importing.
+    """
+
+    def __init__(self, handler=None, sampler=None,
+                 max_seconds=None, max_imports=None, native_tracker=None,
+                 gc_tracker=None, io_profiler=None):
+        self.importing = {}
         self.handler = handler
+        self.native_tracker = native_tracker
+        self.gc_tracker = gc_tracker
+        self.io_profiler = io_profiler
+        self._creating = {}
+        # modules being imported by the forking thread, in forked child
+        self._forked_modules = []
+        self.sampler = get_sampler(sampler)
+        self.server = None
+        self.enabled = False
+        self.max_seconds = max_seconds
+        self.max_imports = max_imports
+        self.num_imports = 0
+        self.deadline = None
+        self._timer = None
+        self._origin_sys_modules = None
+        self._sys_modules = None
+        self._fork_handled = False
+        self._stack = contextvars.ContextVar('module_graph_stack', default=())
+        self._lock = threading.Lock()
+        # sum of real usage of all finished records, to find memory of
+        # modules imported by other threads while a module importing
+        self._finished_usage = 0
+
+    def start(self):
+        """Patch sys.meta_path and sys.modules, start recording"""
+        if self.enabled:
+            return
+        self.num_imports = 0
+        self.deadline = None
+        if self.max_seconds:
+            self.deadline = time.monotonic() + self.max_seconds
+            self._timer = threading.Timer(
+                self.max_seconds, self._on_window_end)
+            self._timer.daemon = True
+            self._timer.start()
+        self._origin_sys_modules = unwrap(sys.modules)
+        if self._sys_modules is None:
+            self._sys_modules = wrap_sys_modules(self)
+        meta_path = MetaPathList(self)
+        meta_path.extend(sys.meta_path)
+        sys.meta_path = meta_path
+        sys.modules = self._sys_modules
+        if self.io_profiler is not None:
+            self.io_profiler.install()
+        self.enabled = True
+
+    def stop(self):
+        """
+        Restore sys.meta_path and sys.modules, stop recording,
+        lookups of sys.modules cost as native. Modules being imported
+        are still recorded when they finished.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        sys.modules = self._origin_sys_modules
+        sys.meta_path = [unwrap(x) for x in sys.meta_path]
+        if self.io_profiler is not None:
+            self.io_profiler.uninstall()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def toggle(self):
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def dump(self):
+        """Save records recorded so far"""
+        if self.handler:
+            self.handler.save()
+
+    def _on_window_end(self):
+        # called by the timer thread too: records of other threads are
+        # finished under the lock, new imports are not hooked once stopped
+        with self._lock:
+            if not self.enabled:
+                return
+            self.stop()
+            self.dump()
+
+    def handle_signals(self, toggle_signal=None, dump_signal=None):
+        """Toggle recording or dump records when receive signals"""
+        import signal
+        if toggle_signal:
+            signal.signal(toggle_signal, lambda *args: self.toggle())
+        if dump_signal:
+            signal.signal(dump_signal, lambda *args: self.dump())
+
+    def handle_fork(self):
+        """
+        Reset state in forked child process: modules being imported are
+        recorded by the parent, the child records it's own imports and
+        save them to per-PID output, see ModuleMomoryHandler.on_fork.
+        """
+        if self._fork_handled or not hasattr(os, 'register_at_fork'):
+            return
+        self._fork_handled = True
+        os.register_at_fork(
+            before=self._before_fork,
+            after_in_child=self._after_fork_in_child,
+        )
+
+    def _before_fork(self):
+        flush = getattr(self.handler, 'flush', None)
+        if flush is not None:
+            flush()
+
+    @property
+    def records(self):
+        """Stack of modules being imported by current thread"""
+        return list(self._stack.get())
+
+    def _after_fork_in_child(self):
+        self._forked_modules = [x.module for x in self._stack.get()]
+        self._stack.set(())
+        self.importing = {}
+        self._creating = {}
+        self._lock = threading.Lock()
+        self.num_imports = 0
+        # threads are not running in the child
+        self._timer = None
+        if self.server is not None:
+            self.server.detach()
+            self.server = None
+        if self.handler:
+            self.handler.on_fork()
+
+    def measure_copy_on_write(self):
+        """
+        Measure memory of each recorded module which becomes private after
+        fork, save to meta of handler, see fork.measure_copy_on_write.
+        """
+        records = []
+        if self.handler:
+            load = getattr(self.handler, 'load_records', None)
+            if load is not None:
+                records = load()
+            else:
+                records = [x.to_dict() for x in self.handler.records]
+        usages = {x['module']: x['real_usage'] for x in records}
+        enabled = self.enabled
+        # the probe process inherit it, imports of the probe are not recorded
+        self.enabled = False
+        try:
+            result = measure_copy_on_write(usages)
+        finally:
+            self.enabled = enabled
+        for item in result:
+            usage = usages[item['module']]
+            item['usage'] = usage
+            item['shared'] = max(0, usage - item['private'])
+        if self.handler:
+            self.handler.meta['copy_on_write'] = result
+        return result
 
     def _add_child(self, module):
-        if self.records:
-            parent = self.records[-1]
-            if module != parent.module:
+        stack = self._stack.get()
+        if stack:
+            parent = stack[-1]
+            if module != parent.module and module not in parent.children:
                 parent.children.add(module)
                 if self.handler:
                     self.handler.on_child(parent, module)
 
+    def _claim_native(self, module=None):
+        """
+        Shared objects mapped since last claim count to module, default
+        the module being imported by current thread.
+        """
+        if module is None:
+            stack = self._stack.get()
+            module = stack[-1].module if stack else None
+        with self._lock:
+            self.native_tracker.claim(module)
+
+    def _before_create(self, module):
+        """
+        Extension modules are mapped by create_module, before exec_module,
+        in native mode the record of a module begins here.
+        """
+        self._claim_native()
+        self._creating[module] = (
+            time.perf_counter(), time.thread_time(), self.sampler.sample())
+
     def _begin_module(self, module):
-        memory_begin = get_memory_maxrss()
-        self.records.append(ModuleMemoryRecord(
+        created = self._creating.pop(module, None) if self._creating else None
+        record = ModuleMemoryRecord(
             module=module,
-            memory_begin=memory_begin,
-        ))
+            time_begin=time.perf_counter(),
+            cpu_time_begin=time.thread_time(),
+            thread=threading.current_thread().name,
+        )
+        if self.native_tracker is not None and created is None:
+            self._claim_native()
+        # stack is immutable, a context copied while importing,
+        # eg: asyncio task, doesn't share the stack with it's origin
+        self._stack.set(self._stack.get() + (record,))
+        with self._lock:
+            record.memory_other = self._finished_usage
+            if created is None:
+                record.memory_begin = self.sampler.sample()
+            else:
+                (record.time_begin, record.cpu_time_begin,
+                 record.memory_begin) = created
+            if self.gc_tracker is not None:
+                record.gc_begin = self.gc_tracker.sample()
+            self.importing[id(record)] = record
 
     def _end_module(self, module):
-        record = self.records.pop()
+        stack = self._stack.get()
+        if not stack:
+            if module in self._forked_modules:
+                # began before fork, recorded by the parent process
+                self._forked_modules.remove(module)
+            else:
+                warnings.warn(
+                    f'module_graph: end of {module} which never began, '
+                    'record dropped', RuntimeWarning)
+            return
+        record = stack[-1]
         if record.module != module:
             msg = f'unexpected module {record.module}, expect {module}'
             raise ValueError(msg)
-        record.memory_end = get_memory_maxrss()
-        if self.records:
-            parent = self.records[-1]
-            parent.memory_inner += record.usage
-            record.parent = parent.module
-        if self.handler:
-            self.handler.on_import(record)
+        stack = stack[:-1]
+        self._stack.set(stack)
+        record.cpu_time_end = time.thread_time()
+        record.time_end = time.perf_counter()
+        with self._lock:
+            record.memory_end = self.sampler.sample()
+            if self.native_tracker is not None:
+                self.native_tracker.claim(module)
+            if self.gc_tracker is not None:
+                record.gc_end = self.gc_tracker.sample()
+            # unclamped deltas of finished records of this stack add up to
+            # memory_inner_delta, the rest are finished by other threads
+            finished_usage = self._finished_usage - record.memory_other
+            record.memory_other = finished_usage - record.memory_inner_delta
+            self._finished_usage += (
+                record.memory_delta - record.memory_inner_delta)
+            self.importing.pop(id(record), None)
+            if stack:
+                parent = stack[-1]
+                parent.memory_inner += record.usage
+                parent.memory_inner_delta += record.memory_delta
+                parent.time_inner += record.time
+                parent.cpu_time_inner += record.cpu_time
+                if record.gc_end is not None and parent.gc_begin is not None:
+                    parent.gc_objects_inner += record.gc_objects
+                    parent.gc_time_inner += record.gc_time
+                record.parent = parent.module
+            if self.handler:
+                self.handler.on_import(record)
+            self.num_imports += 1
+        if self.enabled and not stack:
+            if self.max_imports and self.num_imports >= self.max_imports:
+                self._on_window_end()
+            elif self.deadline and time.monotonic() >= self.deadline:
+                self._on_window_end()
 
 
 def is_magic_wrapped(obj):
     return getattr(obj, '_magic_wrapped', False)
 
 
+def unwrap(obj):
+    if is_magic_wrapped(obj):
+        return obj._magic_origin
+    return obj
+
+
 def wrap_loader(loader, hooker):
 
     base_class = loader if isinstance(loader, type) else type(loader)
@@ -116,6 +456,7 @@ def wrap_loader(loader, hooker):
     class ModuleLoaderWrapper(base_class):
 
         _magic_wrapped = True
+        _magic_origin = loader
 
         def __init__(self): pass
 
@@ -127,15 +468,26 @@ def wrap_loader(loader, hooker):
 
         if hasattr(loader, 'create_module'):
             def create_module(self, spec):
+                # extension modules are mapped here, before exec_module
+                native = hooker.enabled and hooker.native_tracker is not None
+                if native:
+                    hooker._before_create(spec.name)
                 try:
-                    return loader.create_module(spec)
+                    module = loader.create_module(spec)
                 except Exception as ex:
                     msg = f'create module {spec.name} failed'
                     raise ImportError(msg) from ex
+                if native:
+                    hooker._claim_native(spec.name)
+                return module
 
         if hasattr(loader, 'exec_module'):
             def exec_module(self, module):
+                if not hooker.enabled:
+                    return loader.exec_module(module)
                 module_name = module.__name__
+                if hooker.io_profiler is not None:
+                    hooker.io_profiler.on_exec(loader, module.__spec__)
                 hooker._begin_module(module_name)
                 try:
                     return loader.exec_module(module)
@@ -144,6 +496,8 @@ def wrap_loader(loader, hooker):
 
         if hasattr(loader, 'load_module'):
             def load_module(self, fullname):
+                if not hooker.enabled:
+                    return loader.load_module(fullname)
                 hooker._begin_module(fullname)
                 try:
                     return loader.load_module(fullname)
@@ -160,6 +514,7 @@ def wrap_finder(finder, hooker):
     class ModuleFinderWrapper(base_class):
 
         _magic_wrapped = True
+        _magic_origin = finder
 
         def __init__(self): pass
 
@@ -182,7 +537,16 @@ def wrap_finder(finder, hooker):
 
         if hasattr(finder, 'find_spec'):
             def find_spec(self, fullname, path, target=None):
-                spec = finder.find_spec(fullname, path=path, target=target)
+                io_profiler = hooker.io_profiler
+                if io_profiler is None or not hooker.enabled:
+                    spec = finder.find_spec(
+                        fullname, path=path, target=target)
+                else:
+                    begin = time.perf_counter()
+                    spec = finder.find_spec(
+                        fullname, path=path, target=target)
+                    io_profiler.on_find(
+                        finder, fullname, time.perf_counter() - begin, spec)
                 if spec and spec.loader:
                     spec.loader = self.__wrap_loader(spec.loader)
                 return spec
@@ -214,7 +578,11 @@ class MetaPathList(list):
         return super().append(self.__wrap_finder(finder))
 
     def __setitem__(self, key, finder):
-        return super().__setitem__(self.__wrap_finder(finder))
+        if isinstance(key, slice):
+            finder = map(self.__wrap_finder, finder)
+        else:
+            finder = self.__wrap_finder(finder)
+        return super().__setitem__(key, finder)
 
     def extend(self, iterable):
         return super().extend(map(self.__wrap_finder, iterable))
@@ -224,11 +592,6 @@ def wrap_sys_modules(hooker):
 
     sys_modules = sys.modules
 
-    def proxy_to(name):
-        def proxy_method(self, *args, **kwargs):
-            return getattr(sys_modules, name)(*args, **kwargs)
-        return proxy_method
-
     methods = """
         __contains__
         __delitem__
@@ -240,7 +603,10 @@ def wrap_sys_modules(hooker):
         __len__
         __lt__
         __ne__
+        __or__
         __repr__
+        __reversed__
+        __ror__
         __setitem__
         __sizeof__
         clear
@@ -258,31 +624,86 @@ def wrap_sys_modules(hooker):
     class SysModulesDict(dict):
 
         __hash__ = None
+        _magic_wrapped = True
+        _magic_origin = sys_modules
 
         def __init__(self): pass
 
+        # only record edges while a module is importing, other lookups
+        # cost one attribute check more than the real dict
         def __getitem__(self, key):
-            value = sys_modules.__getitem__(key)
-            hooker._add_child(key)
+            value = sys_modules[key]
+            if hooker.importing:
+                hooker._add_child(key)
             return value
 
-        def get(self, key, *args, **kwargs):
-            value = sys_modules.get(key, *args, **kwargs)
-            if value is not None:
+        def get(self, key, default=None):
+            value = sys_modules.get(key, default)
+            if value is not None and hooker.importing:
                 hooker._add_child(key)
             return value
 
+        # the real dict's __ior__ returns the real dict, which would
+        # rebind sys.modules to it and stop recording
+        def __ior__(self, other):
+            sys_modules.update(other)
+            return self
+
     for method in methods:
-        setattr(SysModulesDict, method, proxy_to(method))
+        if hasattr(sys_modules, method):
+            # bound methods of the real dict, no python frame per call
+            proxy_method = staticmethod(getattr(sys_modules, method))
+            setattr(SysModulesDict, method, proxy_method)
 
     return SysModulesDict()
 
 
 class ModuleMomoryHandler:
-    def __init__(self, save_to=None, verbose=False):
+    def __init__(self, save_to=None, verbose=False, allocation_tracer=None,
+                 native_tracker=None, io_profiler=None):
         self.save_to = save_to
         self.verbose = verbose
+        self.allocation_tracer = allocation_tracer
+        self.native_tracker = native_tracker
+        self.io_profiler = io_profiler
+        self.records = []
+        self.meta = {}
+
+    def on_fork(self):
+        """
+        Called in forked child, drop records of the parent, save to per-PID
+        output and record sharing of memory at fork and at save.
+        """
         self.records = []
+        self.save_to = per_pid_filepath(self.save_to, os.getpid())
+        self.meta.pop('copy_on_write', None)
+        self.meta['pid'] = os.getpid()
+        self.meta['fork'] = dict(ppid=os.getppid(), at_fork=read_sharing())
+
+    def _update_fork_meta(self):
+        if 'fork' in self.meta:
+            self.meta['fork']['at_save'] = read_sharing()
+
+    def _module_fields(self):
+        """
+        Fields of modules measured at save: allocations still alive, see
+        AllocationTracer, sizes of shared objects, see NativeTracker, and
+        import system I/O, see IOProfiler.
+        """
+        fields = {}
+        tracers = [
+            ('tracemalloc', self.allocation_tracer),
+            ('native', self.native_tracker),
+            ('import_io', self.io_profiler),
+        ]
+        for name, tracer in tracers:
+            if tracer is None:
+                continue
+            tracer_fields, stats = tracer.attribute()
+            self.meta[name] = stats
+            for module, item in tracer_fields.items():
+                fields.setdefault(module, {}).update(item)
+        return fields
 
     def on_child(self, parent_record, module):
         if self.verbose:
@@ -292,10 +713,15 @@ class ModuleMomoryHandler:
     def on_import(self, record: ModuleMemoryRecord):
         self.records.append(record)
         if self.verbose:
-            module = record.module + " "
-            memory_end_mb = " " + str(mb(record.memory_end))
-            real_usage_mb = "+" + str(mb(record.real_usage))
-            print(f'* {module:-<60s}-{memory_end_mb:->5s}M {real_usage_mb:>6s}M')
+            self.print_record(record)
+
+    def print_record(self, record: ModuleMemoryRecord):
+        module = record.module + " "
+        memory_end_mb = " " + str(mb(record.memory_end))
+        real_usage_mb = "+" + str(mb(record.real_usage))
+        real_time_ms = "+" + str(ms(record.real_time))
+        print(f'* {module:-<60s}-{memory_end_mb:->5s}M {real_usage_mb:>6s}M'
+              f' {real_time_ms:>6s}ms')
 
     def get_sorted_records(self):
         def key_func(x):
@@ -306,29 +732,216 @@ class ModuleMomoryHandler:
     def save(self):
         if not self.save_to:
             return
-        import json
-        import os.path
+        self._update_fork_meta()
         records = [x.to_dict() for x in self.get_sorted_records()]
-        content = json.dumps(records, indent=4, ensure_ascii=False)
-        if self.save_to == '-':
-            print(content)
-        else:
-            save_to = os.path.abspath(os.path.expanduser(self.save_to))
-            print(f'* save module graph to {save_to}')
-            os.makedirs(os.path.dirname(save_to), exist_ok=True)
-            with open(save_to, 'w') as f:
-                f.write(content)
-
-
-def setup_hooker(save_to=None, verbose=False):
-    handler = ModuleMomoryHandler(save_to=save_to, verbose=verbose)
-    hooker = MemoryHooker(handler=handler)
-    meta_path = MetaPathList(hooker)
-    meta_path.extend(sys.meta_path)
-    sys.meta_path = meta_path
-    sys.modules = wrap_sys_modules(hooker)
+        fields = self._module_fields()
+        if fields:
+            apply_module_fields(records, fields)
+        save_records(records, self.save_to, meta=self.meta)
+
+
+class ModuleJSONLinesHandler(ModuleMomoryHandler):
+    """
+    Append each record to a JSON Lines file as soon as module imported,
+    flush every flush_every records or flush_interval seconds, and at the
+    end of each top level import, so the data survives the process being
+    killed, even long after it stopped importing. Records are not kept in
+    memory.
+
+    The first line is {"meta": {...}}, each following line is a record.
+    """
+
+    def __init__(self, save_to, verbose=False, flush_every=100,
+                 flush_interval=0.5, buffer_size=64 * 1024,
+                 allocation_tracer=None, native_tracker=None,
+                 io_profiler=None):
+        super().__init__(save_to=save_to, verbose=verbose,
+                         allocation_tracer=allocation_tracer,
+                         native_tracker=native_tracker,
+                         io_profiler=io_profiler)
+        # import here, import inside hooks will be recorded as child
+        import json
+        self.save_to = os.path.abspath(os.path.expanduser(save_to))
+        self._dumps = json.dumps
+        self._loads = json.loads
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._file = None
+        self._pending = 0
+        self._flush_at = 0
+
+    def on_fork(self):
+        if self._file is not None:
+            # flushed before fork, close the copy of the parent's file
+            self._file.close()
+            self._file = None
+        self._pending = 0
+        super().on_fork()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.save_to), exist_ok=True)
+        self._file = open(self.save_to, 'w', buffering=self.buffer_size)
+        self._file.write(self._dumps(dict(meta=self.meta)) + '\n')
+        self._flush_at = time.monotonic() + self.flush_interval
+
+    def on_import(self, record: ModuleMemoryRecord):
+        if self.verbose:
+            self.print_record(record)
+        if self._file is None:
+            self._open()
+        line = self._dumps(record.to_dict(), ensure_ascii=False)
+        self._file.write(line + '\n')
+        self._pending += 1
+        if record.parent is None:
+            # stack of the thread is empty, maybe no import for a long time
+            self.flush()
+        elif self._pending >= self.flush_every:
+            self.flush()
+        elif time.monotonic() >= self._flush_at:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        self._pending = 0
+        self._flush_at = time.monotonic() + self.flush_interval
+
+    def load_records(self, flush=True):
+        """
+        Flush and read back all records as dicts. Other threads must flush
+        under the hooker's lock and pass flush=False, the file is written
+        by on_import under the lock.
+        """
+        if self._file is None:
+            return []
+        if flush:
+            self.flush()
+        records = []
+        with open(self.save_to) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # being written, buffer flushed in the middle
+                item = self._loads(line)
+                if 'module' in item:  # skip meta lines
+                    records.append(item)
+        return records
+
+    def save(self):
+        if self._file is None:
+            self._open()
+        # meta maybe updated after the first line, meta lines are merged
+        self._update_fork_meta()
+        meta = self.meta
+        fields = self._module_fields()
+        if fields:
+            # records are written already, applied to them when read
+            meta = dict(meta, module_fields=fields)
+        self._file.write(self._dumps(dict(meta=meta)) + '\n')
+        self.flush()
+        print(f'* save module graph to {self._file.name}')
+
+
+def save_records(records, save_to, meta=None):
+    """Save records dicts and meta info as json, save_to '-' means stdout"""
+    import json
+    import os.path
+    data = dict(meta or {}, records=records)
+    content = json.dumps(data, indent=4, ensure_ascii=False)
+    if save_to == '-':
+        print(content)
+    else:
+        save_to = os.path.abspath(os.path.expanduser(save_to))
+        print(f'* save module graph to {save_to}')
+        os.makedirs(os.path.dirname(save_to), exist_ok=True)
+        with open(save_to, 'w') as f:
+            f.write(content)
+
+
+def setup_hooker(
+    save_to=None,
+    verbose=False,
+    sampler=None,
+    serve=None,
+    enabled=True,
+    max_seconds=None,
+    max_imports=None,
+    toggle_signal=None,
+    dump_signal=None,
+    allocation_sites=None,
+    native=False,
+    track_gc=False,
+    profile_io=False,
+):
+    """
+    Patch sys.meta_path and sys.modules to record module imports.
+
+    sampler: memory sampler name, one of maxrss, rss, uss, pss, tracemalloc,
+        default current RSS if /proc/self/statm available else maxrss.
+    serve: serve live snapshot on this address in a background thread,
+        unix:/path/to/sock or host:port, see module_graph.server.
+    enabled: start recording now, else call hooker.start() later.
+    max_seconds, max_imports: stop recording and dump records after
+        N seconds or N imports since recording started.
+    toggle_signal: signal to start or stop recording, eg: signal.SIGUSR1.
+    dump_signal: signal to dump records, eg: signal.SIGUSR2.
+    allocation_sites: trace Python allocations by tracemalloc, attribute
+        blocks still alive at save to the module which allocated them,
+        keep top N allocation sites of each module, see AllocationTracer.
+    native: record shared objects mapped by each module, by diff of
+        /proc/self/maps, with their resident and private size at save,
+        see NativeTracker.
+    track_gc: record objects added to the GC tracked heap, collections
+        and GC pause time during each import, see GCTracker.
+    profile_io: record finders and path entries probed to find each module,
+        time of find_spec, pyc cache hits and bytes read, see IOProfiler
+        and module_graph.pathorder.
+
+    If save_to ends with .jsonl, records are streamed to it as JSON Lines
+    while importing, else saved as json at exit. Forked child processes
+    record their own imports and save to save_to with pid suffix,
+    eg: module_graph.<pid>.json.
+    """
     import atexit
+    if serve:
+        # import before patch, so the server modules are not recorded
+        from .server import SnapshotServer
+    allocation_tracer = None
+    if allocation_sites:
+        allocation_tracer = AllocationTracer(top=allocation_sites).start()
+    native_tracker = None
+    if native:
+        if not NativeTracker.is_available():
+            raise ValueError('native requires /proc/self/maps')
+        native_tracker = NativeTracker()
+    io_profiler = IOProfiler() if profile_io else None
+    if save_to and save_to.endswith('.jsonl'):
+        handler_class = ModuleJSONLinesHandler
+    else:
+        handler_class = ModuleMomoryHandler
+    handler = handler_class(
+        save_to=save_to, verbose=verbose, allocation_tracer=allocation_tracer,
+        native_tracker=native_tracker, io_profiler=io_profiler)
+    hooker = MemoryHooker(
+        handler=handler,
+        sampler=sampler,
+        max_seconds=max_seconds,
+        max_imports=max_imports,
+        native_tracker=native_tracker,
+        gc_tracker=GCTracker().start() if track_gc else None,
+        io_profiler=io_profiler,
+    )
+    handler.meta['sampler'] = hooker.sampler.name
+    handler.meta['pid'] = os.getpid()
+    hooker.handle_signals(toggle_signal=toggle_signal, dump_signal=dump_signal)
+    hooker.handle_fork()
     atexit.register(handler.save)
+    if serve:
+        hooker.server = SnapshotServer(hooker, serve).start()
+        atexit.register(hooker.server.close)
+    if enabled:
+        hooker.start()
     return hooker
 
 
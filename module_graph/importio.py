@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import threading
+import importlib.util
+import importlib.machinery
+
+# flags of pyc header, see PEP 552
+PYC_HASH_BASED = 0b01
+PYC_CHECK_SOURCE = 0b10
+
+
+def _check_hash_based_pycs():
+    try:
+        import _imp
+    except ImportError:
+        return 'default'
+    return getattr(_imp, 'check_hash_based_pycs', 'default')
+
+
+def code_source(loader, spec):
+    """
+    Where the code of a module comes from: (source, bytes read), source is
+    one of valid_pyc, stale_pyc, compiled, sourceless, extension, or None
+    for builtin, frozen and other loaders. Checks the pyc header as
+    SourceFileLoader.get_code does, so call it before exec_module.
+    """
+    if isinstance(loader, importlib.machinery.ExtensionFileLoader):
+        return 'extension', 0  # mapped, not read, see NativeTracker
+    origin = spec.origin
+    if not origin or not os.path.isabs(origin):
+        return None, 0
+    if isinstance(loader, importlib.machinery.SourcelessFileLoader):
+        try:
+            return 'sourceless', os.stat(origin).st_size
+        except OSError:
+            return 'sourceless', 0
+    if not isinstance(loader, importlib.machinery.SourceFileLoader):
+        return None, 0
+    try:
+        st = os.stat(origin)
+    except OSError:
+        return None, 0
+    cached = spec.cached
+    try:
+        with open(cached, 'rb') as f:
+            header = f.read(16)
+            pyc_size = os.fstat(f.fileno()).st_size
+    except (OSError, TypeError):
+        # compiled from source, the pyc maybe written
+        return 'compiled', st.st_size
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return 'stale_pyc', pyc_size + st.st_size
+    flags = int.from_bytes(header[4:8], 'little')
+    if flags & PYC_HASH_BASED:
+        check = _check_hash_based_pycs()
+        if check == 'never' or (
+                check == 'default' and not flags & PYC_CHECK_SOURCE):
+            return 'valid_pyc', pyc_size
+        try:
+            with open(origin, 'rb') as f:
+                source_hash = importlib.util.source_hash(f.read())
+        except OSError:
+            return None, 0
+        if source_hash == header[8:16]:
+            return 'valid_pyc', pyc_size + st.st_size
+        return 'stale_pyc', pyc_size + st.st_size
+    mtime = int.from_bytes(header[8:12], 'little')
+    size = int.from_bytes(header[12:16], 'little')
+    if (mtime == int(st.st_mtime) & 0xFFFFFFFF
+            and size == st.st_size & 0xFFFFFFFF):
+        return 'valid_pyc', pyc_size
+    return 'stale_pyc', pyc_size + st.st_size
+
+
+def _forward_method(finder, name):
+    def method(self, *args, **kwargs):
+        return getattr(finder, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+def wrap_path_entry_finder(finder, entry, profiler):
+    """
+    Subclass of the finder's type, so pkgutil and isinstance still work,
+    but all state is the finder's: methods of the class are forwarded,
+    eg: invalidate_caches must reset the cache of the finder itself.
+    """
+
+    base_class = type(finder)
+
+    class PathEntryFinderWrapper(base_class):
+
+        _magic_wrapped = True
+        _magic_origin = finder
+
+        def __init__(self): pass
+
+        def __getattr__(self, *args, **kwargs):
+            return getattr(finder, *args, **kwargs)
+
+        def __setattr__(self, name, value):
+            setattr(finder, name, value)
+
+        def __repr__(self):
+            return f'<{type(self).__name__} {finder}>'
+
+        if hasattr(finder, 'find_spec'):
+            def find_spec(self, fullname, target=None):
+                begin = time.perf_counter()
+                spec = finder.find_spec(fullname, target)
+                profiler.on_probe(
+                    entry, fullname, time.perf_counter() - begin, spec)
+                return spec
+
+    for name in dir(base_class):
+        if name.startswith('__') or name in vars(PathEntryFinderWrapper):
+            continue
+        if callable(getattr(base_class, name, None)):
+            setattr(PathEntryFinderWrapper, name,
+                    _forward_method(finder, name))
+
+    return PathEntryFinderWrapper()
+
+
+class IOProfiler:
+    """
+    Cost of the import system per module: finders of sys.meta_path and
+    path entries probed to find it, time of find_spec, and whether the
+    code came from a valid pyc, a stale one or a fresh compile.
+
+    Meta path finders are timed by the hooker's finder wrapper, path entry
+    finders in sys.path_importer_cache, eg: FileFinder of each sys.path
+    entry, are wrapped while installed, new ones by wrapping sys.path_hooks.
+    Time of each path entry, hit or miss, is kept to recommend an order of
+    sys.path, see module_graph.pathorder.
+    """
+
+    def __init__(self):
+        self.modules = {}
+        self.entries = {}
+        self.installed = False
+        self._lock = threading.Lock()
+
+    def _module(self, fullname):
+        item = self.modules.get(fullname)
+        if item is None:
+            item = self.modules[fullname] = dict(
+                find_time=0.0, num_finders=0, num_path_entries=0,
+                finder=None, path_entry=None, code_source=None,
+                bytes_read=0)
+        return item
+
+    def _entry(self, entry):
+        item = self.entries.get(entry)
+        if item is None:
+            item = self.entries[entry] = dict(probes=0, hits=0, time=0.0)
+        return item
+
+    def _wrap_hook(self, hook):
+        if getattr(hook, '_magic_wrapped', False):
+            return hook
+
+        def path_hook(entry):
+            finder = hook(entry)
+            if finder is None or getattr(finder, '_magic_wrapped', False):
+                return finder
+            return wrap_path_entry_finder(finder, entry, self)
+        path_hook._magic_wrapped = True
+        path_hook._magic_origin = hook
+        return path_hook
+
+    def install(self):
+        """Wrap sys.path_hooks and path entry finders already cached"""
+        if self.installed:
+            return
+        sys.path_hooks[:] = [self._wrap_hook(x) for x in sys.path_hooks]
+        cache = sys.path_importer_cache
+        for entry, finder in list(cache.items()):
+            if finder is None or getattr(finder, '_magic_wrapped', False):
+                continue
+            cache[entry] = wrap_path_entry_finder(finder, entry, self)
+        self.installed = True
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        self.installed = False
+
+        def unwrap(obj):
+            if getattr(obj, '_magic_wrapped', False):
+                return obj._magic_origin
+            return obj
+        sys.path_hooks[:] = [unwrap(x) for x in sys.path_hooks]
+        cache = sys.path_importer_cache
+        for entry, finder in list(cache.items()):
+            cache[entry] = unwrap(finder)
+
+    def on_find(self, finder, fullname, elapsed, spec):
+        """A finder of sys.meta_path probed, called by the finder wrapper"""
+        with self._lock:
+            item = self._module(fullname)
+            item['num_finders'] += 1
+            item['find_time'] += elapsed
+            if spec is not None:
+                finder = getattr(finder, '__name__', None) or type(
+                    finder).__name__
+                item['finder'] = finder
+
+    def on_probe(self, entry, fullname, elapsed, spec):
+        """A path entry probed by PathFinder"""
+        # a namespace portion has no loader, PathFinder keeps searching
+        hit = spec is not None and spec.loader is not None
+        with self._lock:
+            item = self._entry(entry)
+            item['probes'] += 1
+            item['time'] += elapsed
+            module = self._module(fullname)
+            module['num_path_entries'] += 1
+            if hit:
+                item['hits'] += 1
+                module['path_entry'] = entry
+
+    def on_exec(self, loader, spec):
+        """Check the code source before exec_module, see code_source"""
+        source, bytes_read = code_source(loader, spec)
+        with self._lock:
+            item = self._module(spec.name)
+            item['code_source'] = source
+            item['bytes_read'] += bytes_read
+
+    def attribute(self):
+        """
+        Return (fields, stats), fields is found module to dict(find_time,
+        num_finders, num_path_entries, finder, path_entry, code_source,
+        bytes_read), stats has sys.path, cost of each path entry and
+        modules never found, eg: optional imports.
+        """
+        with self._lock:
+            fields = {}
+            misses = {}
+            for module, item in self.modules.items():
+                if item['finder'] is None:
+                    misses[module] = dict(
+                        find_time=item['find_time'],
+                        num_finders=item['num_finders'],
+                        num_path_entries=item['num_path_entries'])
+                else:
+                    fields[module] = dict(item)
+            stats = dict(
+                sys_path=list(sys.path),
+                cwd=os.getcwd(),
+                entries={k: dict(v) for k, v in self.entries.items()},
+                misses=misses,
+            )
+        return fields, stats
@@ -0,0 +1,214 @@
+import sys
+import json
+import os.path
+import argparse
+import importlib.util
+import importlib.machinery
+
+from .hooker import mb, ms, unwrap
+from .snapshot import load_records
+
+
+def _parent_packages(module):
+    parts = module.split('.')
+    for i in range(1, len(parts)):
+        yield '.'.join(parts[:i])
+
+
+def find_needed_modules(records_map, entries):
+    """
+    Modules imported or used by entries, by recorded import edges
+    (children), and their parent packages, a package of a needed submodule
+    is loaded anyway. The first import tree (parent) is not followed, it's
+    only for savings of deferrable subtrees.
+    """
+    needed = set()
+    stack = list(entries)
+    while stack:
+        module = stack.pop()
+        if module in needed:
+            continue
+        needed.add(module)
+        stack.extend(_parent_packages(module))
+        r = records_map.get(module)
+        if r:
+            stack.extend(r['children'])
+    return needed
+
+
+def plan_lazy_imports(records, entries, min_usage=0, min_time=0):
+    """
+    Find modules which are not needed by entries, but imported eagerly.
+
+    Return plan dict, lazy_modules are roots of deferrable import subtrees:
+    deferrable modules imported directly by a needed module or at top level.
+    Savings of a root are the self usage and time of all deferrable modules
+    in it's import subtree, modules also needed by entries are excluded.
+    """
+    records_map = {}
+    for r in records:
+        records_map.setdefault(r['module'], r)
+    entries = list(entries)
+    missing = [x for x in entries if x not in records_map]
+    needed = find_needed_modules(records_map, entries)
+    importer_children = {}
+    for r in records_map.values():
+        if r['parent']:
+            importer_children.setdefault(r['parent'], []).append(r['module'])
+    items = []
+    for r in records_map.values():
+        module = r['module']
+        if module in needed:
+            continue
+        if r['parent'] and r['parent'] not in needed:
+            continue
+        usage = 0
+        time = 0
+        subtree = set()
+        stack = [module]
+        while stack:
+            m = stack.pop()
+            if m in needed or m in subtree:
+                continue
+            subtree.add(m)
+            child = records_map[m]
+            usage += child['real_usage']
+            time += child.get('real_time', 0)
+            stack.extend(importer_children.get(m, []))
+        if usage < min_usage and time < min_time:
+            continue
+        items.append(dict(
+            module=module,
+            importer=r['parent'],
+            usage=usage,
+            time=time,
+            num_modules=len(subtree),
+        ))
+    items.sort(key=lambda x: (x['usage'], x['time']), reverse=True)
+    return dict(
+        entries=entries,
+        missing_entries=missing,
+        num_needed=len(needed & records_map.keys()),
+        num_modules=len(records_map),
+        usage=sum(x['usage'] for x in items),
+        time=sum(x['time'] for x in items),
+        lazy_modules=[x['module'] for x in items],
+        details=items,
+    )
+
+
+def is_lazy_compatible(loader):
+    """LazyLoader only works with loaders which create plain module"""
+    loader = unwrap(loader)
+    loader_classes = (
+        importlib.machinery.SourceFileLoader,
+        importlib.machinery.SourcelessFileLoader,
+    )
+    return isinstance(loader, loader_classes)
+
+
+class LazyFinder:
+    """
+    Meta path finder which find spec by the other finders, then load the
+    planned modules by importlib.util.LazyLoader, the module is executed
+    when it's attribute first accessed.
+    """
+
+    def __init__(self, modules):
+        self.modules = set(modules)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {len(self.modules)} modules>'
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.modules:
+            return None
+        for finder in list(sys.meta_path):
+            if unwrap(finder) is self:
+                continue
+            find_spec = getattr(finder, 'find_spec', None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and is_lazy_compatible(spec.loader):
+                lazy_loader = importlib.util.LazyLoader(spec.loader)
+                # the loader inside is already wrapped if hooker installed
+                lazy_loader._magic_wrapped = True
+                lazy_loader._magic_origin = lazy_loader
+                spec.loader = lazy_loader
+            return spec
+        return None
+
+
+def read_plan(plan_filepath):
+    with open(plan_filepath) as f:
+        return json.load(f)
+
+
+def setup_lazy_imports(modules=None, plan_filepath=None):
+    """
+    Load modules lazily, modules is a list of module names,
+    or read lazy_modules from plan file generated by plan command.
+    """
+    if plan_filepath:
+        modules = read_plan(plan_filepath)['lazy_modules']
+    finder = LazyFinder(modules or [])
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def print_plan(plan, limit=30):
+    for item in plan['missing_entries']:
+        print(f'* entry not found: {item}')
+    print(f'* {plan["num_needed"]} of {plan["num_modules"]} modules '
+          f'needed by entries')
+    for item in plan['details'][:limit]:
+        module = item['module'] + ' '
+        usage_mb = ' ' + str(mb(item['usage']))
+        time_ms = str(ms(item['time']))
+        num = item['num_modules']
+        print(f'* {module:-<60s}-{usage_mb:->5s}M {time_ms:>6s}ms '
+              f'{num:>5d} modules')
+    print(f'* lazy {len(plan["lazy_modules"])} modules, save '
+          f'{mb(plan["usage"])}M {ms(plan["time"])}ms')
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Lazy Plan')
+    parser.add_argument(
+        '--input-filepath', dest='input_filepath', type=str,
+        default='data/module_graph.json',
+        help='the module graph data generated by hooker')
+    parser.add_argument(
+        '--entries', dest='entries', type=str, required=True,
+        help='startup critical entry modules, separated by comma')
+    parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        default='data/lazy_plan.json',
+        help='save lazy import plan to this filepath')
+    parser.add_argument(
+        '--min-usage', dest='min_usage', type=float, default=1,
+        help='donot lazy module which memory saving < min usage (MB)')
+    parser.add_argument(
+        '--min-time', dest='min_time', type=float, default=10,
+        help='donot lazy module which import time saving < min time (ms)')
+    args = parser.parse_args()
+    __, records = load_records(args.input_filepath)
+    entries = args.entries.replace(',', ' ').split()
+    plan = plan_lazy_imports(
+        records, entries,
+        min_usage=args.min_usage * 1024 * 1024,
+        min_time=args.min_time / 1000,
+    )
+    print_plan(plan)
+    output_filepath = os.path.abspath(os.path.expanduser(args.output_filepath))
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    with open(output_filepath, 'w') as f:
+        json.dump(plan, f, indent=4, ensure_ascii=False)
+    print(f'* save lazy import plan to {output_filepath}')
+
+
+if __name__ == "__main__":
+    cli()
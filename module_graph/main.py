@@ -1,21 +1,36 @@
+import sys
 import argparse
 
 from .render import render_graph
 
 
 def cli():
-    parser = argparse.ArgumentParser(description='Module Graph Render')
+    if sys.argv[1:2] == ['diff']:
+        from .diff import cli as diff_cli
+        return diff_cli(sys.argv[2:])
+    parser = argparse.ArgumentParser(
+        description='Module Graph Render, or `module-graph diff -h`')
     parser.add_argument(
         '--modules-filepath', dest='modules_filepath', type=str,
         help='modules to render, default all modules')
     parser.add_argument(
         '--input-filepath', dest='input_filepath', type=str,
         default='data/module_graph.json',
-        help='the module graph data generated by hooker (json file)')
+        help='the module graph data generated by hooker '
+        '(json, jsonl or binary snapshot file)')
     parser.add_argument(
         '--output-filepath', dest='output_filepath', type=str,
         default='data/module_graph.pdf',
-        help='render output PDF filepath')
+        help='render output filepath, format by suffix: .pdf, '
+        '.html, .folded or .speedscope.json')
+    parser.add_argument(
+        '--format', dest='format',
+        choices=['pdf', 'html', 'folded', 'speedscope'],
+        help='output format, default by suffix of output filepath')
+    parser.add_argument(
+        '--weight', dest='weight', default='usage',
+        choices=['usage', 'time', 'cpu_time', 'gc_objects', 'gc_time'],
+        help='weight of folded stacks or speedscope, self value of modules')
     parser.add_argument(
         '--threshold', dest='threshold', type=int, default=1,
         help='donot show module which memory usage < threshold (MB)')
@@ -25,6 +40,8 @@ def cli():
         output_filepath=args.output_filepath,
         modules_filepath=args.modules_filepath,
         threshold=args.threshold,
+        format=args.format,
+        weight=args.weight,
     )
 
 
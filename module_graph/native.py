@@ -0,0 +1,119 @@
+import os
+
+PROC_MAPS = '/proc/self/maps'
+PROC_SMAPS = '/proc/self/smaps'
+
+
+def is_shared_object(path):
+    name = os.path.basename(path)
+    return name.endswith('.so') or '.so.' in name
+
+
+def read_proc_file(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+
+def _path_of(line):
+    # address perms offset dev inode pathname
+    parts = line.split(None, 5)
+    if len(parts) < 6 or not parts[5].startswith(b'/'):
+        return None
+    path = os.fsdecode(parts[5])
+    if not is_shared_object(path):
+        return None
+    return path
+
+
+def read_sizes(paths=None):
+    """
+    Resident and private memory of mappings of each file from
+    /proc/self/smaps, bytes: {path: dict(rss, private)}.
+    """
+    sizes = {}
+    item = None
+    for line in read_proc_file(PROC_SMAPS).splitlines():
+        key, sep, value = line.partition(b':')
+        if b' ' not in key:
+            if item is None:
+                continue
+            if key == b'Rss':
+                item['rss'] += int(value.split()[0]) * 1024
+            elif key in (b'Private_Clean', b'Private_Dirty'):
+                item['private'] += int(value.split()[0]) * 1024
+            continue
+        # header line of a mapping
+        path = _path_of(line)
+        if path is None or (paths is not None and path not in paths):
+            item = None
+            continue
+        item = sizes.get(path)
+        if item is None:
+            item = sizes[path] = dict(rss=0, private=0)
+    return sizes
+
+
+class NativeTracker:
+    """
+    Shared objects mapped by each module, by diff of /proc/self/maps.
+    The hooker claims new mappings when a module begins, for the module
+    being imported, and when a module ends, for the module itself, so a
+    library loaded by an extension module counts to the module which
+    imported the extension module. Sizes are read from smaps at save.
+    """
+
+    def __init__(self):
+        self._lines = set()
+        self.paths = set()
+        self.modules = {}
+        self.claim()
+
+    @classmethod
+    def is_available(cls):
+        return os.path.exists(PROC_MAPS)
+
+    def claim(self, module=None):
+        """Shared objects mapped since last claim, count them to module"""
+        lines = set(read_proc_file(PROC_MAPS).splitlines())
+        new_lines = lines - self._lines
+        self._lines = lines
+        paths = []
+        for line in new_lines:
+            path = _path_of(line)
+            if path is not None and path not in self.paths:
+                self.paths.add(path)
+                paths.append(path)
+        if paths and module:
+            self.modules.setdefault(module, []).extend(sorted(paths))
+        return paths
+
+    def attribute(self):
+        """
+        Return (fields, stats), fields is module to dict(native_usage,
+        native_private, shared_objects), shared_objects are dict(path,
+        rss, private), sizes of now.
+        """
+        paths = set()
+        for module_paths in self.modules.values():
+            paths.update(module_paths)
+        sizes = read_sizes(paths) if os.path.exists(PROC_SMAPS) else {}
+        fields = {}
+        for module, module_paths in self.modules.items():
+            shared_objects = []
+            for path in module_paths:
+                size = sizes.get(path, {})
+                shared_objects.append(dict(
+                    path=path,
+                    rss=size.get('rss', 0),
+                    private=size.get('private', 0),
+                ))
+            fields[module] = dict(
+                native_usage=sum(x['rss'] for x in shared_objects),
+                native_private=sum(x['private'] for x in shared_objects),
+                shared_objects=shared_objects,
+            )
+        stats = dict(
+            num_shared_objects=len(paths),
+            native_usage=sum(x['rss'] for x in sizes.values()),
+        )
+        return fields, stats
@@ -0,0 +1,213 @@
+import os.path
+import json
+import pkgutil
+import argparse
+
+from .hooker import kb
+from .snapshot import load_records
+
+
+def top_level_modules(entry):
+    """Names of top level modules and packages in a path entry"""
+    return {x.name for x in pkgutil.iter_modules([entry])}
+
+
+def find_shadowing(path, found):
+    """
+    Modules found in more than one entry of path, the entry found first
+    must stay before the others: {module: [entries]}, entries in order.
+    """
+    names = {entry: top_level_modules(entry) for entry in path}
+    shadowing = {}
+    for module, entry in found.items():
+        entries = [x for x in path if module in names[x]]
+        if len(entries) > 1 and entries[0] == entry:
+            shadowing[module] = entries
+    return shadowing
+
+
+def recommend_order(path, entries, shadowing=None):
+    """
+    Order of path to minimize estimated find time: a module found at an
+    entry costs a probe of each entry before it, so entries are ordered by
+    average probe time per hit, ascending. Entries without hits go last in
+    their order. Constraints of shadowing are kept, so every module is
+    still found at the same entry.
+    """
+    index = {entry: i for i, entry in enumerate(path)}
+    preds = {entry: set() for entry in path}
+    for module_entries in (shadowing or {}).values():
+        for entry in module_entries[1:]:
+            preds[entry].add(module_entries[0])
+
+    def key_func(entry):
+        item = entries.get(entry)
+        if not item or not item['hits']:
+            return (1, 0, index[entry])
+        cost = item['time'] / item['probes']
+        return (0, cost / item['hits'], index[entry])
+
+    order = []
+    placed = set()
+    remaining = list(path)
+    while remaining:
+        ready = [x for x in remaining if preds[x] <= placed]
+        entry = min(ready, key=key_func)
+        remaining.remove(entry)
+        placed.add(entry)
+        order.append(entry)
+    return order
+
+
+def estimate_find_time(order, entries):
+    """Time to probe path entries until hit, for modules found in order"""
+    total = 0.0
+    prefix = 0.0
+    for entry in order:
+        item = entries.get(entry)
+        if not item or not item['probes']:
+            continue
+        prefix += item['time'] / item['probes']
+        total += item['hits'] * prefix
+    return total
+
+
+def analyze_path_order(meta, records, check_shadowing=True):
+    """
+    Import system I/O recorded with profile_io: cost of each sys.path
+    entry, slowest finds, modules not found, code sources, and recommended
+    order of sys.path. check_shadowing lists entries now, to keep modules
+    found in more than one entry resolved to the same entry.
+    """
+    io = meta.get('import_io')
+    if not io:
+        raise ValueError('no import_io in meta, record with profile_io')
+    entries = io['entries']
+    path = []
+    for entry in io['sys_path']:
+        # PathFinder caches '' as current directory
+        entry = io['cwd'] if entry == '' else entry
+        if entry not in path:
+            path.append(entry)
+    # top level module to the entry it was found at
+    found = {}
+    seen = set()
+    sources = {}
+    modules = []
+    exec_time = 0.0
+    for r in records:
+        exec_time += r.get('real_time', 0)
+        if 'finder' not in r or r['module'] in seen:
+            continue
+        seen.add(r['module'])
+        if '.' not in r['module'] and r.get('path_entry') in path:
+            found[r['module']] = r['path_entry']
+        source = r.get('code_source') or 'other'
+        item = sources.setdefault(source, dict(modules=0, bytes_read=0))
+        item['modules'] += 1
+        item['bytes_read'] += r.get('bytes_read', 0)
+        modules.append(dict(
+            module=r['module'],
+            find_time=r['find_time'],
+            num_finders=r['num_finders'],
+            num_path_entries=r['num_path_entries'],
+            path_entry=r.get('path_entry'),
+        ))
+    modules.sort(key=lambda x: x['find_time'], reverse=True)
+    misses = [dict(module=k, **v) for k, v in io['misses'].items()]
+    misses.sort(key=lambda x: x['find_time'], reverse=True)
+    shadowing = find_shadowing(path, found) if check_shadowing else {}
+    order = recommend_order(path, entries, shadowing)
+    path_entries = []
+    for entry in path:
+        item = entries.get(entry) or dict(probes=0, hits=0, time=0.0)
+        path_entries.append(dict(entry=entry, **item))
+    find_time = sum(x['find_time'] for x in modules + misses)
+    return dict(
+        find_time=find_time,
+        exec_time=exec_time,
+        code_sources=sources,
+        path_entries=path_entries,
+        modules=modules,
+        misses=misses,
+        shadowing=shadowing,
+        order=order,
+        estimated_find_time=estimate_find_time(path, entries),
+        recommended_find_time=estimate_find_time(order, entries),
+    )
+
+
+def _ms_text(v):
+    # probes of a cached directory take microseconds
+    return f'{v * 1000:.1f}ms'
+
+
+def print_result(result, limit=30):
+    print(f'* import time {_ms_text(result["exec_time"])}, find_spec '
+          f'{_ms_text(result["find_time"])}')
+    for source, item in sorted(result['code_sources'].items()):
+        print(f'* {source + " ":-<60s}-{item["modules"]:>5d} modules '
+              f'{kb(item["bytes_read"]):>6d}K read')
+    print('* sys.path entries, probes/hits, time of probes:')
+    for i, item in enumerate(result['path_entries']):
+        entry = f'{i:>2d} {item["entry"]} '
+        probes = f'{item["probes"]}/{item["hits"]}'
+        print(f'* {entry:-<60s}-{probes:->9s} {_ms_text(item["time"]):>8s}')
+    print('* slowest finds, meta path finders and path entries probed:')
+    for item in result['modules'][:limit]:
+        module = item['module'] + ' '
+        print(f'* {module:-<60s}-{_ms_text(item["find_time"]):->8s} '
+              f'{item["num_finders"]:>3d} finders '
+              f'{item["num_path_entries"]:>3d} entries')
+    if result['misses']:
+        print('* modules not found:')
+    for item in result['misses'][:limit]:
+        module = item['module'] + ' '
+        print(f'* {module:-<60s}-{_ms_text(item["find_time"]):->8s} '
+              f'{item["num_finders"]:>3d} finders '
+              f'{item["num_path_entries"]:>3d} entries')
+    for module, entries in result['shadowing'].items():
+        print(f'* {module} is shadowed, keep {entries[0]} before '
+              f'{", ".join(entries[1:])}')
+    before = _ms_text(result['estimated_find_time'])
+    after = _ms_text(result['recommended_find_time'])
+    print(f'* recommended sys.path, probes of found modules '
+          f'{before} -> {after}:')
+    for entry in result['order']:
+        print(f'*    {entry}')
+
+
+def cli():
+    parser = argparse.ArgumentParser(
+        description='Module Graph sys.path Order')
+    parser.add_argument(
+        '--input-filepath', dest='input_filepath', type=str,
+        default='data/module_graph.json',
+        help='the module graph data generated by hooker with profile_io')
+    parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        help='save full result as json to this filepath')
+    parser.add_argument(
+        '--limit', dest='limit', type=int, default=30,
+        help='number of modules to print')
+    parser.add_argument(
+        '--no-check-shadowing', dest='check_shadowing',
+        action='store_false',
+        help='do not list sys.path entries for modules found in more than '
+        'one entry, eg: when the recorded environment is not here')
+    args = parser.parse_args()
+    meta, records = load_records(args.input_filepath)
+    result = analyze_path_order(
+        meta, records, check_shadowing=args.check_shadowing)
+    print_result(result, limit=args.limit)
+    if args.output_filepath:
+        output_filepath = os.path.abspath(
+            os.path.expanduser(args.output_filepath))
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        with open(output_filepath, 'w') as f:
+            json.dump(result, f, indent=4, ensure_ascii=False)
+        print(f'* save sys.path order to {output_filepath}')
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,436 @@
+import os
+import os.path
+import sys
+import json
+import argparse
+import threading
+import subprocess
+import importlib.util
+import importlib.machinery
+
+
+def import_order(records):
+    """
+    Modules of records in the order they are likely imported: depth first
+    from top level modules, parent packages before their submodules.
+    """
+    records_map = {}
+    for r in records:
+        records_map.setdefault(r['module'], r)
+    importer_children = {}
+    for r in records_map.values():
+        if r['parent']:
+            importer_children.setdefault(r['parent'], []).append(r['module'])
+    order = []
+    seen = set()
+
+    def add(module):
+        parts = module.split('.')
+        for i in range(1, len(parts) + 1):
+            name = '.'.join(parts[:i])
+            if name not in seen:
+                seen.add(name)
+                order.append(name)
+
+    roots = [x for x in records_map.values() if not x['parent']]
+    stack = [x['module'] for x in reversed(roots)]
+    while stack:
+        module = stack.pop()
+        if module in seen:
+            continue
+        add(module)
+        r = records_map.get(module)
+        if r is None:
+            continue
+        children = list(r['children']) + importer_children.get(module, [])
+        stack.extend(x for x in reversed(children) if x in records_map)
+    return order
+
+
+def resolve_files(modules):
+    """
+    Find files of modules without import them, by the path based finder,
+    submodules are searched in search locations of their parent package.
+    Return entries of source and extension modules, in the given order.
+    """
+    search_locations = {}
+    entries = []
+    for module in modules:
+        parent = module.rpartition('.')[0]
+        if parent:
+            if parent not in search_locations:
+                continue
+            path = search_locations[parent]
+        else:
+            path = None
+        try:
+            spec = importlib.machinery.PathFinder.find_spec(module, path)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None:
+            continue
+        if spec.submodule_search_locations is not None:
+            search_locations[module] = list(spec.submodule_search_locations)
+        if not spec.has_location:
+            continue  # namespace package
+        loader = type(spec.loader)
+        if loader is importlib.machinery.SourceFileLoader:
+            kind = 'source'
+        elif loader is importlib.machinery.ExtensionFileLoader:
+            kind = 'extension'
+        else:
+            continue
+        entries.append(dict(
+            module=module,
+            kind=kind,
+            origin=spec.origin,
+            cached=spec.cached,
+            search_locations=search_locations.get(module),
+        ))
+    return entries
+
+
+def make_plan(records):
+    """Prefetch plan of module graph data, files in recorded import order"""
+    modules = import_order(records)
+    entries = [r['module'] for r in records if not r['parent']]
+    return dict(
+        python=sys.version,
+        entries=list(dict.fromkeys(entries)),
+        modules=resolve_files(modules),
+    )
+
+
+def read_plan(plan_filepath):
+    with open(plan_filepath) as f:
+        return json.load(f)
+
+
+class PrefetchedSourceLoader(importlib.machinery.SourceFileLoader):
+    """Source file loader serves stat and data read by prefetch threads"""
+
+    def __init__(self, fullname, path, finder, entry):
+        super().__init__(fullname, path)
+        self._finder = finder
+        self._entry = entry
+
+    def exec_module(self, module):
+        try:
+            return super().exec_module(module)
+        finally:
+            # not used, eg: the pyc is stale, drop it
+            self._finder._drop(self._entry)
+
+    def path_stats(self, path):
+        stats = self._finder._stats.pop(path, None)
+        if stats is not None:
+            return stats
+        return super().path_stats(path)
+
+    def get_data(self, path):
+        data = self._finder._data.pop(path, None)
+        if data is not None:
+            return data
+        return super().get_data(path)
+
+
+class PrefetchFinder:
+    """
+    Meta path finder for modules of a prefetch plan. Background threads
+    stat and read bytecode files (or warm extension modules into page cache)
+    in recorded import order, these calls release the GIL so the importing
+    thread is not blocked. Specs are made from the plan, without searching
+    sys.path, a module is found by the other finders as usual if it's
+    file not exists, not in the path of it's parent package, or shadowed
+    by an earlier sys.path entry.
+
+    Unmarshal and execution of modules stay on the importing thread, data
+    not read yet when a module imported is read by the loader as usual.
+    """
+
+    def __init__(self, entries, jobs=2):
+        self.entries = {x['module']: x for x in entries}
+        self.jobs = jobs
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_prefetched = 0
+        self._stats = {}
+        self._data = {}
+        self._queue = iter(list(entries))
+        self._threads = []
+        self._stop = threading.Event()
+        # data is stored only while it's module is not imported yet
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {len(self.entries)} modules>'
+
+    def start(self):
+        for i in range(self.jobs):
+            thread = threading.Thread(
+                target=self._prefetch, daemon=True,
+                name=f'module-graph-prefetch-{i}')
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self, timeout=None):
+        """Stop prefetch, remove the finder and drop data not used"""
+        from .hooker import unwrap
+        self._stop.set()
+        # the hooker wraps finders inserted while it's installed
+        for i, finder in enumerate(sys.meta_path):
+            if unwrap(finder) is self:
+                del sys.meta_path[i]
+                break
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+        with self._lock:
+            self._data.clear()
+            self._stats.clear()
+
+    def _prefetch(self):
+        # next() of the shared iterator is atomic, each entry is taken once
+        for entry in self._queue:
+            if self._stop.is_set():
+                break
+            if entry['module'] not in self.entries:
+                continue  # imported already
+            try:
+                if entry['kind'] == 'source':
+                    self._read_source(entry)
+                else:
+                    _warm_file(entry['origin'])
+            except OSError:
+                continue
+            self.num_prefetched += 1
+
+    def _read_source(self, entry):
+        origin = entry['origin']
+        st = os.stat(origin)
+        stats = {'mtime': st.st_mtime, 'size': st.st_size}
+        cached = entry['cached']
+        try:
+            with open(cached, 'rb') as f:
+                path, data = cached, f.read()
+        except (OSError, TypeError):
+            with open(origin, 'rb') as f:
+                path, data = origin, f.read()
+        with self._lock:
+            if entry['module'] in self.entries:
+                self._stats[origin] = stats
+                self._data[path] = data
+
+    def _drop(self, entry):
+        """Drop data of a module imported or missed"""
+        with self._lock:
+            self._stats.pop(entry['origin'], None)
+            self._data.pop(entry['origin'], None)
+            if entry['cached']:
+                self._data.pop(entry['cached'], None)
+
+    def find_spec(self, fullname, path=None, target=None):
+        with self._lock:
+            entry = self.entries.pop(fullname, None)
+        if entry is None:
+            return None
+        origin = entry['origin']
+        if not self._is_valid(entry, path) or (
+                origin not in self._stats and not os.path.exists(origin)):
+            self.num_misses += 1
+            self._drop(entry)
+            return None
+        if entry['kind'] == 'source':
+            loader = PrefetchedSourceLoader(fullname, origin, self, entry)
+        else:
+            loader = importlib.machinery.ExtensionFileLoader(fullname, origin)
+        self.num_hits += 1
+        return importlib.util.spec_from_file_location(
+            fullname, origin, loader=loader,
+            submodule_search_locations=entry['search_locations'])
+
+    @staticmethod
+    def _is_valid(entry, path):
+        """
+        The file is in the path of parent package at import time, a top
+        level module must not be shadowed by an earlier sys.path entry.
+        """
+        origin = entry['origin']
+        if entry['search_locations'] is not None:
+            origin = os.path.dirname(origin)
+        dirname = os.path.dirname(origin)
+        if path is not None:
+            return _path_index(path, dirname) is not None
+        index = _path_index(sys.path, dirname)
+        if index is None:
+            return False
+        try:
+            spec = importlib.machinery.PathFinder.find_spec(
+                entry['module'], sys.path[:index])
+        except (ImportError, ValueError):
+            return False
+        # namespace portions don't shadow a module found later
+        return spec is None or not spec.has_location
+
+    def stats(self):
+        return dict(
+            num_modules=len(self.entries) + self.num_hits + self.num_misses,
+            num_prefetched=self.num_prefetched,
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+        )
+
+
+def _path_index(path, dirname):
+    """Index of the path entry of dirname, None if not in path"""
+    for i, x in enumerate(path):
+        if x == dirname or os.path.abspath(x) == dirname:
+            return i
+    return None
+
+
+def _warm_file(filepath):
+    """Let the kernel read the file into page cache"""
+    fd = os.open(filepath, os.O_RDONLY)
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        else:
+            while os.read(fd, 1024 * 1024):
+                pass
+    finally:
+        os.close(fd)
+
+
+def setup_prefetch(plan_filepath=None, entries=None, jobs=2):
+    """
+    Prefetch files of modules of the plan file generated by plan command,
+    or entries of a plan. Return the finder, it's inserted at the front of
+    sys.meta_path, so it's wrapped by the hooker if the hooker installed.
+    """
+    if plan_filepath:
+        entries = read_plan(plan_filepath)['modules']
+    finder = PrefetchFinder(entries or [], jobs=jobs)
+    sys.meta_path.insert(0, finder)
+    return finder.start()
+
+
+MEASURE_CODE = """
+import sys
+import time
+begin = time.perf_counter()
+if {prefetch!r}:
+    from module_graph.prefetch import setup_prefetch
+    finder = setup_prefetch({plan_filepath!r}, jobs={jobs!r})
+for name in {entries!r}:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+value = time.perf_counter() - begin
+import json
+print(json.dumps(dict(value=value)))
+"""
+
+
+def drop_page_cache():
+    """Drop page cache of the system, need root"""
+    subprocess.check_call(['sync'])
+    with open('/proc/sys/vm/drop_caches', 'w') as f:
+        f.write('3\n')
+
+
+def measure_prefetch(plan_filepath, entries=None, trials=5, jobs=2,
+                     drop_caches=False):
+    """
+    Wall time to import entries (default top level modules of the plan) in
+    fresh processes, with and without prefetch, runs are interleaved.
+    """
+    from .benchmark import run_child, get_stats
+    plan_filepath = os.path.abspath(plan_filepath)
+    if not entries:
+        entries = read_plan(plan_filepath)['entries']
+    base = []
+    prefetch = []
+    for __ in range(trials):
+        for is_prefetch, values in [(False, base), (True, prefetch)]:
+            if drop_caches:
+                drop_page_cache()
+            result = run_child(
+                MEASURE_CODE, prefetch=is_prefetch, entries=entries,
+                plan_filepath=plan_filepath, jobs=jobs)
+            values.append(result['value'])
+    ret = dict(
+        drop_caches=drop_caches,
+        base=get_stats(base),
+        prefetch=get_stats(prefetch),
+    )
+    ret['saving'] = ret['base']['median'] - ret['prefetch']['median']
+    ret['ratio'] = ret['prefetch']['median'] / ret['base']['median']
+    return ret
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Prefetch')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    plan_parser = subparsers.add_parser(
+        'plan', help='find files of recorded modules in import order')
+    plan_parser.add_argument(
+        '--input-filepath', dest='input_filepath', type=str,
+        default='data/module_graph.json',
+        help='the module graph data generated by hooker')
+    plan_parser.add_argument(
+        '--output-filepath', dest='output_filepath', type=str,
+        default='data/prefetch_plan.json',
+        help='save prefetch plan to this filepath')
+    measure_parser = subparsers.add_parser(
+        'measure', help='measure import time with and without prefetch')
+    measure_parser.add_argument(
+        '--plan-filepath', dest='plan_filepath', type=str,
+        default='data/prefetch_plan.json',
+        help='the prefetch plan generated by plan command')
+    measure_parser.add_argument(
+        '--entries', dest='entries', type=str,
+        help='modules to import, default top level modules of the plan')
+    measure_parser.add_argument(
+        '--trials', dest='trials', type=int, default=5,
+        help='number of fresh processes with and without prefetch')
+    measure_parser.add_argument(
+        '--jobs', dest='jobs', type=int, default=2,
+        help='number of prefetch threads')
+    measure_parser.add_argument(
+        '--drop-caches', dest='drop_caches', action='store_true',
+        help='drop page cache before each run (need root), '
+        'to measure a real cold start')
+    args = parser.parse_args()
+    if args.command == 'plan':
+        from .snapshot import load_records
+        __, records = load_records(args.input_filepath)
+        plan = make_plan(records)
+        output_filepath = os.path.abspath(
+            os.path.expanduser(args.output_filepath))
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        with open(output_filepath, 'w') as f:
+            json.dump(plan, f, indent=4, ensure_ascii=False)
+        print(f'* save prefetch plan of {len(plan["modules"])} modules '
+              f'to {output_filepath}')
+        return
+    entries = None
+    if args.entries:
+        entries = args.entries.replace(',', ' ').split()
+    result = measure_prefetch(
+        args.plan_filepath, entries=entries, trials=args.trials,
+        jobs=args.jobs, drop_caches=args.drop_caches)
+    print(json.dumps(result, indent=4))
+    base = result['base']['median']
+    prefetch = result['prefetch']['median']
+    print(f'* import without prefetch {base * 1000:.1f}ms, with prefetch '
+          f'{prefetch * 1000:.1f}ms, saving {result["saving"] * 1000:.1f}ms',
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    cli()
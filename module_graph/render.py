@@ -1,14 +1,19 @@
 import re
-import json
 import os.path
-from graphviz import Digraph
 
-from .hooker import mb
+from .hooker import mb, kb, ms
+from .graph import ModuleGraph, VALUE_FIELDS
+from .snapshot import load_records
 
 
 class ModuleMemoryRecord:
 
-    __slots__ = ('module', 'parent', 'children', 'usage', 'real_usage')
+    __slots__ = (
+        'module', 'parent', 'children', 'usage', 'real_usage',
+        'time', 'real_time', 'cpu_time', 'real_cpu_time', 'traced_usage',
+        'allocation_sites', 'native_usage', 'native_private', 'shared_objects',
+        'gc_objects', 'real_gc_objects', 'gc_time', 'real_gc_time',
+    )
 
     def __init__(
         self,
@@ -17,12 +22,38 @@ class ModuleMemoryRecord:
         children=None,
         usage=0,
         real_usage=0,
+        time=0,
+        real_time=0,
+        cpu_time=0,
+        real_cpu_time=0,
+        traced_usage=0,
+        allocation_sites=None,
+        native_usage=0,
+        native_private=0,
+        shared_objects=None,
+        gc_objects=0,
+        real_gc_objects=0,
+        gc_time=0,
+        real_gc_time=0,
     ):
         self.module = module
         self.parent = parent
         self.children = children or []
         self.usage = usage
         self.real_usage = real_usage
+        self.time = time
+        self.real_time = real_time
+        self.cpu_time = cpu_time
+        self.real_cpu_time = real_cpu_time
+        self.traced_usage = traced_usage
+        self.allocation_sites = allocation_sites or []
+        self.native_usage = native_usage
+        self.native_private = native_private
+        self.shared_objects = shared_objects or []
+        self.gc_objects = gc_objects
+        self.real_gc_objects = real_gc_objects
+        self.gc_time = gc_time
+        self.real_gc_time = real_gc_time
 
     def __repr__(self):
         type_name = type(self).__name__
@@ -38,10 +69,17 @@ class RecordsProcessor:
         self.threshold = threshold
         if modules:
             records = self.filter_by_modules(records, modules)
-        self.records_map = self.dedup_records(records)
-        self.remove_duplicate_dependency()
+        # list fields of modules, from the first record has it
+        self.module_lists = {}
+        for r in records:
+            for field in ('allocation_sites', 'shared_objects'):
+                value = r.get(field)
+                if value:
+                    lists = self.module_lists.setdefault(r['module'], {})
+                    lists.setdefault(field, value)
+        self.graph = ModuleGraph.from_records(records)
+        self.graph.fix_real_values()
         self.records_objects = self.build_graph()
-        self.fix_real_usage()
         if threshold and threshold > 0:
             self.records = self.remove_small_record_objects()
         else:
@@ -55,94 +93,41 @@ class RecordsProcessor:
                 continue
             if r['parent'] and r['parent'] not in modules:
                 continue
-            children = []
-            for child in r['children']:
-                if child in modules:
-                    children.append(child)
-            r['children'] = children
-            ret.append(r)
+            children = [x for x in r['children'] if x in modules]
+            ret.append(dict(r, children=children))
         return ret
 
-    def dedup_records(self, records):
-        records_map = {}
-        for r in records:
-            module = r['module']
-            if module in records_map:
-                old = records_map[module]
-                children = set(old['children']) | set(r['children'])
-                new = dict(
-                    module=module,
-                    parent=old['parent'],
-                    children=list(sorted(children)),
-                    usage=old['usage'] + r['usage'],
-                    real_usage=old['real_usage'] + r['real_usage'],
-                )
-                records_map[module] = new
-            else:
-                records_map[module] = r
-        return records_map
-
-    def remove_duplicate_dependency(self):
-        for r in self.records_map.values():
-            module = r['module']
-            if r['parent']:
-                parent = self.records_map.get(r['parent'])
-                if parent and parent['children']:
-                    try:
-                        parent['children'].remove(r['module'])
-                    except ValueError:
-                        pass  # ignore
-            children = []
-            for child in r['children']:
-                if child.startswith(module) or module.startswith(child):
-                    continue
-                children.append(child)
-            r['children'] = children
-
     def build_graph(self):
-        records_objects = {}
-        for r in self.records_map.values():
-            robj = ModuleMemoryRecord(
-                module=r['module'],
-                usage=r['usage'],
-                real_usage=r['real_usage'],
-            )
-            records_objects[r['module']] = robj
-
-        def set_default(module):
-            robj = records_objects.get(module)
-            if not robj:
-                robj = ModuleMemoryRecord(module)
-                records_objects[module] = robj
-            return robj
-
-        for r in self.records_map.values():
-            robj = records_objects[r['module']]
-            if r['parent']:
-                robj.parent = set_default(r['parent'])
-            if r['children']:
-                children = []
-                for child_module in r['children']:
-                    children.append(set_default(child_module))
-                robj.children = children
-        return list(records_objects.values())
-
-    def fix_real_usage(self):
-        for r in self.records_objects:
-            if r.usage < r.real_usage:
-                r.usage = r.real_usage
+        graph = self.graph
+        columns = [graph.values[field] for field in VALUE_FIELDS]
+        records_objects = []
+        for name, *values in zip(graph.names, *columns):
+            robj = ModuleMemoryRecord(name, **self.module_lists.get(name, {}))
+            for field, value in zip(VALUE_FIELDS, values):
+                setattr(robj, field, value)
+            records_objects.append(robj)
+        for node in range(graph.num_records):
+            robj = records_objects[node]
+            parent = graph.parents[node]
+            if parent >= 0:
+                robj.parent = records_objects[parent]
+            robj.children = [
+                records_objects[x] for x in graph.get_children(node)]
+        return records_objects
 
     def remove_small_record_objects(self):
         threshold = self.threshold * 1024 * 1024
+        graph = self.graph
+        keep = graph.select(threshold)
         records = []
-        small_records = set()
-        for r in self.records_objects:
-            if r.usage < threshold:
-                small_records.add(r)
-            else:
-                records.append(r)
-        for r in records:
-            r.children = [r for r in r.children if r not in small_records]
+        for node, robj in enumerate(self.records_objects):
+            if not keep[node]:
+                continue
+            children = graph.get_children(node)
+            if children:
+                robj.children = [
+                    self.records_objects[x] for x in children if keep[x]]
+            records.append(robj)
         return records
 
     @classmethod
@@ -151,8 +136,7 @@ class RecordsProcessor:
 
     @classmethod
     def read(cls, filepath, **kwargs):
-        with open(filepath) as f:
-            records = json.load(f)
+        __, records = load_records(filepath)
         return cls.process(records, **kwargs)
 
 
@@ -175,14 +159,36 @@ def color_of(record):
 
 
 def label_of(record):
+    label = record.module
     usage = record.usage
-    if usage < 1 * MB:
-        return record.module
-    real_usage = mb(record.real_usage)
-    return f'{record.module}\n{mb(usage)}/{real_usage}M'
+    if usage >= 1 * MB:
+        real_usage = mb(record.real_usage)
+        label += f'\n{mb(usage)}/{real_usage}M'
+    if record.time >= 0.001:
+        real_time = ms(record.real_time)
+        label += f'\n{ms(record.time)}/{real_time}ms'
+    # python memory by tracemalloc, sub-MB modules are readable here
+    if record.traced_usage >= 0.1 * MB:
+        label += f'\npy {kb(record.traced_usage)}K'
+        for site in record.allocation_sites[:3]:
+            label += f'\nL{site["lineno"]} {kb(site["size"])}K'
+    # resident size of shared objects mapped by the module, at save
+    if record.native_usage >= 0.1 * MB:
+        python_usage = max(0, record.real_usage - record.native_usage)
+        label += (f'\nnative {kb(record.native_usage)}K'
+                  f' python {kb(python_usage)}K')
+    # objects make every full collection slower
+    if record.gc_objects >= 10000:
+        gc_objects = round(record.gc_objects / 1000)
+        real_gc_objects = round(record.real_gc_objects / 1000)
+        label += f'\n{gc_objects}/{real_gc_objects}K objects'
+    if record.gc_time >= 0.001:
+        label += f'\ngc {ms(record.gc_time)}/{ms(record.real_gc_time)}ms'
+    return label
 
 
 def render_dot(records):
+    from graphviz import Digraph
     dot = Digraph(comment='ModuleGraph', graph_attr={'rankdir': 'LR'})
     for r in records:
         node_color = color_of(r)
@@ -205,23 +211,65 @@ def normalize_filepath(p):
     return os.path.abspath(os.path.expanduser(p))
 
 
+FORMAT_SUFFIXES = {
+    'pdf': '.pdf',
+    'folded': '.folded',
+    'speedscope': '.speedscope.json',
+    'html': '.html',
+}
+
+
+def format_of(output_filepath):
+    """Output format by suffix of filepath, default pdf"""
+    for format, suffix in FORMAT_SUFFIXES.items():
+        if output_filepath.endswith(suffix):
+            return format
+    return 'pdf'
+
+
 def render_graph(
     input_filepath='data/module_graph.json',
     output_filepath='data/module_graph.pdf',
     modules_filepath=None,
     threshold=1,
+    format=None,
+    weight='usage',
 ):
+    """
+    Render module graph to PDF by graphviz or a self-contained HTML viewer,
+    or export the import tree as folded stacks or speedscope JSON weighted
+    by self usage or time, the exports are written from records directly,
+    threshold is ignored.
+    """
     if modules_filepath:
         modules = read_modules(normalize_filepath(modules_filepath))
     else:
         modules = None
+    format = format or format_of(output_filepath)
     input_filepath = normalize_filepath(input_filepath)
+    output_filepath = normalize_filepath(output_filepath)
+    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+    if format not in ('pdf', 'html'):
+        from .export import export_records
+        meta, records = load_records(input_filepath)
+        if modules:
+            modules = set(modules)
+            records = [x for x in records if x['module'] in modules]
+        print(f'* export {format} to {output_filepath}')
+        name = os.path.basename(input_filepath)
+        export_records(records, output_filepath, format=format,
+                       weight=weight, name=name)
+        return
     records = RecordsProcessor.read(
         input_filepath, threshold=threshold, modules=modules)
+    if format == 'html':
+        from .viewer import render_html
+        print(f'* render html to {output_filepath}')
+        render_html(records, output_filepath,
+                    title=os.path.basename(input_filepath))
+        return
     dot = render_dot(records)
-    output_filepath = normalize_filepath(output_filepath)
     print(f'* render to {output_filepath}')
-    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
     save_to, __ = os.path.splitext(output_filepath)
     dot.render(filename=save_to, format='pdf')
 
@@ -1,12 +1,16 @@
-from .hooker import setup_hooker
+from .hooker import setup_hooker, save_records
 
 
+SAVE_TO = 'data/module_graph.json'
+
 if __name__ == "__main__":
-    memory_hooker = setup_hooker(save_to='data/module_graph.json', verbose=True)
+    memory_hooker = setup_hooker(save_to=SAVE_TO, verbose=True)
 
 
 import argparse  # noqa:E402
-from .traveler import ModuleTraveler  # noqa:E402
+from .traveler import ModuleTraveler, ProcessPoolTraveler  # noqa:E402
+from .static_traveler import StaticModuleTraveler  # noqa:E402
+from .cache import TravelerCache, default_cache_dir  # noqa:E402
 
 
 IGNORE = """
@@ -24,11 +28,75 @@ def cli():
     parser.add_argument(
         '--ignore', dest='ignore', type=str,
         help='ignore modules (shell patterns)')
+    parser.add_argument(
+        '--save-to', dest='save_to', type=str, default=SAVE_TO,
+        help='save module graph data to this filepath')
+    parser.add_argument(
+        '--jobs', dest='jobs', type=int, default=0,
+        help='import each top level module in a fresh worker process, '
+        'run N workers in parallel, default 0 means in current process')
+    parser.add_argument(
+        '--timeout', dest='timeout', type=float, default=300,
+        help='timeout seconds of each worker process')
+    parser.add_argument(
+        '--static', dest='static', action='store_true',
+        help='parse import statements instead of import modules, '
+        'the result has dependency edges but no memory usage')
+    parser.add_argument(
+        '--cache-dir', dest='cache_dir', type=str, default=default_cache_dir(),
+        help='cache results of top level modules with --jobs or --static')
+    parser.add_argument(
+        '--no-cache', dest='no_cache', action='store_true',
+        help='disable cache, always analyse all modules')
+    parser.add_argument(
+        '--cache-check', dest='cache_check', choices=['mtime', 'hash'],
+        default='mtime',
+        help='check module files changed by mtime and size or content hash')
+    parser.add_argument(
+        '--cache-max-size', dest='cache_max_size', type=int, default=256,
+        help='max cache size (MB), least recently used entries are removed')
+    parser.add_argument(
+        '--clear-cache', dest='clear_cache', action='store_true',
+        help='remove cache of --modules or all modules, then exit')
     args = parser.parse_args()
     modules = args.modules if args.modules else None
     ignore = (args.ignore or '') + IGNORE
-    traveler = ModuleTraveler(modules=modules, ignore=ignore)
-    traveler.run()
+    cache = None
+    if not args.no_cache or args.clear_cache:
+        cache = TravelerCache(
+            cache_dir=args.cache_dir,
+            mode='static' if args.static else 'import',
+            check=args.cache_check,
+            max_size=args.cache_max_size * 1024 * 1024,
+            salt=ignore,
+        )
+    if args.clear_cache:
+        memory_hooker.handler.save_to = None
+        if modules:
+            modules = modules.replace(',', ' ').split()
+        count = cache.clear(modules)
+        print(f'* removed {count} cache entries from {cache.cache_dir}')
+        return
+    if args.static:
+        traveler = StaticModuleTraveler(
+            modules=modules, ignore=ignore, jobs=args.jobs, cache=cache)
+    elif args.jobs > 0:
+        traveler = ProcessPoolTraveler(
+            modules=modules, ignore=ignore,
+            jobs=args.jobs, timeout=args.timeout, cache=cache)
+    else:
+        memory_hooker.handler.save_to = args.save_to
+        traveler = ModuleTraveler(modules=modules, ignore=ignore)
+        # saved at exit, read by ProcessPoolTraveler from worker output
+        memory_hooker.handler.meta['failed'] = traveler.failed
+        traveler.run()
+        return
+    # records not come from current process hooker, save them explicitly
+    memory_hooker.handler.save_to = None
+    meta, records = traveler.run()
+    for item in meta['failed']:
+        print(f'* failed {item["module"]}: {item["reason"]}')
+    save_records(records, args.save_to, meta=meta)
 
 
 if __name__ == "__main__":
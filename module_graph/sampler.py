@@ -0,0 +1,145 @@
+import os
+import sys
+import resource
+
+
+class MemorySampler:
+    """Measure process memory, bytes"""
+
+    name = None
+
+    def sample(self) -> int:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.name}>'
+
+
+class MaxRSSSampler(MemorySampler):
+    """Peak RSS (ru_maxrss), it never goes down"""
+
+    name = 'maxrss'
+
+    def __init__(self):
+        # kilobytes on Linux, bytes on OS X
+        self.unit = 1 if sys.platform == 'darwin' else 1024
+
+    def sample(self) -> int:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * self.unit
+
+
+class ProcFileSampler(MemorySampler):
+    """Read a /proc/self file through a cached fd, reopen after fork"""
+
+    filepath = None
+    bufsize = 4096
+
+    def __init__(self):
+        self._fd = None
+        self._pid = None
+
+    def _read(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._fd is not None:
+                os.close(self._fd)
+            # /proc/self is resolved when open, so reopen in forked child
+            self._fd = os.open(self.filepath, os.O_RDONLY)
+            self._pid = pid
+        return os.pread(self._fd, self.bufsize, 0)
+
+    @classmethod
+    def is_available(cls):
+        return os.path.exists(cls.filepath)
+
+
+class RSSSampler(ProcFileSampler):
+    """Current RSS from /proc/self/statm"""
+
+    name = 'rss'
+    filepath = '/proc/self/statm'
+    bufsize = 256
+
+    def __init__(self):
+        super().__init__()
+        self.page_size = resource.getpagesize()
+
+    def sample(self) -> int:
+        return int(self._read().split()[1]) * self.page_size
+
+
+def parse_smaps_fields(content, fields):
+    """Sum kilobytes values of fields in smaps format, return bytes"""
+    total = 0
+    for line in content.splitlines():
+        key, __, value = line.partition(b':')
+        if key in fields:
+            total += int(value.split()[0])
+    return total * 1024
+
+
+class SmapsRollupSampler(ProcFileSampler):
+
+    filepath = '/proc/self/smaps_rollup'
+    fields = ()
+
+    def sample(self) -> int:
+        return parse_smaps_fields(self._read(), self.fields)
+
+
+class USSSampler(SmapsRollupSampler):
+    """Unique set size (private pages) from /proc/self/smaps_rollup"""
+
+    name = 'uss'
+    fields = (b'Private_Clean', b'Private_Dirty')
+
+
+class PSSSampler(SmapsRollupSampler):
+    """Proportional set size from /proc/self/smaps_rollup"""
+
+    name = 'pss'
+    fields = (b'Pss',)
+
+
+class TracemallocSampler(MemorySampler):
+    """Python memory blocks traced by tracemalloc"""
+
+    name = 'tracemalloc'
+
+    def __init__(self):
+        import tracemalloc
+        self._tracemalloc = tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def sample(self) -> int:
+        return self._tracemalloc.get_traced_memory()[0]
+
+
+SAMPLERS = {
+    x.name: x for x in [
+        MaxRSSSampler,
+        RSSSampler,
+        USSSampler,
+        PSSSampler,
+        TracemallocSampler,
+    ]
+}
+
+
+def get_sampler(name=None) -> MemorySampler:
+    """Get sampler by name, default current RSS if possible else maxrss"""
+    if isinstance(name, MemorySampler):
+        return name
+    if not name or name == 'auto':
+        name = 'rss' if RSSSampler.is_available() else 'maxrss'
+    sampler_class = SAMPLERS.get(name)
+    if sampler_class is None:
+        choices = ', '.join(SAMPLERS)
+        raise ValueError(
+            f'unknown memory sampler {name!r}, choices: {choices}')
+    if issubclass(sampler_class, ProcFileSampler):
+        if not sampler_class.is_available():
+            raise ValueError(f'memory sampler {name!r} not available, '
+                             f'{sampler_class.filepath} not exists')
+    return sampler_class()
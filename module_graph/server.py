@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+
+def parse_address(address):
+    """
+    Parse server address, return (family, address):
+
+        unix:/path/to/sock or /path/to/sock: unix socket
+        host:port or port: TCP, host default 127.0.0.1
+    """
+    address = str(address)
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    if '/' in address:
+        return socket.AF_UNIX, address
+    host, __, port = address.rpartition(':')
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+class SnapshotServer:
+    """
+    Serve snapshot of a running hooker over HTTP, on a unix socket or
+    localhost TCP port, in a daemon thread. Paths:
+
+        /stats: summary stats
+        /stack: modules being imported, of all threads
+        /records: finished records
+        /snapshot: all above, can be read as module graph data
+    """
+
+    def __init__(self, hooker, address):
+        self.hooker = hooker
+        self.family, self.address = parse_address(address)
+        self.started_at = time.time()
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.remove(self.address)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(self.address)
+        sock.listen(8)
+        self._socket = sock
+        self._thread = threading.Thread(
+            target=self._serve, name='module-graph-server', daemon=True)
+        self._thread.start()
+        print(f'* module graph server listen on {self.address}')
+        return self
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if self.family == socket.AF_UNIX and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def detach(self):
+        """Close the inherited socket in forked child, keep the unix socket"""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _serve(self):
+        while self._socket is not None:
+            try:
+                conn, __ = self._socket.accept()
+            except OSError:
+                break
+            try:
+                self._handle(conn)
+            except Exception:
+                pass  # eg: client gone, keep serving
+            finally:
+                conn.close()
+
+    def _handle(self, conn):
+        conn.settimeout(5)
+        request = b''
+        while b'\r\n\r\n' not in request and b'\n\n' not in request:
+            data = conn.recv(4096)
+            if not data:
+                break
+            request += data
+            if len(request) > 65536:
+                break
+        parts = request.split(b'\n', 1)[0].split()
+        path = parts[1].decode('ascii', 'replace') if len(parts) > 1 else '/'
+        path = path.split('?', 1)[0].rstrip('/') or '/stats'
+        get_content = {
+            '/stats': self.get_stats,
+            '/stack': self.get_stack,
+            '/records': self.get_records,
+            '/snapshot': self.get_snapshot,
+        }.get(path)
+        if get_content is None:
+            status = '404 Not Found'
+            content = dict(message=f'not found {path}')
+        else:
+            try:
+                content = get_content()
+                status = '200 OK'
+            except Exception as ex:
+                status = '500 Internal Server Error'
+                content = dict(message=f'{type(ex).__name__}: {ex}')
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        header = (
+            f'HTTP/1.0 {status}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode('ascii')
+        conn.sendall(header + body)
+
+    def get_stack(self):
+        now = time.perf_counter()
+        stack = []
+        for record in list(self.hooker.importing.values()):
+            stack.append(dict(
+                module=record.module,
+                thread=record.thread,
+                elapsed=now - record.time_begin,
+                memory_begin=record.memory_begin,
+            ))
+        return stack
+
+    def _copy_records(self):
+        handler = self.hooker.handler
+        if handler is None:
+            return []
+        load = getattr(handler, 'load_records', None)
+        if load is not None:
+            # the file is written by on_import under the lock
+            with self.hooker._lock:
+                handler.flush()
+            return load(flush=False)
+        # copy the list is atomic, the records are finished and immutable
+        return [x.to_dict() for x in list(handler.records)]
+
+    def get_records(self):
+        return self._copy_records()
+
+    def get_stats(self, records=None):
+        if records is None:
+            records = self._copy_records()
+        top = sorted(records, key=lambda x: x['real_usage'], reverse=True)
+        handler = self.hooker.handler
+        return dict(
+            pid=os.getpid(),
+            uptime=time.time() - self.started_at,
+            meta=dict(handler.meta) if handler else {},
+            memory=self.hooker.sampler.sample(),
+            num_records=len(records),
+            num_importing=len(self.hooker.importing),
+            usage=sum(x['usage'] for x in records if not x['parent']),
+            time=sum(x['time'] for x in records if not x['parent']),
+            top_real_usage=[
+                dict(module=x['module'], real_usage=x['real_usage'])
+                for x in top[:10]
+            ],
+        )
+
+    def get_snapshot(self):
+        records = self._copy_records()
+        handler = self.hooker.handler
+        data = dict(handler.meta) if handler else {}
+        data.update(
+            stats=self.get_stats(records),
+            stack=self.get_stack(),
+            records=records,
+        )
+        return data
+
+
+def fetch(address, path='/snapshot'):
+    """Fetch json from a snapshot server"""
+    family, address = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(60)
+        sock.connect(address)
+        request = f'GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n'
+        sock.sendall(request.encode('ascii'))
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    response = b''.join(chunks)
+    header, __, body = response.partition(b'\r\n\r\n')
+    status = header.split(b'\r\n', 1)[0].decode('ascii', 'replace')
+    content = json.loads(body.decode('utf-8'))
+    if ' 200 ' not in status:
+        raise ValueError(f'{status}: {content.get("message")}')
+    return content
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Fetch')
+    parser.add_argument(
+        'address', type=str,
+        help='server address, unix:/path/to/sock or host:port')
+    parser.add_argument(
+        '--path', dest='path', type=str, default='/snapshot',
+        help='one of /snapshot, /records, /stack, /stats')
+    parser.add_argument(
+        '--output', dest='output', type=str, default='-',
+        help='save to this filepath, default stdout')
+    args = parser.parse_args()
+    content = json.dumps(fetch(args.address, args.path),
+                         indent=4, ensure_ascii=False)
+    if args.output == '-':
+        print(content)
+    else:
+        output = os.path.abspath(os.path.expanduser(args.output))
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as f:
+            f.write(content)
+        print(f'* save snapshot to {output}', file=sys.stderr)
+
+
+if __name__ == "__main__":
+    cli()
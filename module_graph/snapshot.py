@@ -0,0 +1,374 @@
+import sys
+import json
+import mmap
+import struct
+import argparse
+from array import array
+from collections import deque
+
+from .allocation import apply_module_fields
+
+
+def read_json_lines(f):
+    """
+    Read JSON Lines records written by ModuleJSONLinesHandler,
+    the last line maybe truncated if the process was killed.
+    """
+    meta = {}
+    records = []
+    lines = f.readlines()
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            if lineno == len(lines):
+                break  # truncated last line
+            raise ValueError(f'invalid json at line {lineno}') from None
+        if 'meta' in item and 'module' not in item:
+            meta.update(item['meta'])
+        else:
+            records.append(item)
+    fields = meta.pop('module_fields', None)
+    if fields:
+        apply_module_fields(records, fields)
+    return meta, records
+
+
+# Binary snapshot format, all integers in native byte order:
+#
+#   header: magic, version, byteorder, meta_offset, meta_size
+#   meta: json object, user meta info, columns and sections (offset, size)
+#   sections, 8 bytes aligned:
+#       name_offsets: uint64[n_names + 1], names sorted by utf-8 bytes
+#       names: utf-8 bytes of all module names
+#       name_record: int32[n_names], first record index of name, or -1
+#       record_module: uint32[n_records], name id of record module
+#       record_parent: int32[n_records], name id of record parent, or -1
+#       children_offsets: uint64[n_records + 1], CSR index of children
+#       children: uint32[n_children], name ids
+#       column_<name>: int64 or float64 [n_records], numeric record fields
+#           of all records, fields some records lack are in extra
+#       extra_offsets: uint64[n_records + 1]
+#       extra: json objects of other record fields, empty if none
+
+MAGIC = b'MGSNAP\0\0'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')
+BYTEORDER = {'little': 1, 'big': 2}
+RECORD_KEYS = ('module', 'parent', 'children')
+
+
+def is_binary_snapshot(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _numeric_columns(records):
+    """Numeric fields of all records, sparse fields are kept in extra"""
+    columns = {}
+    counts = {}
+    others = set()
+    for r in records:
+        for key, value in r.items():
+            if key in RECORD_KEYS or key in others:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                others.add(key)
+                columns.pop(key, None)
+                continue
+            counts[key] = counts.get(key, 0) + 1
+            if isinstance(value, float):
+                columns[key] = 'd'
+            else:
+                columns.setdefault(key, 'q')
+    return {k: v for k, v in columns.items() if counts[k] == len(records)}
+
+
+def save_binary(filepath, meta, records):
+    """Save records as binary snapshot"""
+    names = set()
+    for r in records:
+        names.add(r['module'])
+        if r.get('parent'):
+            names.add(r['parent'])
+        names.update(r.get('children') or [])
+    names = sorted(names, key=lambda x: x.encode('utf-8'))
+    name_ids = {name: i for i, name in enumerate(names)}
+
+    name_offsets = array('Q', [0])
+    name_blob = bytearray()
+    for name in names:
+        name_blob += name.encode('utf-8')
+        name_offsets.append(len(name_blob))
+
+    columns = _numeric_columns(records)
+    name_record = array('i', [-1]) * len(names)
+    record_module = array('I')
+    record_parent = array('i')
+    children_offsets = array('Q', [0])
+    children = array('I')
+    column_arrays = {key: array(typecode) for key, typecode in columns.items()}
+    extra_offsets = array('Q', [0])
+    extra_blob = bytearray()
+    for index, r in enumerate(records):
+        module_id = name_ids[r['module']]
+        if name_record[module_id] < 0:
+            name_record[module_id] = index
+        record_module.append(module_id)
+        parent = r.get('parent')
+        record_parent.append(name_ids[parent] if parent else -1)
+        children.extend(sorted(name_ids[x] for x in r.get('children') or []))
+        children_offsets.append(len(children))
+        for key, values in column_arrays.items():
+            values.append(r[key])
+        extra = {k: v for k, v in r.items()
+                 if k not in RECORD_KEYS and k not in columns}
+        if extra:
+            extra_blob += json.dumps(extra, ensure_ascii=False).encode('utf-8')
+        extra_offsets.append(len(extra_blob))
+
+    sections = [
+        ('name_offsets', name_offsets),
+        ('names', name_blob),
+        ('name_record', name_record),
+        ('record_module', record_module),
+        ('record_parent', record_parent),
+        ('children_offsets', children_offsets),
+        ('children', children),
+    ]
+    for key, values in column_arrays.items():
+        sections.append((f'column_{key}', values))
+    sections.append(('extra_offsets', extra_offsets))
+    sections.append(('extra', extra_blob))
+
+    body = bytearray()
+    section_table = {}
+    for key, values in sections:
+        data = values.tobytes() if isinstance(values, array) else values
+        body += b'\0' * (-len(body) % 8)
+        section_table[key] = [HEADER.size + len(body), len(data)]
+        body += data
+    info = dict(
+        meta=meta or {},
+        n_names=len(names),
+        n_records=len(records),
+        columns=columns,
+        sections=section_table,
+    )
+    meta_data = json.dumps(info, ensure_ascii=False).encode('utf-8')
+    meta_offset = HEADER.size + len(body)
+    header = HEADER.pack(
+        MAGIC, VERSION, BYTEORDER[sys.byteorder], meta_offset, len(meta_data))
+    with open(filepath, 'wb') as f:
+        f.write(header)
+        f.write(body)
+        f.write(meta_data)
+
+
+class BinarySnapshot:
+    """
+    Memory-mapped binary snapshot, records are decoded on demand,
+    so a subgraph can be queried without load all records.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        magic, version, byteorder, meta_offset, meta_size = \
+            HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{filepath} is not a binary snapshot')
+        if version != VERSION:
+            raise ValueError(f'unsupported binary snapshot version {version}')
+        if byteorder != BYTEORDER[sys.byteorder]:
+            raise ValueError('binary snapshot byte order not match')
+        meta_data = self._buffer[meta_offset:meta_offset + meta_size]
+        info = json.loads(bytes(meta_data).decode('utf-8'))
+        self.meta = info['meta']
+        self.n_names = info['n_names']
+        self.n_records = info['n_records']
+        self.columns = info['columns']
+        self._sections = info['sections']
+        self._name_offsets = self._section('name_offsets', 'Q')
+        self._names = self._section('names')
+        self._name_record = self._section('name_record', 'i')
+        self._record_module = self._section('record_module', 'I')
+        self._record_parent = self._section('record_parent', 'i')
+        self._children_offsets = self._section('children_offsets', 'Q')
+        self._children = self._section('children', 'I')
+        self._columns = {
+            key: self._section(f'column_{key}', typecode)
+            for key, typecode in self.columns.items()
+        }
+        self._extra_offsets = self._section('extra_offsets', 'Q')
+        self._extra = self._section('extra')
+
+    def _section(self, key, typecode=None):
+        offset, size = self._sections[key]
+        view = self._buffer[offset:offset + size]
+        return view.cast(typecode) if typecode else view
+
+    def close(self):
+        views = [
+            self._name_offsets, self._names, self._name_record,
+            self._record_module, self._record_parent,
+            self._children_offsets, self._children,
+            self._extra_offsets, self._extra,
+        ]
+        views.extend(self._columns.values())
+        views.append(self._buffer)
+        for view in views:
+            view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _name_bytes(self, name_id):
+        begin = self._name_offsets[name_id]
+        end = self._name_offsets[name_id + 1]
+        return self._names[begin:end].tobytes()
+
+    def name_of(self, name_id):
+        return self._name_bytes(name_id).decode('utf-8')
+
+    def id_of(self, name):
+        """Binary search name id in sorted names, None if not found"""
+        key = name.encode('utf-8')
+        lo, hi = 0, self.n_names
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_names and self._name_bytes(lo) == key:
+            return lo
+        return None
+
+    def _children_ids(self, index):
+        begin = self._children_offsets[index]
+        end = self._children_offsets[index + 1]
+        return self._children[begin:end]
+
+    def get_record(self, index):
+        parent_id = self._record_parent[index]
+        record = dict(
+            module=self.name_of(self._record_module[index]),
+            parent=self.name_of(parent_id) if parent_id >= 0 else None,
+            children=[self.name_of(x) for x in self._children_ids(index)],
+        )
+        for key, values in self._columns.items():
+            record[key] = values[index]
+        begin = self._extra_offsets[index]
+        end = self._extra_offsets[index + 1]
+        if end > begin:
+            record.update(json.loads(self._extra[begin:end].tobytes()))
+        return record
+
+    def iter_records(self):
+        for index in range(self.n_records):
+            yield self.get_record(index)
+
+    def find_record(self, module):
+        name_id = self.id_of(module)
+        if name_id is None:
+            return None
+        index = self._name_record[name_id]
+        return self.get_record(index) if index >= 0 else None
+
+    def subgraph(self, modules, depth=None):
+        """Records reachable from modules by children edges"""
+        queue = deque()
+        visited = set()
+        for module in modules:
+            name_id = self.id_of(module)
+            if name_id is not None and name_id not in visited:
+                visited.add(name_id)
+                queue.append((name_id, 0))
+        records = []
+        while queue:
+            name_id, level = queue.popleft()
+            index = self._name_record[name_id]
+            if index < 0:
+                continue
+            records.append(self.get_record(index))
+            if depth is not None and level >= depth:
+                continue
+            for child_id in self._children_ids(index):
+                if child_id not in visited:
+                    visited.add(child_id)
+                    queue.append((child_id, level + 1))
+        return records
+
+
+def load_records(filepath):
+    """
+    Load (meta, records) from json, JSON Lines or binary snapshot file,
+    json file is a list of records or an object with records and meta info.
+    """
+    if is_binary_snapshot(filepath):
+        with BinarySnapshot(filepath) as snapshot:
+            return dict(snapshot.meta), list(snapshot.iter_records())
+    with open(filepath) as f:
+        first_line = f.readline()
+        f.seek(0)
+        try:
+            item = json.loads(first_line)
+        except ValueError:
+            item = None
+        if isinstance(item, dict) and 'meta' in item:
+            return read_json_lines(f)
+        data = json.load(f)
+    if isinstance(data, list):
+        return {}, data
+    meta = dict(data)
+    records = meta.pop('records')
+    return meta, records
+
+
+def convert(input_filepath, output_filepath):
+    """Convert snapshot between json (.json/.jsonl) and binary (.mgb)"""
+    meta, records = load_records(input_filepath)
+    if output_filepath.endswith('.mgb'):
+        save_binary(output_filepath, meta, records)
+    else:
+        data = dict(meta, records=records)
+        with open(output_filepath, 'w') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Module Graph Snapshot')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    convert_parser = subparsers.add_parser(
+        'convert', help='convert between json and binary (.mgb) snapshot')
+    convert_parser.add_argument('input_filepath')
+    convert_parser.add_argument('output_filepath')
+    query_parser = subparsers.add_parser(
+        'query', help='print records reachable from modules as json')
+    query_parser.add_argument('input_filepath', help='binary snapshot')
+    query_parser.add_argument('modules', nargs='+')
+    query_parser.add_argument(
+        '--depth', dest='depth', type=int, default=None,
+        help='max depth of children edges, default unlimited')
+    args = parser.parse_args()
+    if args.command == 'convert':
+        convert(args.input_filepath, args.output_filepath)
+    else:
+        with BinarySnapshot(args.input_filepath) as snapshot:
+            records = snapshot.subgraph(args.modules, depth=args.depth)
+        print(json.dumps(records, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    cli()
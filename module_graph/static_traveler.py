@@ -0,0 +1,212 @@
+import os
+import ast
+import logging
+import importlib.util
+import importlib.machinery
+from concurrent.futures import ProcessPoolExecutor
+
+from .hooker import ModuleMemoryRecord
+from .traveler import ModuleTraveler, find_module_files
+
+
+LOG = logging.getLogger(__name__)
+
+
+def resolve_name(name, package, level):
+    """Resolve relative module name, return None if beyond top level"""
+    if not level:
+        return name
+    bits = package.rsplit('.', level - 1)
+    if len(bits) < level:
+        return None
+    base = bits[0]
+    return f'{base}.{name}' if name else base
+
+
+class ImportVisitor(ast.NodeVisitor):
+    """Collect imports executed at import time, skip function bodies"""
+
+    def __init__(self, package):
+        self.package = package
+        self.imports = []
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports.append((alias.name, ()))
+
+    def visit_ImportFrom(self, node):
+        base = resolve_name(node.module or '', self.package, node.level)
+        if base:
+            names = tuple(x.name for x in node.names if x.name != '*')
+            self.imports.append((base, names))
+
+    def visit_FunctionDef(self, node):
+        pass
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_Lambda = visit_FunctionDef
+
+
+def parse_imports(item):
+    """
+    Parse imports of a module source file.
+
+    Return (module, imports, error), imports is list of (name, from_names),
+    from_names maybe submodules or attributes of name.
+    """
+    module, filepath = item
+    if os.path.basename(filepath) == '__init__.py':
+        package = module
+    else:
+        package = module.rpartition('.')[0]
+    try:
+        with open(filepath, 'rb') as f:
+            tree = ast.parse(f.read(), filename=filepath)
+    except (SyntaxError, ValueError, OSError) as ex:
+        return module, [], f'{type(ex).__name__}: {ex}'
+    visitor = ImportVisitor(package)
+    visitor.visit(tree)
+    return module, visitor.imports, None
+
+
+def find_root_files(module):
+    """Find source files of top level module without import it"""
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return []
+    if spec is None:
+        return []
+    if spec.submodule_search_locations:
+        root_paths = list(spec.submodule_search_locations)
+        return list(find_module_files(module, root_paths))
+    if spec.origin and spec.origin.endswith('.py'):
+        return [(module, spec.origin)]
+    return []
+
+
+class SubmoduleResolver:
+    """
+    Whether a name is a module, by modules found in this run, else by files
+    of it's top level package, without import it. So 'from pkg import sub'
+    resolves the same whatever modules are in the run.
+    """
+
+    def __init__(self, known_modules=()):
+        self.known_modules = set(known_modules)
+        self._locations = {}
+        self._suffixes = tuple(importlib.machinery.all_suffixes())
+
+    def _root_locations(self, root):
+        locations = self._locations.get(root)
+        if locations is None:
+            try:
+                spec = importlib.util.find_spec(root)
+            except (ImportError, ValueError):
+                spec = None
+            locations = []
+            if spec is not None and spec.submodule_search_locations:
+                locations = list(spec.submodule_search_locations)
+            self._locations[root] = locations
+        return locations
+
+    def __contains__(self, module):
+        if module in self.known_modules:
+            return True
+        root, __, rest = module.partition('.')
+        if not rest:
+            return False
+        for location in self._root_locations(root):
+            path = os.path.join(location, *rest.split('.'))
+            if os.path.isfile(os.path.join(path, '__init__.py')):
+                return True
+            for suffix in self._suffixes:
+                if os.path.isfile(path + suffix):
+                    return True
+        return False
+
+
+class StaticModuleTraveler(ModuleTraveler):
+    """
+    Extract module dependency graph by parse import statements,
+    without import any module. Records have edges but no memory.
+    """
+
+    def __init__(self, modules=None, ignore=None, jobs=None, chunksize=64,
+                 cache=None):
+        super().__init__(modules=modules, ignore=ignore)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.cache = cache
+
+    def find_files(self):
+        """Find source files, return dict of top level module to files"""
+        files_map = {}
+        for root in self.modules:
+            files = []
+            for module, filepath in find_root_files(root):
+                if self.filter_func(module):
+                    files.append((module, filepath))
+            files_map[root] = files
+        return files_map
+
+    def parse_all(self, files):
+        if self.jobs <= 1 or len(files) <= self.chunksize:
+            return list(map(parse_imports, files))
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(
+                parse_imports, files, chunksize=self.chunksize))
+
+    def build_record(self, module, imports, known_modules):
+        children = set()
+        for name, from_names in imports:
+            if not from_names:
+                children.add(name)
+                continue
+            for from_name in from_names:
+                submodule = f'{name}.{from_name}'
+                if submodule in known_modules:
+                    children.add(submodule)
+                else:
+                    children.add(name)
+        children.discard(module)
+        return ModuleMemoryRecord(module=module, children=children).to_dict()
+
+    def run(self):
+        files_map = self.find_files()
+        module_roots = {}
+        for root, files in files_map.items():
+            for module, __ in files:
+                module_roots[module] = root
+        # cache keeps parsed imports of the package's own files, they are
+        # resolved to modules after loading, resolving depends on others
+        results = {}
+        fingerprints = {}
+        files_to_parse = []
+        for root, files in files_map.items():
+            if self.cache:
+                fingerprint = self.cache.fingerprint(root)
+                data = self.cache.get(root, fingerprint)
+                if data is not None and 'parsed' in data:
+                    results[root] = data
+                    continue
+                fingerprints[root] = fingerprint
+            results[root] = dict(parsed=[])
+            files_to_parse.extend(files)
+        for module, imports, error in self.parse_all(files_to_parse):
+            data = results[module_roots[module]]
+            data['parsed'].append([module, imports, error])
+        for root, fingerprint in fingerprints.items():
+            self.cache.put(root, fingerprint, results[root])
+        resolver = SubmoduleResolver(module_roots)
+        records = []
+        failed = []
+        for data in results.values():
+            for module, imports, error in data['parsed']:
+                if error:
+                    failed.append(dict(module=module, reason=error))
+                    LOG.debug(f'parse {module} failed: {error}')
+                records.append(self.build_record(module, imports, resolver))
+        records.sort(key=lambda x: x['module'])
+        meta = dict(mode='static', failed=failed)
+        return meta, records
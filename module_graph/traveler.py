@@ -1,5 +1,11 @@
+import os
 import os.path
+import sys
+import json
+import time
 import logging
+import tempfile
+import subprocess
 import importlib
 import warnings
 import fnmatch
@@ -9,25 +15,34 @@ import pkgutil
 LOG = logging.getLogger(__name__)
 
 
-def find_all_modules(root):
-    import_name = root.__name__
-    if import_name == '__main__':
-        return
-    for root_path in set(getattr(root, "__path__", [])):
+def find_module_files(import_name, root_paths):
+    """Find (module, filepath) of python source files in package paths"""
+    for root_path in set(root_paths):
         root_path = root_path.rstrip("/")
         for root, dirs, files in os.walk(root_path):
             root = root.rstrip("/")
             if "__init__.py" in files:
                 module = root[len(root_path):].replace("/", ".")
+                filepath = os.path.join(root, "__init__.py")
                 if module:
-                    yield f"{import_name}{module}"
+                    yield f"{import_name}{module}", filepath
                 else:
-                    yield import_name
+                    yield import_name, filepath
             for filename in files:
                 if filename != "__init__.py" and filename.endswith(".py"):
-                    module = os.path.splitext(os.path.join(root, filename))[0]
+                    filepath = os.path.join(root, filename)
+                    module = os.path.splitext(filepath)[0]
                     module = module[len(root_path):].replace("/", ".")
-                    yield f"{import_name}{module}"
+                    yield f"{import_name}{module}", filepath
+
+
+def find_all_modules(root):
+    import_name = root.__name__
+    if import_name == '__main__':
+        return
+    root_paths = getattr(root, "__path__", [])
+    for module, __ in find_module_files(import_name, root_paths):
+        yield module
 
 
 BLACK_LIST = """
@@ -68,20 +83,28 @@ class ModuleTraveler:
             modules = list(modules)
         modules = [x for x in modules if self.filter_func(x)]
         self.modules = modules
+        # dict(module, reason) of modules failed to import
+        self.failed = []
+
+    def _import(self, module):
+        try:
+            return importlib.import_module(module)
+        except (ModuleNotFoundError, ImportError) as ex:
+            reason = f'{type(ex).__name__}: {ex}'
+        except Exception as ex:
+            reason = f'{type(ex).__name__}: {ex}'
+            LOG.warning(f'import {module} {reason}', exc_info=ex)
+        self.failed.append(dict(module=module, reason=reason))
+        return None
 
     def run(self):
         warnings.simplefilter("ignore")
         roots = []
         failed_modules = set()
         for module in self.modules:
-            try:
-                module_object = importlib.import_module(module)
-            except (ModuleNotFoundError, ImportError):
-                failed_modules.add(module)
-            except Exception as ex:
+            module_object = self._import(module)
+            if module_object is None:
                 failed_modules.add(module)
-                msg = f'import {module} {type(ex).__name__}: {ex}'
-                LOG.warning(msg, exc_info=ex)
             else:
                 roots.append(module_object)
         for root in roots:
@@ -91,11 +114,159 @@ class ModuleTraveler:
                 parent = '.'.join(module.split('.')[:-1])
                 if parent and parent in failed_modules:
                     continue
-                try:
-                    importlib.import_module(module)
-                except (ModuleNotFoundError, ImportError):
+                if self._import(module) is None:
                     failed_modules.add(module)
-                except Exception as ex:
-                    failed_modules.add(module)
-                    msg = f'import {module} {type(ex).__name__}: {ex}'
-                    LOG.warning(msg, exc_info=ex)
+
+
+MERGE_MAX_FIELDS = (
+    'usage', 'real_usage', 'time', 'real_time', 'cpu_time', 'real_cpu_time',
+)
+
+
+def merge_records(records):
+    """
+    Merge records measured in different processes.
+
+    Each process measures a module independently, so duplicated records are
+    merged by union of children and max of usage and time, not summed.
+    """
+    records_map = {}
+    for r in records:
+        module = r['module']
+        old = records_map.get(module)
+        if old is None:
+            records_map[module] = dict(r, children=list(r['children']))
+            continue
+        children = set(old['children']) | set(r['children'])
+        old['children'] = list(sorted(children))
+        if not old['parent']:
+            old['parent'] = r['parent']
+        for field in MERGE_MAX_FIELDS:
+            if field in r:
+                old[field] = max(old.get(field, 0), r[field])
+
+    def key_func(x):
+        return max(x['real_usage'], x['usage'])
+    return list(sorted(records_map.values(), key=key_func, reverse=True))
+
+
+class ProcessPoolTraveler(ModuleTraveler):
+    """
+    Import each top level module in a fresh worker process,
+    with it's own hooker and timeout, then merge the results.
+    """
+
+    def __init__(self, modules=None, ignore=None, jobs=None, timeout=300,
+                 cache=None):
+        super().__init__(modules=modules, ignore=ignore)
+        if isinstance(ignore, (list, tuple)):
+            ignore = '\n'.join(ignore)
+        self.ignore = ignore
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cache = cache
+
+    def _worker_command(self, module, save_to):
+        command = [
+            sys.executable, '-m', 'module_graph.run_traveler',
+            '--modules', module, '--save-to', save_to,
+        ]
+        if self.ignore:
+            command.extend(['--ignore', self.ignore])
+        return command
+
+    def _start_worker(self, module, tmpdir):
+        save_to = os.path.join(tmpdir, f'{module}.json')
+        stderr = open(os.path.join(tmpdir, f'{module}.stderr'), 'w+')
+        proc = subprocess.Popen(
+            self._worker_command(module, save_to),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr,
+        )
+        return proc, save_to, stderr, time.monotonic()
+
+    def _finish_worker(self, module, worker, timeout=False):
+        proc, save_to, stderr, begin = worker
+        if timeout:
+            proc.kill()
+            proc.wait()
+        cost = time.monotonic() - begin
+        stderr.seek(0)
+        error = stderr.read()[-2000:]
+        stderr.close()
+        if timeout:
+            reason = f'timeout after {self.timeout}s'
+        elif proc.returncode != 0:
+            reason = f'exit code {proc.returncode}'
+        elif not os.path.exists(save_to):
+            reason = 'no output'
+        else:
+            with open(save_to) as f:
+                data = json.load(f)
+            # import failures of the worker, submodules are reported in run
+            reasons = [x['reason'] for x in data.get('failed', [])
+                       if x['module'] == module]
+            if not reasons:
+                return data, None
+            reason = reasons[0]
+        msg = f'travel {module} failed: {reason}, cost {cost:.1f}s'
+        LOG.warning(msg)
+        failed = dict(module=module, reason=reason, stderr=error)
+        return None, failed
+
+    def run(self):
+        total = len(self.modules)
+        pending = []
+        fingerprints = {}
+        running = {}
+        results = []
+        failed = []
+        for module in self.modules:
+            if self.cache:
+                fingerprint = self.cache.fingerprint(module)
+                data = self.cache.get(module, fingerprint)
+                if data is not None:
+                    results.append(data)
+                    print(f'* [{len(results)}/{total}] {module} cached')
+                    continue
+                fingerprints[module] = fingerprint
+            pending.append(module)
+        with tempfile.TemporaryDirectory(prefix='module_graph_') as tmpdir:
+            while pending or running:
+                while pending and len(running) < self.jobs:
+                    module = pending.pop(0)
+                    running[module] = self._start_worker(module, tmpdir)
+                time.sleep(0.05)
+                now = time.monotonic()
+                for module, worker in list(running.items()):
+                    proc, __, __, begin = worker
+                    is_timeout = now - begin > self.timeout
+                    if proc.poll() is None and not is_timeout:
+                        continue
+                    del running[module]
+                    data, error = self._finish_worker(
+                        module, worker, timeout=proc.poll() is None)
+                    if error:
+                        failed.append(error)
+                    else:
+                        results.append(data)
+                        if self.cache:
+                            # records of dependencies are in the data too
+                            depends = {
+                                x['module'].partition('.')[0]
+                                for x in data['records']}
+                            self.cache.put(
+                                module, fingerprints[module], data,
+                                depends=depends)
+                    done = len(results) + len(failed)
+                    status = 'failed' if error else 'ok'
+                    print(f'* [{done}/{total}] {module} {status}')
+        for data in results:
+            failed.extend(data.get('failed', []))
+        records = merge_records(x for data in results for x in data['records'])
+        samplers = {data.get('sampler') for data in results}
+        meta = dict(failed=failed)
+        if len(samplers) == 1:
+            meta['sampler'] = samplers.pop()
+        return meta, records
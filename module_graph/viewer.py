@@ -0,0 +1,363 @@
+import json
+
+from .render import color_of, label_of
+
+COLORS = ['grey', 'red', 'orange', 'blue', 'black']
+
+
+def viewer_data(records):
+    """
+    Compact columns of processed records (RecordsProcessor output),
+    parent and edges are indexes of nodes, -1 means no parent.
+    """
+    ids = {r.module: i for i, r in enumerate(records)}
+    color_ids = {x: i for i, x in enumerate(COLORS)}
+    data = dict(
+        names=[], parents=[], usage=[], real_usage=[], time=[],
+        real_time=[], gc_objects=[], real_gc_objects=[], traced_usage=[],
+        sites=[], native_usage=[], shared_objects=[], colors=[], labels=[],
+        edges=[],
+    )
+    for r in records:
+        data['names'].append(r.module)
+        parent = ids.get(r.parent.module, -1) if r.parent else -1
+        data['parents'].append(parent)
+        data['usage'].append(r.usage)
+        data['real_usage'].append(r.real_usage)
+        data['time'].append(round(r.time, 6))
+        data['real_time'].append(round(r.real_time, 6))
+        data['gc_objects'].append(r.gc_objects)
+        data['real_gc_objects'].append(r.real_gc_objects)
+        data['traced_usage'].append(r.traced_usage)
+        data['sites'].append([
+            [x['lineno'], x['size'], x['count']] for x in r.allocation_sites])
+        data['native_usage'].append(r.native_usage)
+        data['shared_objects'].append([
+            [x['path'], x['rss'], x['private']] for x in r.shared_objects])
+        data['colors'].append(color_ids[color_of(r)])
+        data['labels'].append(' '.join(label_of(r).split('\n')[1:]))
+        data['edges'].append(
+            [ids[x.module] for x in r.children if x.module in ids])
+    data['color_names'] = COLORS
+    return data
+
+
+def render_html(records, output_filepath, title='Module Graph'):
+    """Write a self-contained HTML viewer of processed records"""
+    data = json.dumps(viewer_data(records), separators=(',', ':'))
+    # the data is inside a script tag
+    data = data.replace('</', '<\\/')
+    content = HTML_TEMPLATE.replace('{{title}}', title.replace('<', '&lt;'))
+    content = content.replace('{{data}}', data)
+    with open(output_filepath, 'w') as f:
+        f.write(content)
+
+
+HTML_TEMPLATE = r"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{title}}</title>
+<style>
+body { margin: 0; font: 13px monospace; display: flex; height: 100vh; }
+#main { flex: 1; display: flex; flex-direction: column; min-width: 0; }
+#toolbar { padding: 6px; border-bottom: 1px solid #ccc; }
+#toolbar input { width: 280px; }
+#scroll { flex: 1; overflow-y: auto; position: relative; }
+#spacer { position: relative; }
+.row { position: absolute; left: 0; right: 0; height: 20px;
+       line-height: 20px; white-space: nowrap; cursor: pointer; }
+.row:hover { background: #eef; }
+.row.selected { background: #dde; }
+.toggle { display: inline-block; width: 14px; color: #666; }
+.info { color: #888; margin-left: 8px; }
+#side { width: 360px; border-left: 1px solid #ccc; overflow-y: auto;
+        padding: 6px; }
+#side a { cursor: pointer; text-decoration: underline; display: block; }
+</style>
+</head>
+<body>
+<div id="main">
+<div id="toolbar">
+  <select id="view">
+    <option value="imports">import tree</option>
+    <option value="packages">package tree</option>
+  </select>
+  <select id="sort">
+    <option value="usage">sort by memory</option>
+    <option value="time">sort by time</option>
+    <option value="gc_objects">sort by GC objects</option>
+  </select>
+  <input id="search" placeholder="search module, press enter">
+  <button id="collapse">collapse all</button>
+  <span id="status"></span>
+</div>
+<div id="scroll"><div id="spacer"></div></div>
+</div>
+<div id="side"><div id="results"></div><div id="details"></div></div>
+<script type="application/json" id="data">{{data}}</script>
+<script>
+"use strict";
+const D = JSON.parse(document.getElementById('data').textContent);
+const N = D.names.length;
+const ROW = 20;
+const MB = 1024 * 1024;
+
+function mb(v) { return Math.round(v / MB); }
+
+// a tree is children lists and the memory usage of nodes,
+// nodes >= N are package nodes without record, in package tree
+function buildImportTree() {
+  const children = Array.from({length: N}, () => []);
+  const roots = [];
+  for (let i = 0; i < N; i++) {
+    const p = D.parents[i];
+    (p >= 0 ? children[p] : roots).push(i);
+  }
+  return {children, roots, parents: D.parents.slice(), names: D.names,
+          weight: D.usage, sums: null};
+}
+
+function buildPackageTree() {
+  const names = D.names.slice();
+  const ids = new Map(names.map((x, i) => [x, i]));
+  const parents = new Array(N).fill(-1);
+  function idOf(name) {
+    let id = ids.get(name);
+    if (id === undefined) {
+      id = names.length;
+      names.push(name);
+      ids.set(name, id);
+      parents.push(-1);
+      linkParent(id, name);
+    }
+    return id;
+  }
+  function linkParent(id, name) {
+    const dot = name.lastIndexOf('.');
+    if (dot > 0) parents[id] = idOf(name.slice(0, dot));
+  }
+  for (let i = 0; i < N; i++) linkParent(i, names[i]);
+  const children = Array.from({length: names.length}, () => []);
+  const roots = [];
+  for (let i = 0; i < names.length; i++) {
+    (parents[i] >= 0 ? children[parents[i]] : roots).push(i);
+  }
+  const order = [];
+  const stack = roots.slice();
+  while (stack.length) {
+    const x = stack.pop();
+    order.push(x);
+    for (const c of children[x]) stack.push(c);
+  }
+  // value of a package is sum of self values of all it's modules
+  function sums(values) {
+    const ret = values.concat(new Array(names.length - N).fill(0));
+    for (let k = order.length - 1; k >= 0; k--) {
+      const x = order[k];
+      if (parents[x] >= 0) ret[parents[x]] += ret[x];
+    }
+    return ret;
+  }
+  return {children, roots, parents, names, weight: sums(D.real_usage), sums};
+}
+
+const trees = {};
+let tree = null;
+let expanded = new Set();
+let rows = [];       // visible rows: [node, depth]
+let selected = -1;
+let sortField = 'usage';
+
+function sortWeights() {
+  tree.sortWeights = tree.sortWeights || {};
+  if (!tree.sortWeights[sortField]) {
+    tree.sortWeights[sortField] = tree.sums ?
+      tree.sums(D['real_' + sortField]) : D[sortField];
+  }
+  return tree.sortWeights[sortField];
+}
+
+function sortByWeight(list) {
+  const weights = sortWeights();
+  return list.slice().sort((a, b) => weights[b] - weights[a]);
+}
+
+function flatten() {
+  rows = [];
+  const stack = sortByWeight(tree.roots).reverse().map(x => [x, 0]);
+  while (stack.length) {
+    const [x, depth] = stack.pop();
+    rows.push([x, depth]);
+    if (expanded.has(x)) {
+      const children = sortByWeight(tree.children[x]);
+      for (let k = children.length - 1; k >= 0; k--) {
+        stack.push([children[k], depth + 1]);
+      }
+    }
+  }
+  document.getElementById('spacer').style.height = rows.length * ROW + 'px';
+  document.getElementById('status').textContent =
+    rows.length + ' rows, ' + N + ' modules';
+  draw();
+}
+
+const scroll = document.getElementById('scroll');
+const spacer = document.getElementById('spacer');
+
+function rowText(x) {
+  if (x >= N) {
+    return tree.names[x] + '  [package ' + mb(tree.weight[x]) + 'M]';
+  }
+  const label = D.labels[x];
+  return D.names[x] + (label ? '  ' + label : '');
+}
+
+// only rows in the viewport are in the DOM
+function draw() {
+  const first = Math.max(0, Math.floor(scroll.scrollTop / ROW) - 10);
+  const last = Math.min(rows.length,
+    Math.ceil((scroll.scrollTop + scroll.clientHeight) / ROW) + 10);
+  const parts = [];
+  for (let k = first; k < last; k++) {
+    const [x, depth] = rows[k];
+    const hasChildren = tree.children[x].length > 0;
+    const toggle = hasChildren ? (expanded.has(x) ? '-' : '+') : ' ';
+    const color = x < N ? D.color_names[D.colors[x]] : 'black';
+    const count = hasChildren ?
+      '<span class="info">' + tree.children[x].length + '</span>' : '';
+    parts.push('<div class="row' + (x === selected ? ' selected' : '') +
+      '" data-k="' + k + '" style="top:' + k * ROW + 'px;padding-left:' +
+      (depth * 16 + 4) + 'px;color:' + color + '"><span class="toggle">' +
+      toggle + '</span>' + escapeHtml(rowText(x)) + count + '</div>');
+  }
+  spacer.innerHTML = parts.join('');
+}
+
+function escapeHtml(s) {
+  return s.replace(/&/g, '&amp;').replace(/</g, '&lt;');
+}
+
+function link(x) {
+  return '<a data-node="' + x + '">' + escapeHtml(tree.names[x]) + '</a>';
+}
+
+function showDetails(x) {
+  const side = document.getElementById('details');
+  const parts = ['<b>' + escapeHtml(tree.names[x]) + '</b>'];
+  if (x < N) {
+    parts.push('<p>usage ' + mb(D.usage[x]) + 'M, self ' +
+      mb(D.real_usage[x]) + 'M<br>time ' + Math.round(D.time[x] * 1000) +
+      'ms, self ' + Math.round(D.real_time[x] * 1000) + 'ms</p>');
+    if (D.gc_objects[x]) {
+      parts.push('<p>GC objects ' + D.gc_objects[x] + ', self ' +
+        D.real_gc_objects[x] + '</p>');
+    }
+    if (D.traced_usage[x]) {
+      parts.push('<p>python memory ' + Math.round(D.traced_usage[x] / 1024) +
+        'K, allocation sites</p>' + D.sites[x].map(site =>
+          'line ' + site[0] + ': ' + Math.round(site[1] / 1024) + 'K, ' +
+          site[2] + ' blocks').join('<br>'));
+    }
+    if (D.shared_objects[x].length) {
+      parts.push('<p>native ' + Math.round(D.native_usage[x] / 1024) +
+        'K, shared objects mapped</p>' + D.shared_objects[x].map(item =>
+          escapeHtml(item[0]) + ': ' + Math.round(item[1] / 1024) +
+          'K, private ' + Math.round(item[2] / 1024) + 'K').join('<br>'));
+    }
+    if (D.parents[x] >= 0) {
+      parts.push('<p>imported by</p>' + link(D.parents[x]));
+    }
+    if (D.edges[x].length) {
+      parts.push('<p>imports</p>' + D.edges[x].map(link).join(''));
+    }
+  } else {
+    parts.push('<p>package, self usage of modules ' +
+      mb(tree.weight[x]) + 'M</p>');
+  }
+  const children = sortByWeight(tree.children[x]);
+  if (children.length) {
+    const title = x < N && tree === trees.imports ?
+      'first imported by this module' : 'submodules';
+    parts.push('<p>' + title + '</p>' +
+      children.slice(0, 500).map(link).join(''));
+  }
+  side.innerHTML = parts.join('');
+}
+
+function reveal(x) {
+  // stop at a parent seen before, in case of cycle
+  const seen = new Set([x]);
+  for (let p = tree.parents[x]; p >= 0 && !seen.has(p); p = tree.parents[p]) {
+    seen.add(p);
+    expanded.add(p);
+  }
+  selected = x;
+  flatten();
+  const k = rows.findIndex(r => r[0] === x);
+  scroll.scrollTop = Math.max(0, k * ROW - scroll.clientHeight / 2);
+  draw();
+  showDetails(x);
+}
+
+function setView(name) {
+  if (!trees[name]) {
+    trees[name] = name === 'imports' ? buildImportTree() : buildPackageTree();
+  }
+  tree = trees[name];
+  // results and details are ids of the previous tree
+  document.getElementById('results').innerHTML = '';
+  document.getElementById('details').innerHTML = '';
+  expanded = new Set();
+  selected = -1;
+  scroll.scrollTop = 0;
+  flatten();
+}
+
+scroll.addEventListener('scroll', () => requestAnimationFrame(draw));
+window.addEventListener('resize', draw);
+spacer.addEventListener('click', e => {
+  const row = e.target.closest('.row');
+  if (!row) return;
+  const x = rows[+row.dataset.k][0];
+  if (tree.children[x].length) {
+    if (expanded.has(x)) expanded.delete(x); else expanded.add(x);
+  }
+  selected = x;
+  flatten();
+  showDetails(x);
+});
+document.getElementById('side').addEventListener('click', e => {
+  const a = e.target.closest('a');
+  if (a) reveal(+a.dataset.node);
+});
+document.getElementById('view').addEventListener('change', e => {
+  setView(e.target.value);
+});
+document.getElementById('sort').addEventListener('change', e => {
+  sortField = e.target.value;
+  flatten();
+});
+document.getElementById('collapse').addEventListener('click', () => {
+  expanded = new Set();
+  flatten();
+});
+document.getElementById('search').addEventListener('keydown', e => {
+  if (e.key !== 'Enter') return;
+  const q = e.target.value.trim();
+  if (!q) return;
+  let found = [];
+  for (let x = 0; x < tree.names.length && found.length < 500; x++) {
+    if (tree.names[x].includes(q)) found.push(x);
+  }
+  found = sortByWeight(found);
+  document.getElementById('results').innerHTML = '<b>' + found.length +
+    (found.length >= 500 ? '+' : '') + ' found</b>' +
+    found.map(link).join('') + '<hr>';
+  if (found.length) reveal(found[0]);
+});
+setView('imports');
+</script>
+</body>
+</html>
+"""
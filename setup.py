@@ -23,13 +23,11 @@ setup(
         'Topic :: Software Development :: Build Tools',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
     ],
     keywords='module dependency graph memory',
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
-    python_requires='>=3.4, <4',
+    python_requires='>=3.7, <4',
     install_requires=[],
     extras_require={
         'all': ['graphviz>=0.12'],
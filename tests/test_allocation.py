@@ -0,0 +1,29 @@
+import sys
+import types
+import tracemalloc
+
+from module_graph.allocation import AllocationTracer
+
+
+def test_attribute_without_private_get_traces(tmp_path):
+    with open(tmp_path / 'mg_alloc_module.py', 'w') as f:
+        f.write('TABLE = [str(i) * 8 for i in range(2000)]\n')
+    tracer = AllocationTracer().start()
+    sys.path.insert(0, str(tmp_path))
+    try:
+        import mg_alloc_module  # noqa: F401
+        modules = {'mg_alloc_module'}
+        fast, __ = tracer.attribute(modules)
+        # snapshot only, as if tracemalloc._get_traces() were removed
+        tracer._tracemalloc = types.SimpleNamespace(
+            take_snapshot=tracemalloc.take_snapshot,
+            get_traceback_limit=tracemalloc.get_traceback_limit,
+            get_tracemalloc_memory=tracemalloc.get_tracemalloc_memory,
+        )
+        slow, __ = tracer.attribute(modules)
+    finally:
+        tracemalloc.stop()
+        sys.path.remove(str(tmp_path))
+        sys.modules.pop('mg_alloc_module', None)
+    assert fast['mg_alloc_module']['traced_blocks'] >= 2000
+    assert slow == fast
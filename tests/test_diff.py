@@ -0,0 +1,22 @@
+from module_graph.diff import diff_records, diff_subgraph
+
+MB = 1024 * 1024
+
+
+def _record(module, parent=None, children=(), usage=0):
+    return dict(module=module, parent=parent, children=list(children),
+                usage=usage, real_usage=usage, time=0.0, real_time=0.0)
+
+
+def test_diff_subgraph_parent_without_record():
+    # eg: a windowed snapshot, pkg was imported before the window
+    old = [_record('a', usage=MB)]
+    new = [_record('a', usage=MB), _record('b', parent='pkg', usage=2 * MB)]
+    result = diff_records(old, new)
+    assert [x['module'] for x in result['added_modules']] == ['b']
+    nodes, edges = diff_subgraph(old, new, result)
+    nodes = {x[0]: x for x in nodes}
+    assert nodes['b'][2] == 'red'
+    assert nodes['pkg'][1] is None
+    assert nodes['pkg'][3] == 'dotted'
+    assert ('pkg', 'b', 'red') in edges
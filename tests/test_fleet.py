@@ -0,0 +1,109 @@
+import json
+import random
+
+from module_graph.fleet import (
+    RELATIVE_ACCURACY, FleetMerger, QuantileSketch, merge_snapshots)
+
+QUANTILES = [0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1]
+
+
+def _values(num=20000, seed=0):
+    rand = random.Random(seed)
+    values = [rand.lognormvariate(16, 2) for __ in range(num)]
+    # memory deltas maybe zero or negative
+    values += [-rand.lognormvariate(10, 1) for __ in range(num // 10)]
+    values += [0] * (num // 20)
+    rand.shuffle(values)
+    return values
+
+
+def _sketch(values):
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def _state(sketch):
+    return (sketch.count, sketch.min, sketch.max, sketch.zero,
+            sketch.positive, sketch.negative)
+
+
+def test_sketch_relative_accuracy():
+    values = _values()
+    sketch = _sketch(values)
+    exact = sorted(values)
+    assert sketch.count == len(values)
+    assert (sketch.min, sketch.max) == (exact[0], exact[-1])
+    for q in QUANTILES:
+        expect = exact[int(q * (len(exact) - 1))]
+        value = sketch.quantile(q)
+        assert abs(value - expect) <= RELATIVE_ACCURACY * abs(expect) * (
+            1 + 1e-9), q
+
+
+def test_sketch_merge_associative():
+    values = _values(seed=1)
+    chunks = [values[i:i + 1000] for i in range(0, len(values), 1000)]
+    sequential = QuantileSketch()
+    for chunk in chunks:
+        sequential.merge(_sketch(chunk))
+    # merged pairwise in a tree, in another order, as parallel chunks
+    sketches = [_sketch(x) for x in reversed(chunks)]
+    while len(sketches) > 1:
+        merged = []
+        for i in range(0, len(sketches), 2):
+            sketch = sketches[i]
+            for other in sketches[i + 1:i + 2]:
+                sketch.merge(other)
+            merged.append(sketch)
+        sketches = merged
+    assert _state(sketches[0]) == _state(sequential)
+    assert _state(sequential) == _state(_sketch(values))
+    for q in QUANTILES:
+        assert sketches[0].quantile(q) == sequential.quantile(q)
+    sequential.merge(QuantileSketch())
+    assert _state(sequential) == _state(_sketch(values))
+
+
+def _snapshots(num=24, seed=2):
+    rand = random.Random(seed)
+    modules = [f'm{i}' for i in range(30)]
+    snapshots = []
+    for __ in range(num):
+        records = []
+        for module in rand.sample(modules, 20):
+            usage = rand.randint(0, 64 * 1024 * 1024)
+            records.append(dict(
+                module=module,
+                parent=rand.choice([None] + modules[:5]),
+                children=rand.sample(modules, 3),
+                usage=usage,
+                real_usage=rand.randint(0, usage),
+                time=rand.random(),
+            ))
+        snapshots.append(dict(meta=dict(sampler='rss'), records=records))
+    return snapshots
+
+
+def test_fleet_chunk_merge_same_as_sequential(tmp_path):
+    snapshots = _snapshots()
+    sequential = FleetMerger()
+    for item in snapshots:
+        sequential.add_records(item['records'], item['meta'])
+    for i, item in enumerate(snapshots):
+        with open(tmp_path / f'{i:02d}.json', 'w') as f:
+            json.dump(dict(item['meta'], records=item['records']), f)
+    expect_meta, expect = sequential.result()
+    # chunks merged in reversed order, as they may complete in parallel
+    merger = FleetMerger()
+    for i in reversed(range(0, len(snapshots), 5)):
+        chunk = FleetMerger()
+        for item in snapshots[i:i + 5]:
+            chunk.add_records(item['records'], item['meta'])
+        merger.merge(chunk)
+    assert merger.result() == (expect_meta, expect)
+    for jobs, chunksize in [(1, 16), (2, 5), (3, 1)]:
+        merger = merge_snapshots([str(tmp_path)], jobs=jobs,
+                                 chunksize=chunksize)
+        assert merger.result() == (expect_meta, expect)
@@ -0,0 +1,49 @@
+import gc
+
+from module_graph import gcstats
+from module_graph.gcstats import GCTracker
+
+
+def _make_objects(n):
+    # containers tracked by the collector, kept alive, plus garbage
+    kept = [[i] for i in range(n)]
+    for i in range(n):
+        [i, [i]]
+    return kept
+
+
+def _measure(tracker, n):
+    gc.collect()
+    before = len(gc.get_objects())
+    objects_before = tracker.sample()[0]
+    kept = _make_objects(n)
+    grown = len(gc.get_objects()) - before
+    counted = tracker.sample()[0] - objects_before
+    return kept, grown, counted
+
+
+def test_sample_matches_get_objects():
+    tracker = GCTracker().start()
+    try:
+        kept, grown, counted = _measure(tracker, 200000)
+    finally:
+        tracker.stop()
+    assert tracker.collections[0] > 0
+    assert abs(counted - grown) <= grown * 0.05
+
+
+def test_sample_without_generation_objects(monkeypatch):
+    # Python 3.7, gc.get_objects() has no generation argument
+    get_objects = gc.get_objects
+
+    def get_objects_37():
+        return get_objects()
+    monkeypatch.setattr(gc, 'get_objects', get_objects_37)
+    monkeypatch.setattr(gcstats, 'HAS_GENERATION_OBJECTS', False)
+    tracker = GCTracker().start()
+    try:
+        kept, grown, counted = _measure(tracker, 100000)
+    finally:
+        tracker.stop()
+    assert tracker.collections[0] > 0
+    assert counted >= grown * 0.95
@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import contextvars
+
+import pytest
+
+from module_graph.hooker import (
+    MemoryHooker, ModuleMomoryHandler, setup_hooker)
+
+
+def test_sys_modules_ior_keeps_hook():
+    hooker = MemoryHooker(handler=ModuleMomoryHandler())
+    hooker.start()
+    try:
+        patched = sys.modules
+        sys.modules |= {'module_graph_test_ior': sys}
+        assert sys.modules is patched
+        assert sys.modules['module_graph_test_ior'] is sys
+    finally:
+        hooker.stop()
+        sys.modules.pop('module_graph_test_ior', None)
+    assert type(sys.modules) is dict
+    assert 'module_graph_test_ior' not in sys.modules
+
+
+def test_window_end_by_timer(tmp_path):
+    save_to = str(tmp_path / 'graph.json')
+    hooker = setup_hooker(save_to=save_to, max_seconds=0.05)
+    try:
+        import module_graph.viewer  # noqa: F401
+        deadline = time.monotonic() + 5
+        while hooker.enabled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not hooker.enabled
+        # the timer stops then dumps under the lock, wait for the dump
+        with hooker._lock:
+            pass
+        assert type(sys.modules) is dict
+        with open(save_to) as f:
+            assert 'records' in json.load(f)
+    finally:
+        hooker.stop()
+        hooker.handler.save_to = None
+
+
+def test_end_without_begin_warns():
+    hooker = MemoryHooker(handler=ModuleMomoryHandler())
+    with pytest.warns(RuntimeWarning, match='mg_never_began'):
+        hooker._end_module('mg_never_began')
+    assert hooker.handler.records == []
+
+
+class FakeSampler:
+    name = 'fake'
+
+    def __init__(self):
+        self.memory = 1000
+
+    def sample(self):
+        return self.memory
+
+
+def test_memory_other_with_child_freed_memory():
+    hooker = MemoryHooker(handler=ModuleMomoryHandler())
+    sampler = hooker.sampler = FakeSampler()
+    hooker._begin_module('mg_parent')
+    sampler.memory += 100
+    hooker._begin_module('mg_child')
+    sampler.memory += 50
+    hooker._begin_module('mg_grandchild')
+    sampler.memory += 300
+    hooker._end_module('mg_grandchild')
+    sampler.memory -= 400  # the child frees more than it allocated
+    hooker._end_module('mg_child')
+    sampler.memory += 10
+    hooker._end_module('mg_parent')
+    records = {r.module: r for r in hooker.handler.records}
+    # one thread: nothing is finished by other threads
+    assert all(r.memory_other == 0 for r in records.values())
+    assert records['mg_grandchild'].usage == 300
+    assert records['mg_child'].usage == 0
+    assert records['mg_child'].memory_delta == -50
+    assert records['mg_parent'].usage == 60
+
+
+def test_memory_other_of_other_thread_freed_memory():
+    hooker = MemoryHooker(handler=ModuleMomoryHandler())
+    sampler = hooker.sampler = FakeSampler()
+    other = contextvars.Context()  # own import stack, as another thread
+    hooker._begin_module('mg_parent')
+    sampler.memory += 100
+    other.run(hooker._begin_module, 'mg_other')
+    sampler.memory -= 40  # freed by the other thread
+    other.run(hooker._end_module, 'mg_other')
+    hooker._end_module('mg_parent')
+    records = {r.module: r for r in hooker.handler.records}
+    assert records['mg_other'].usage == 0
+    assert records['mg_parent'].memory_other == -40
+    assert records['mg_parent'].usage == 100
@@ -0,0 +1,97 @@
+import os
+import sys
+import importlib
+import importlib.util
+import py_compile
+
+from module_graph.hooker import MemoryHooker
+from module_graph.importio import IOProfiler, code_source
+from module_graph.pathorder import (
+    recommend_order, find_shadowing, estimate_find_time)
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _spec_of(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return importlib.util.spec_from_file_location(name, path)
+
+
+def test_invalidate_caches_while_profiling(tmp_path):
+    _write(tmp_path / 'io_first_module.py', 'x = 1\n')
+    hooker = MemoryHooker(io_profiler=IOProfiler())
+    sys.path.insert(0, str(tmp_path))
+    hooker.start()
+    try:
+        import io_first_module  # noqa: F401
+        # written at runtime, directory mtime unchanged: only found after
+        # the cache of the real FileFinder is invalidated
+        mtime = os.stat(tmp_path).st_mtime_ns
+        _write(tmp_path / 'io_second_module.py', 'y = 2\n')
+        os.utime(tmp_path, ns=(mtime, mtime))
+        importlib.invalidate_caches()
+        import io_second_module
+        assert io_second_module.y == 2
+    finally:
+        hooker.stop()
+        sys.path.remove(str(tmp_path))
+        sys.modules.pop('io_first_module', None)
+        sys.modules.pop('io_second_module', None)
+    fields, stats = hooker.io_profiler.attribute()
+    assert fields['io_second_module']['path_entry'] == str(tmp_path)
+    assert fields['io_second_module']['code_source'] in (
+        'compiled', 'valid_pyc')
+
+
+def test_code_source(tmp_path):
+    path = tmp_path / 'io_source_module.py'
+    _write(path, 'x = 1\n')
+    spec = _spec_of(str(path))
+    source_size = os.stat(path).st_size
+    assert code_source(spec.loader, spec) == ('compiled', source_size)
+    py_compile.compile(str(path), cfile=spec.cached)
+    pyc_size = os.stat(spec.cached).st_size
+    assert code_source(spec.loader, spec) == ('valid_pyc', pyc_size)
+    _write(path, 'x = 22\n')
+    source_size = os.stat(path).st_size
+    assert code_source(spec.loader, spec) == (
+        'stale_pyc', pyc_size + source_size)
+    py_compile.compile(
+        str(path), cfile=spec.cached,
+        invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH)
+    pyc_size = os.stat(spec.cached).st_size
+    assert code_source(spec.loader, spec) == (
+        'valid_pyc', pyc_size + source_size)
+
+
+def test_recommend_order():
+    path = ['slow', 'empty', 'fast']
+    entries = {
+        'slow': dict(probes=10, hits=1, time=0.010),
+        'empty': dict(probes=10, hits=0, time=0.001),
+        'fast': dict(probes=9, hits=9, time=0.0009),
+    }
+    order = recommend_order(path, entries)
+    assert order == ['fast', 'slow', 'empty']
+    assert estimate_find_time(order, entries) < estimate_find_time(
+        path, entries)
+    # a module in both slow and fast is found at slow, keep it first
+    shadowing = {'shared': ['slow', 'fast']}
+    assert recommend_order(path, entries, shadowing) == [
+        'slow', 'fast', 'empty']
+
+
+def test_find_shadowing(tmp_path):
+    first = tmp_path / 'first'
+    second = tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    _write(first / 'shared.py', '')
+    _write(second / 'shared.py', '')
+    _write(second / 'alone.py', '')
+    path = [str(first), str(second)]
+    found = {'shared': str(first), 'alone': str(second)}
+    assert find_shadowing(path, found) == {'shared': path}
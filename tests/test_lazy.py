@@ -0,0 +1,39 @@
+from module_graph.lazy import plan_lazy_imports
+
+
+def _record(module, parent=None, children=(), real_usage=0, real_time=0):
+    return dict(module=module, parent=parent, children=list(children),
+                real_usage=real_usage, real_time=real_time)
+
+
+RECORDS = [
+    _record('app', children=['app.core'], real_usage=10),
+    _record('app.core', 'app', ['json', 'xml.dom'], real_usage=10),
+    _record('json', 'app.core', real_usage=1),
+    # first imported by app, but not in it's recorded import edges
+    _record('plugin', 'app', real_usage=30, real_time=0.3),
+    _record('heavy', None, ['heavy.sub'], real_usage=100, real_time=0.1),
+    _record('heavy.sub', 'heavy', ['json'], real_usage=50),
+    # imported at top level by others, but the submodule is used by app
+    _record('xml', None, ['xml.dom'], real_usage=5),
+    _record('xml.dom', 'xml', real_usage=7),
+]
+
+
+def test_plan_lazy_imports():
+    plan = plan_lazy_imports(RECORDS, ['app'])
+    assert plan['lazy_modules'] == ['heavy', 'plugin']
+    details = {x['module']: x for x in plan['details']}
+    assert details['heavy'] == dict(
+        module='heavy', importer=None, usage=150, time=0.1, num_modules=2)
+    assert details['plugin']['importer'] == 'app'
+    assert plan['usage'] == 180
+    assert plan['num_needed'] == 5
+    assert plan['missing_entries'] == []
+
+
+def test_plan_lazy_imports_min_usage():
+    plan = plan_lazy_imports(RECORDS, ['app', 'missing'], min_usage=100,
+                             min_time=1)
+    assert plan['lazy_modules'] == ['heavy']
+    assert plan['missing_entries'] == ['missing']
@@ -0,0 +1,97 @@
+import sys
+import time
+
+from module_graph.hooker import MemoryHooker, unwrap
+from module_graph.prefetch import PrefetchFinder, resolve_files
+
+
+def _make_modules(root, names):
+    for name in names:
+        with open(root / f'{name}.py', 'w') as f:
+            f.write(f'NAME = {name!r}\n')
+
+
+def test_prefetch_drops_data(tmp_path):
+    names = [f'mg_prefetch_{i}' for i in range(20)]
+    _make_modules(tmp_path, names)
+    sys.path.insert(0, str(tmp_path))
+    finder = PrefetchFinder(resolve_files(names), jobs=2)
+    sys.meta_path.insert(0, finder)
+    try:
+        finder.start()
+        deadline = time.monotonic() + 10
+        while finder.num_prefetched < len(names):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        module = __import__(names[0])
+        assert module.NAME == names[0]
+        assert finder.num_hits == 1
+        # data of the imported module is used or dropped
+        entry = resolve_files(names[:1])[0]
+        assert entry['origin'] not in finder._stats
+        assert entry['cached'] not in finder._data
+        assert entry['origin'] not in finder._data
+    finally:
+        finder.close()
+        sys.path.remove(str(tmp_path))
+        for name in names:
+            sys.modules.pop(name, None)
+    assert not finder._data and not finder._stats
+    assert not finder._threads
+
+
+def test_close_stops_threads(tmp_path):
+    names = [f'mg_prefetch_stop_{i}' for i in range(200)]
+    _make_modules(tmp_path, names)
+    sys.path.insert(0, str(tmp_path))
+    try:
+        entries = resolve_files(names)
+    finally:
+        sys.path.remove(str(tmp_path))
+    finder = PrefetchFinder(entries, jobs=4).start()
+    threads = list(finder._threads)
+    finder.close()
+    assert not any(x.is_alive() for x in threads)
+    assert not finder._data and not finder._stats
+
+
+def test_close_removes_finder_wrapped_by_hooker():
+    hooker = MemoryHooker()
+    hooker.start()
+    try:
+        finder = PrefetchFinder([]).start()
+        sys.meta_path.insert(0, finder)
+        assert sys.meta_path[0] is not finder
+        finder.close()
+        assert not any(unwrap(x) is finder for x in sys.meta_path)
+    finally:
+        hooker.stop()
+
+
+def test_shadowed_top_level_module_not_forced(tmp_path):
+    planned = tmp_path / 'planned'
+    shadow = tmp_path / 'shadow'
+    planned.mkdir()
+    shadow.mkdir()
+    name = 'mg_prefetch_shadowed'
+    _make_modules(planned, [name])
+    sys.path.insert(0, str(planned))
+    try:
+        entries = resolve_files([name])
+    finally:
+        sys.path.remove(str(planned))
+    # the plan is stale: an earlier path entry has the module now
+    with open(shadow / f'{name}.py', 'w') as f:
+        f.write('NAME = "shadow"\n')
+    sys.path[:0] = [str(shadow), str(planned)]
+    finder = PrefetchFinder(entries, jobs=1)
+    sys.meta_path.insert(0, finder)
+    try:
+        module = __import__(name)
+        assert module.NAME == 'shadow'
+        assert finder.num_misses == 1
+    finally:
+        finder.close()
+        sys.path.remove(str(shadow))
+        sys.path.remove(str(planned))
+        sys.modules.pop(name, None)
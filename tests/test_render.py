@@ -0,0 +1,153 @@
+import random
+
+import pytest
+
+from module_graph.render import (
+    ModuleMemoryRecord, RecordsProcessor, color_of, label_of)
+from module_graph.viewer import viewer_data
+
+MB = 1024 * 1024
+VALUE_FIELDS = (
+    'usage', 'real_usage', 'time', 'real_time', 'cpu_time', 'real_cpu_time')
+
+
+def reference_process(records, threshold=None, modules=None):
+    """The dict based processor before the indexed graph, as reference"""
+    records = [dict(r, children=list(r['children'])) for r in records]
+    if modules:
+        modules = set(modules)
+        records = [
+            dict(r, children=[x for x in r['children'] if x in modules])
+            for r in records if r['module'] in modules and (
+                not r['parent'] or r['parent'] in modules)]
+    records_map = {}
+    for r in records:
+        old = records_map.get(r['module'])
+        if old is None:
+            records_map[r['module']] = r
+            continue
+        new = dict(module=r['module'], parent=old['parent'],
+                   children=sorted(set(old['children']) | set(r['children'])))
+        for field in VALUE_FIELDS:
+            new[field] = old.get(field, 0) + r.get(field, 0)
+        records_map[r['module']] = new
+    for r in records_map.values():
+        parent = records_map.get(r['parent']) if r['parent'] else None
+        if parent and r['module'] in parent['children']:
+            parent['children'].remove(r['module'])
+        r['children'] = [
+            x for x in r['children']
+            if not (x.startswith(r['module']) or r['module'].startswith(x))]
+    objects = {}
+    for r in records_map.values():
+        objects[r['module']] = ModuleMemoryRecord(
+            r['module'], **{x: r.get(x, 0) for x in VALUE_FIELDS})
+
+    def set_default(module):
+        if module not in objects:
+            objects[module] = ModuleMemoryRecord(module)
+        return objects[module]
+
+    for r in records_map.values():
+        robj = objects[r['module']]
+        if r['parent']:
+            robj.parent = set_default(r['parent'])
+        robj.children = [set_default(x) for x in r['children']]
+    ret = list(objects.values())
+    for r in ret:
+        for field in ('usage', 'time', 'cpu_time'):
+            setattr(r, field, max(
+                getattr(r, field), getattr(r, 'real_' + field)))
+    if threshold and threshold > 0:
+        ret = [r for r in ret if r.usage >= threshold * MB]
+        kept = {id(r) for r in ret}
+        for r in ret:
+            r.children = [x for x in r.children if id(x) in kept]
+    return ret
+
+
+def summary(records):
+    return [(
+        r.module,
+        r.parent.module if r.parent else None,
+        [x.module for x in r.children],
+        [getattr(r, x) for x in VALUE_FIELDS],
+        color_of(r),
+        label_of(r),
+    ) for r in records]
+
+
+def _record(module, parent=None, children=(), usage=0, real_usage=0,
+            time=0.0, real_time=0.0):
+    return dict(module=module, parent=parent, children=list(children),
+                usage=usage, real_usage=real_usage, time=time,
+                real_time=real_time, cpu_time=time, real_cpu_time=real_time)
+
+
+FIXED_RECORDS = [
+    _record('app', None, ['app.core', 'json', 'lib'], 30 * MB, 2 * MB, 0.3,
+            0.01),
+    # edge duplicated with the parent relation, package edge
+    _record('app.core', 'app', ['app', 'lib', 'lib.util'], 20 * MB, 5 * MB,
+            0.2, 0.05),
+    _record('lib', 'app.core', ['lib.util', 'json'], 15 * MB, 10 * MB, 0.1,
+            0.08),
+    _record('lib.util', 'lib', ['missing'], 5 * MB, 5 * MB, 0.02, 0.02),
+    _record('json', 'app', [], 512 * 1024, 256 * 1024, 0.001, 0.001),
+    # real value bigger than cumulative value
+    _record('odd', 'no_record_parent', ['json'], MB, 3 * MB, 0.0, 0.002),
+    # imported again in a forked child process, merged
+    _record('lib', None, ['six', 'json'], 2 * MB, 2 * MB, 0.01, 0.01),
+    _record('six', 'lib', [], 100 * MB, 100 * MB, 0.005, 0.005),
+]
+
+
+def random_records(num_modules=300, seed=0):
+    rand = random.Random(seed)
+    names = [f'm{i}' for i in range(num_modules)]
+    names += [f'm{i}.sub{j}' for i in range(20) for j in range(3)]
+    records = []
+    for i, name in enumerate(names):
+        parent = rand.choice(names[:i]) if i and rand.random() < 0.8 else None
+        children = rand.sample(names, rand.randint(0, 6))
+        usage = rand.randint(0, 8 * MB)
+        records.append(_record(
+            name, parent, children, usage, rand.randint(0, usage + MB),
+            rand.random() / 10, rand.random() / 100))
+    # imported again by other processes
+    for name in rand.sample(names, 40):
+        parent = rand.choice(names)
+        records.append(_record(
+            name, parent if parent != name else None,
+            rand.sample(names, 3), rand.randint(0, 4 * MB),
+            rand.randint(0, MB)))
+    return records
+
+
+@pytest.mark.parametrize('records', [FIXED_RECORDS, random_records()],
+                         ids=['fixed', 'random'])
+@pytest.mark.parametrize('threshold', [None, 1, 4])
+def test_processor_same_as_reference(records, threshold):
+    expect = reference_process(records, threshold=threshold)
+    result = RecordsProcessor.process(records, threshold=threshold)
+    assert summary(result) == summary(expect)
+    assert viewer_data(result) == viewer_data(expect)
+
+
+def test_processor_with_modules_same_as_reference():
+    modules = ['app', 'app.core', 'lib', 'lib.util', 'six', 'odd']
+    expect = reference_process(FIXED_RECORDS, modules=modules)
+    result = RecordsProcessor.process(FIXED_RECORDS, modules=modules)
+    assert summary(result) == summary(expect)
+
+
+def test_processor_fixed_totals():
+    result = {r.module: r for r in RecordsProcessor.process(FIXED_RECORDS)}
+    lib = result['lib']
+    assert lib.parent.module == 'app.core'
+    assert lib.usage == 17 * MB and lib.real_usage == 12 * MB
+    assert [x.module for x in lib.children] == ['json']
+    assert [x.module for x in result['app'].children] == ['lib']
+    assert result['odd'].usage == 3 * MB
+    assert result['no_record_parent'].usage == 0
+    assert result['missing'].parent is None
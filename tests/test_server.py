@@ -0,0 +1,62 @@
+import sys
+import json
+import signal
+import subprocess
+
+import pytest
+
+from module_graph.hooker import MemoryHooker, ModuleJSONLinesHandler
+from module_graph.server import SnapshotServer, fetch
+
+
+def test_server_error_replies_500_and_keeps_serving(tmp_path):
+    handler = ModuleJSONLinesHandler(str(tmp_path / 'graph.jsonl'))
+    hooker = MemoryHooker(handler=handler)
+    address = 'unix:' + str(tmp_path / 'graph.sock')
+    server = SnapshotServer(hooker, address).start()
+    try:
+        def broken():
+            raise ValueError('broken line')
+        server.get_records = broken
+        with pytest.raises(ValueError, match='500'):
+            fetch(address, '/records')
+        del server.get_records
+        assert fetch(address, '/records') == []
+    finally:
+        server.close()
+
+
+def test_load_records_skips_partial_line(tmp_path):
+    handler = ModuleJSONLinesHandler(str(tmp_path / 'graph.jsonl'))
+    handler._open()
+    handler._file.write('{"module": "a", "parent": null}\n{"module": "b"')
+    handler.flush()
+    assert [x['module'] for x in handler.load_records(flush=False)] == ['a']
+
+
+KILLED_SCRIPT = '''
+import sys
+import time
+from module_graph.hooker import setup_hooker
+hooker = setup_hooker(save_to=sys.argv[1])
+import json, email.parser, xml.dom.minidom, http.client  # noqa
+print(hooker.num_imports, flush=True)
+time.sleep(60)
+'''
+
+
+def test_records_flushed_when_idle_then_killed(tmp_path):
+    save_to = str(tmp_path / 'graph.jsonl')
+    proc = subprocess.Popen(
+        [sys.executable, '-c', KILLED_SCRIPT, save_to],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        num_imports = int(proc.stdout.readline())
+    finally:
+        proc.kill()
+        proc.wait()
+    assert proc.returncode == -signal.SIGKILL
+    with open(save_to) as f:
+        records = [x for x in map(json.loads, f) if 'module' in x]
+    assert num_imports > 0
+    assert len(records) == num_imports
@@ -0,0 +1,30 @@
+from module_graph.snapshot import BinarySnapshot, load_records, save_binary
+
+
+RECORDS = [
+    dict(module='app', parent=None, children=['app.core', 'json'],
+         usage=300, real_usage=100, time=0.25, real_time=0.0),
+    dict(module='app.core', parent='app', children=['json'],
+         usage=200, real_usage=200, time=0.125, real_time=0.125,
+         native_usage=4096, native_private=1024),
+    dict(module='json', parent='app.core', children=[],
+         usage=0, real_usage=0, time=0.5, real_time=0.5,
+         gc_collections=[1, 0, 0], allocation_sites=[
+             dict(lineno=1, size=64, count=2)]),
+    # imported again in a forked child process
+    dict(module='json', parent=None, children=[],
+         usage=10, real_usage=10, time=0.5, real_time=0.5),
+]
+
+
+def test_binary_round_trip(tmp_path):
+    filepath = str(tmp_path / 'graph.mgb')
+    meta = dict(sampler='rss', pid=1)
+    save_binary(filepath, meta, RECORDS)
+    assert load_records(filepath) == (meta, RECORDS)
+    with BinarySnapshot(filepath) as snapshot:
+        assert sorted(snapshot.columns) == [
+            'real_time', 'real_usage', 'time', 'usage']
+        assert snapshot.find_record('json') == RECORDS[2]
+        assert [x['module'] for x in snapshot.subgraph(['app.core'])] == [
+            'app.core', 'json']
@@ -0,0 +1,68 @@
+import sys
+import random
+import threading
+
+import pytest
+
+from module_graph.hooker import MemoryHooker, ModuleMomoryHandler
+
+NUM_MODULES = 60
+NUM_THREADS = 8
+
+
+@pytest.fixture
+def modules(tmp_path):
+    rand = random.Random(0)
+    names = [f'mg_threads_{i}' for i in range(NUM_MODULES)]
+    for i, name in enumerate(names):
+        imports = rand.sample(names[:i], min(i, 3))
+        with open(tmp_path / f'{name}.py', 'w') as f:
+            for x in imports:
+                f.write(f'import {x}\n')
+            f.write('import time\ntime.sleep(0.001)\n')
+    sys.path.insert(0, str(tmp_path))
+    yield names
+    sys.path.remove(str(tmp_path))
+    for name in names:
+        sys.modules.pop(name, None)
+
+
+def test_concurrent_imports_parents_in_same_thread(modules):
+    hooker = MemoryHooker(handler=ModuleMomoryHandler())
+    barrier = threading.Barrier(NUM_THREADS)
+    errors = []
+
+    def worker(seed):
+        names = list(modules)
+        random.Random(seed).shuffle(names)
+        barrier.wait()
+        for name in names:
+            try:
+                __import__(name)
+            except Exception as ex:
+                errors.append(f'{name}: {type(ex).__name__}: {ex}')
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(NUM_THREADS)]
+    hooker.start()
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        hooker.stop()
+    assert errors == []
+    records = hooker.handler.records
+    by_module = {}
+    for r in records:
+        by_module.setdefault(r.module, []).append(r)
+    assert sorted(by_module) == sorted(modules)
+    assert all(len(x) == 1 for x in by_module.values())
+    assert len({r.thread for r in records}) > 1
+    for r in records:
+        if r.parent:
+            parent = by_module[r.parent][0]
+            assert parent.thread == r.thread, r.module
+            assert r.module in parent.children
+    assert not hooker.importing
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+
+from module_graph.cache import TravelerCache
+from module_graph.static_traveler import StaticModuleTraveler
+from module_graph.traveler import ProcessPoolTraveler
+
+
+def _write(path, content=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def packages(tmp_path):
+    root = tmp_path / 'site'
+    _write(str(root / 'mg_app' / '__init__.py'), 'from mg_lib import sub\n')
+    _write(str(root / 'mg_lib' / '__init__.py'))
+    _write(str(root / 'mg_lib' / 'sub.py'))
+    sys.path.insert(0, str(root))
+    yield root
+    sys.path.remove(str(root))
+
+
+def _children(records, module):
+    return {x['module']: x for x in records}[module]['children']
+
+
+def test_static_resolve_independent_of_run(packages, tmp_path):
+    cache = TravelerCache(cache_dir=str(tmp_path / 'cache'), mode='static')
+    traveler = StaticModuleTraveler(modules=['mg_app'], jobs=1, cache=cache)
+    __, records = traveler.run()
+    assert _children(records, 'mg_app') == ['mg_lib.sub']
+    # from cache, in a run with the imported package
+    cache = TravelerCache(cache_dir=str(tmp_path / 'cache'), mode='static')
+    traveler = StaticModuleTraveler(
+        modules=['mg_app', 'mg_lib'], jobs=1, cache=cache)
+    __, records = traveler.run()
+    assert _children(records, 'mg_app') == ['mg_lib.sub']
+
+
+def test_cache_entry_invalid_when_depends_changed(packages, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = TravelerCache(cache_dir=cache_dir)
+    fingerprint = cache.fingerprint('mg_app')
+    cache.put('mg_app', fingerprint, dict(records=[]), depends=['mg_lib'])
+    assert TravelerCache(cache_dir=cache_dir).get(
+        'mg_app', fingerprint) == dict(records=[])
+    _write(str(packages / 'mg_lib' / 'other.py'))
+    assert TravelerCache(cache_dir=cache_dir).get(
+        'mg_app', fingerprint) is None
+
+
+def test_process_pool_reports_import_failures(tmp_path, monkeypatch):
+    _write(str(tmp_path / 'mg_broken.py'), 'raise RuntimeError("broken")\n')
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join([str(tmp_path), repo]))
+    traveler = ProcessPoolTraveler(
+        modules=['mg_no_such_module', 'mg_broken'], jobs=2)
+    meta, records = traveler.run()
+    failed = {x['module']: x['reason'] for x in meta['failed']}
+    assert sorted(failed) == ['mg_broken', 'mg_no_such_module']
+    assert failed['mg_no_such_module'].startswith('ModuleNotFoundError')
+    assert failed['mg_broken'] == 'RuntimeError: broken'